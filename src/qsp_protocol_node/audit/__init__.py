@@ -8,14 +8,16 @@
 from .audit import QSPAuditNode
 from .wrapper import Wrapper
 from .analyzer import Analyzer
+from .analyzer_cache import AnalyzerCache
 from .vulnerabilities_set import VulnerabilitiesSet
 from .threads import QSPThread, ComputeGasPriceThread, CollectMetricsThread, \
     SubmitReportThread, PerformAuditThread, ClaimRewardsThread, PollRequestsThread, \
-    MonitorSubmissionThread, BlockMinedPollingThread
+    MonitorSubmissionThread, BlockMinedPollingThread, RetentionThread, Watchdog
 
 __all__ = ['QSPAuditNode',
            'Wrapper',
            'Analyzer',
+           'AnalyzerCache',
            'VulnerabilitiesSet',
            'QSPThread',
            'ClaimRewardsThread',
@@ -25,4 +27,6 @@ __all__ = ['QSPAuditNode',
            'PerformAuditThread',
            'SubmitReportThread',
            'PollRequestsThread',
-           'BlockMinedPollingThread']
+           'BlockMinedPollingThread',
+           'RetentionThread',
+           'Watchdog']
@@ -16,11 +16,14 @@ from log_streaming import get_logger
 
 class Analyzer:
 
-    def __init__(self, wrapper):
+    def __init__(self, wrapper, cache=None):
         """
-        Builds an Analyzer object from a given arguments string.
+        Builds an Analyzer object from a given arguments string. Reports are looked up in (and
+        stored into) the given cache, if any.
         """
         self.__wrapper = wrapper
+        self.__cache = cache
+        self.__version = None
         self.__logger = get_logger(self.__class__.__qualname__)
 
     def __repr__(self):
@@ -33,6 +36,10 @@ class Analyzer:
     def wrapper(self):
         return self.__wrapper
 
+    @property
+    def cache(self):
+        return self.__cache
+
     def get_metadata(self, contract_path, request_id, original_file_name):
         """
         Returns the metadata {name, version, vulnerabilities_checked, command}
@@ -46,11 +53,45 @@ class Analyzer:
         )
         return self.wrapper.get_metadata(contract_path, request_id, original_file_name)
 
+    def __get_version(self, contract_path, request_id, original_file_name):
+        # The version of the analyzer is the digest of its image, which is fixed once pulled
+        if self.__version is None:
+            self.__version = self.get_metadata(
+                contract_path,
+                request_id,
+                original_file_name,
+            ).get('version')
+        return self.__version
+
+    def __get_cache_key(self, contract_path, request_id, original_file_name):
+        version = self.__get_version(contract_path, request_id, original_file_name)
+        if version is None:
+            return None
+        return self.__cache.key(
+            contract_path,
+            self.wrapper.analyzer_name,
+            version,
+            self.wrapper.args,
+            original_file_name,
+        )
+
     def check(self, contract_path, request_id, original_file_name):
         """
         Checks for potential vulnerabilities in a target contract writen in a given
         version of Solidity, writing the result in a json report.
         """
+        cache_key = None
+        if self.__cache is not None:
+            cache_key = self.__get_cache_key(contract_path, request_id, original_file_name)
+        if cache_key is not None:
+            json_report = self.__cache.get(cache_key)
+            if json_report is not None:
+                self.__logger.debug("Found {0}'s report in the cache".format(
+                    self.wrapper.analyzer_name),
+                    requestId=request_id,
+                )
+                return json_report
+
         self.__logger.debug("Running {0}'s wrapper. About to check {1}".format(
             self.wrapper.analyzer_name,
             contract_path,
@@ -59,6 +100,11 @@ class Analyzer:
         )
 
         json_report = self.__wrapper.check(contract_path, request_id, original_file_name)
+
+        # Only successful reports are cached, as errors may not happen again
+        if cache_key is not None and json_report.get('status') == 'success':
+            self.__cache.put(cache_key, json_report)
+
         str_report = json.dumps(json_report)
         self.__logger.debug("{0}'s wrapper finished execution. Produced report is {1}".format(
             self.wrapper.analyzer_name,
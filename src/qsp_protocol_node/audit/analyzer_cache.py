@@ -0,0 +1,148 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2018, 2019 Quantstamp, Inc. This content and its use are governed by the license terms at    #
+# <https://s3.amazonaws.com/qsp-protocol-license/V2_LICENSE.txt>                                   #
+#                                                                                                  #
+####################################################################################################
+
+"""
+Provides the cache of the reports produced by the analyzers.
+"""
+
+import json
+import os
+
+from collections import OrderedDict
+from threading import Lock
+
+from log_streaming import get_logger
+from utils.io import digest
+from utils.io import digest_file
+
+
+class AnalyzerCache:
+    """
+    Stores the report of each analyzer on disk, keyed by the content of the contract it checked
+    and by what determines the outcome of the check (the analyzer, its version and arguments),
+    so that the same contract is not analyzed again, e.g., when it is audited for several
+    requests or checked by the police.
+
+    The cache is bounded in size, the least recently used reports being evicted first. The last
+    time a report is used is the modification time of its file, so that the order of eviction
+    survives restarts.
+    """
+
+    def __init__(self, path, max_size_bytes):
+        self.__logger = get_logger(self.__class__.__qualname__)
+        self.__path = path
+        self.__max_size_bytes = max_size_bytes
+        self.__lock = Lock()
+
+        # Size of the report of each key, from the least to the most recently used
+        self.__entries = OrderedDict()
+        self.__size_bytes = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.__load()
+
+    @staticmethod
+    def key(contract_path, analyzer_name, version, args, original_file_name):
+        """
+        Returns the key of the report of the given analyzer for the given contract. The name of
+        the contract file is part of the key, since the analyzers refer to it in their reports.
+        """
+        return digest(json.dumps([
+            digest_file(contract_path),
+            analyzer_name,
+            version,
+            args,
+            original_file_name,
+        ]))
+
+    def __file(self, key):
+        return os.path.join(self.__path, "{0}.json".format(key))
+
+    def __load(self):
+        files = []
+        for file_name in os.listdir(self.__path):
+            if not file_name.endswith(".json"):
+                continue
+            stat = os.stat(os.path.join(self.__path, file_name))
+            files.append((stat.st_mtime, file_name[:-len(".json")], stat.st_size))
+        for _, key, size in sorted(files):
+            self.__entries[key] = size
+            self.__size_bytes += size
+        self.__evict()
+
+    def __remove(self, key):
+        self.__size_bytes -= self.__entries.pop(key)
+        try:
+            os.remove(self.__file(key))
+        except FileNotFoundError:
+            pass
+
+    def __evict(self):
+        while self.__size_bytes > self.__max_size_bytes:
+            key = next(iter(self.__entries))
+            self.__remove(key)
+            self.__evictions += 1
+
+    def get(self, key):
+        """
+        Returns the report stored for the given key, or None if there is none.
+        """
+        with self.__lock:
+            if key in self.__entries:
+                try:
+                    with open(self.__file(key), 'r') as stream:
+                        report = json.load(stream)
+                    os.utime(self.__file(key))
+                    self.__entries.move_to_end(key)
+                    self.__hits += 1
+                    return report
+                except (OSError, ValueError) as error:
+                    self.__logger.warning("Dropping unreadable cached report {0}: {1}".format(
+                        key, error))
+                    self.__remove(key)
+            self.__misses += 1
+            return None
+
+    def put(self, key, report):
+        """
+        Stores the report for the given key, evicting the least recently used reports as needed.
+        A report larger than the whole cache is not stored.
+        """
+        content = json.dumps(report)
+        size = len(content.encode('utf-8'))
+        if size > self.__max_size_bytes:
+            return
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+            temp_file = "{0}.tmp".format(self.__file(key))
+            with open(temp_file, 'w') as stream:
+                stream.write(content)
+            # Readers never see a partially written report
+            os.replace(temp_file, self.__file(key))
+            self.__entries[key] = size
+            self.__size_bytes += size
+            self.__evict()
+
+    @property
+    def metrics(self):
+        """
+        Returns how many lookups found a report, how many did not, how many reports were
+        evicted, and how many reports (and bytes) the cache holds.
+        """
+        with self.__lock:
+            return {
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'evictions': self.__evictions,
+                'entries': len(self.__entries),
+                'sizeBytes': self.__size_bytes,
+            }
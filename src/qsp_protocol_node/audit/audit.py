@@ -17,6 +17,8 @@ from .threads import SubmitReportThread
 from .threads import PerformAuditThread
 from .threads import MonitorSubmissionThread
 from .threads import BlockMinedPollingThread
+from .threads import RetentionThread
+from .threads import Watchdog
 
 from log_streaming import get_logger
 from utils.eth import mk_read_only_call
@@ -25,8 +27,6 @@ from utils.eth import send_signed_transaction
 from utils.eth.tx import TransactionNotConfirmedException
 from web3.utils.threads import Timeout
 
-from time import sleep
-
 """
 The main QSP audit node thread.
 
@@ -66,19 +66,24 @@ class QSPAuditNode:
         self.__logger = get_logger(self.__class__.__qualname__)
 
         block_mined_thread = BlockMinedPollingThread(config)
+        self.__watchdog = Watchdog(config.watchdog_budget_sec, config.watchdog_budgets)
 
         self.__internal_threads = [
             block_mined_thread,
             ComputeGasPriceThread(config, block_mined_thread),
             ClaimRewardsThread(config),
             PollRequestsThread(config, block_mined_thread),
-            PerformAuditThread(config),
+            PerformAuditThread(config, block_mined_thread),
             SubmitReportThread(config),
             MonitorSubmissionThread(config)
         ]
 
         if config.metric_collection_is_enabled:
-            self.__internal_threads.append(CollectMetricsThread(config))
+            self.__internal_threads.append(CollectMetricsThread(config, block_mined_thread,
+                                                                 self.__watchdog))
+
+        if config.evt_db_retention_blocks > 0:
+            self.__internal_threads.append(RetentionThread(config))
 
     @staticmethod
     def is_police_officer(config):
@@ -276,20 +281,21 @@ class QSPAuditNode:
         # Upon restart, before processing, set all events that timed out to err
         self.__timeout_stale_requests()
 
-        # Start all the threads
+        # Start all the threads, under the watch of the watchdog
+        self.__watchdog.watch(self.__internal_threads)
         for thread in self.__internal_threads:
             thread.start()
 
         self.__is_initialized = True
 
-        # Monitors the state of each thread in a busy loop fashion. Upon error, terminate the
-        # audit node. Checking whether a thread is alive or not does not account for timing out
-        # audits, which necessarily dies after processing them all.
-        health_check_interval_sec = 2
-
+        # Waits for a thread to exit, or to be woken up upon stop. Upon error, terminate the
+        # audit node. Meanwhile, the watchdog reports the threads whose iterations go over their
+        # budget.
         while self.__exec:
+            thread_exited = self.__watchdog.wait_for_exit()
+            if thread_exited is not None:
+                thread_exited.join()
             self.__check_all_threads()
-            sleep(health_check_interval_sec)
 
     def __check_all_threads(self):
         if not self.__exec:
@@ -312,6 +318,7 @@ class QSPAuditNode:
         Signals to the executing QSP audit node that is should stop the execution of the node.
         """
         self.__exec = False
+        self.__watchdog.wake()
         self.logger.info("Stopping QSP Audit Node")
 
         skip = []
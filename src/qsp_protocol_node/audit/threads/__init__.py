@@ -11,8 +11,10 @@ from .collect_metrics_thread import CollectMetricsThread
 from .monitor_submission_thread import MonitorSubmissionThread
 from .perform_audit_thread import PerformAuditThread
 from .qsp_thread import QSPThread, BlockMinedPollingThread
+from .retention_thread import RetentionThread
 from .submit_report_thread import SubmitReportThread
 from .poll_requests_thread import PollRequestsThread
+from .watchdog import Watchdog
 
 __all__ = ['QSPThread',
            'ClaimRewardsThread',
@@ -22,4 +24,6 @@ __all__ = ['QSPThread',
            'PerformAuditThread',
            'SubmitReportThread',
            'PollRequestsThread',
-           'BlockMinedPollingThread']
+           'BlockMinedPollingThread',
+           'RetentionThread',
+           'Watchdog']
@@ -0,0 +1,98 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2018, 2019 Quantstamp, Inc. This content and its use are governed by the license terms at    #
+# <https://s3.amazonaws.com/qsp-protocol-license/V2_LICENSE.txt>                                   #
+#                                                                                                  #
+####################################################################################################
+
+"""
+Provides the scheduling of the audits (and police checks) of the QSP Audit node implementation.
+"""
+
+from evt import is_police_check
+from log_streaming import get_logger
+from utils.eth import mk_read_only_call
+
+
+class AuditScheduler:
+    """
+    Orders the incoming events by earliest deadline first, the deadline of an event being the
+    block its report must be submitted before (the block it was assigned in, plus the audit
+    timeout in blocks). Since every event shares the same timeout, this is the order of the
+    blocks they were assigned in. Events of the same deadline are ordered by decreasing price.
+
+    Also tells whether the analyzers, which may run up to their timeout, can still finish before
+    the deadline of an event, given the time blocks take to be mined. The police timeout is not
+    exposed by the audit contract, so that police checks are never deemed unable to finish.
+    """
+
+    # Number of blocks the time blocks take to be mined is averaged over
+    BLOCK_TIME_SAMPLE = 20
+
+    # Assumed when the time blocks take cannot be measured (e.g., on a chain too short)
+    DEFAULT_BLOCK_TIME_SEC = 12
+
+    def __init__(self, config):
+        self.__config = config
+        self.__logger = get_logger(self.__class__.__qualname__)
+        self.__block_time_sec = None
+        self.__block_time_measured_at = None
+
+    def __measure_block_time(self, current_block):
+        if current_block < AuditScheduler.BLOCK_TIME_SAMPLE:
+            return AuditScheduler.DEFAULT_BLOCK_TIME_SEC
+        eth = self.__config.web3_client.eth
+        try:
+            elapsed = eth.getBlock(current_block)['timestamp'] - \
+                eth.getBlock(current_block - AuditScheduler.BLOCK_TIME_SAMPLE)['timestamp']
+        except Exception as error:
+            self.__logger.debug("Could not measure the block time: {0}".format(error))
+            return AuditScheduler.DEFAULT_BLOCK_TIME_SEC
+        return elapsed / AuditScheduler.BLOCK_TIME_SAMPLE
+
+    def block_time(self, current_block):
+        """
+        Returns the time (in seconds) blocks recently took to be mined, measured again once as
+        many blocks as sampled have been mined since the last measure.
+        """
+        if self.__block_time_measured_at is None or \
+                current_block - self.__block_time_measured_at >= AuditScheduler.BLOCK_TIME_SAMPLE:
+            self.__block_time_sec = self.__measure_block_time(current_block)
+            self.__block_time_measured_at = current_block
+        return self.__block_time_sec
+
+    @property
+    def audit_time(self):
+        """
+        Returns how long (in seconds) the analyzers may take, as they run in parallel up to their
+        timeout.
+        """
+        return max([analyzer.wrapper.timeout_sec for analyzer in self.__config.analyzers],
+                   default=0)
+
+    def timeout_limit_blocks(self):
+        return mk_read_only_call(
+            self.__config, self.__config.audit_contract.functions.getAuditTimeoutInBlocks()
+        )
+
+    @staticmethod
+    def deadline(evt, timeout_limit_blocks):
+        return evt['assigned_block_nbr'] + timeout_limit_blocks
+
+    @staticmethod
+    def order(evts):
+        """
+        Returns the events by earliest deadline first, and then by decreasing price.
+        """
+        return sorted(evts, key=lambda evt: (evt['assigned_block_nbr'], -int(evt['price'] or 0)))
+
+    def can_finish(self, evt, timeout_limit_blocks, current_block):
+        """
+        Returns whether the analyzers can finish before the deadline of the event, leaving a
+        block for the report to be submitted. Always true for police checks, whose deadline is
+        not known.
+        """
+        if is_police_check(evt):
+            return True
+        blocks_left = self.deadline(evt, timeout_limit_blocks) - current_block - 1
+        return blocks_left * self.block_time(current_block) >= self.audit_time
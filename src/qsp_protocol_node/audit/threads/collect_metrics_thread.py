@@ -21,7 +21,7 @@ class CollectMetricsThread(TimeIntervalPollingThread):
         """
         self.__metric_collector.collect_and_send()
 
-    def __init__(self, config):
+    def __init__(self, config, block_mined_polling_thread=None, watchdog=None):
         """
         Builds a QSPAuditNode object from the given input parameters.
         """
@@ -33,4 +33,4 @@ class CollectMetricsThread(TimeIntervalPollingThread):
             thread_name="collect metrics thread",
             start_with_call=False
         )
-        self.__metric_collector = MetricCollector(config)
+        self.__metric_collector = MetricCollector(config, block_mined_polling_thread, watchdog)
@@ -20,20 +20,24 @@ class MonitorSubmissionThread(TimeIntervalPollingThread):
     def __process_submissions(self):
         """
         Checks all events in state SB for timeout and sets the ones that timed out to state ER.
+        Returns the number of events whose status changed.
         """
         # Checks for a potential timeouts
         timeout_limit_blocks = mk_read_only_call(
             self.config, self.config.audit_contract.functions.getAuditTimeoutInBlocks()
         )
 
-        self.config.event_pool_manager.process_submission_events(
+        # Each event is moved on its own, so that a failing transition does not roll back the
+        # others (the transition of an event being atomic already)
+        return self.config.event_pool_manager.process_submission_events(
             self.__monitor_submission_timeout,
             timeout_limit_blocks,
         )
 
     def __monitor_submission_timeout(self, evt, timeout_limit_blocks):
         """
-        Sets the event to state ER if the timeout window passed.
+        Sets the event to state ER if the timeout window passed. Returns whether the status of
+        the event changed.
         """
         try:
             submission_attempts = evt['submission_attempts']
@@ -52,7 +56,7 @@ class MonitorSubmissionThread(TimeIntervalPollingThread):
                         "Waiting on report submission for {0}".format(evt['request_id']),
                         requestId=evt['request_id']
                     )
-                    return
+                    return False
 
                 # (Else) Submission is finished and final. Move its status to done.
                 evt['status_info'] = 'Report successfully submitted'
@@ -63,6 +67,7 @@ class MonitorSubmissionThread(TimeIntervalPollingThread):
                     ),
                     requestId=evt['request_id']
                 )
+                return True
             else:
                 assigned_block = evt['assigned_block_nbr']
 
@@ -106,6 +111,7 @@ class MonitorSubmissionThread(TimeIntervalPollingThread):
                     )
                     self.logger.debug(evt['status_info'], requestId=evt['request_id'])
                     self.config.event_pool_manager.set_evt_status_to_error(evt)
+                return True
 
         except KeyError as error:
             evt['status_info'] = "KeyError when monitoring submission and timeout: {0}".format(str(error))
@@ -115,6 +121,7 @@ class MonitorSubmissionThread(TimeIntervalPollingThread):
             # elsewhere!!! The field will not magically be given a value out
             # of nowhere...
             self.config.event_pool_manager.set_evt_status_to_error(evt)
+            return True
 
         except Exception as error:
             # TODO How to inform the network of a submission timeout?
@@ -129,6 +136,7 @@ class MonitorSubmissionThread(TimeIntervalPollingThread):
                 self.config.event_pool_manager.set_evt_status_to_error(evt)
             else:
                 self.config.event_pool_manager.set_evt_status_to_be_submitted(evt)
+            return True
 
     def __init__(self, config):
         """
@@ -138,5 +146,7 @@ class MonitorSubmissionThread(TimeIntervalPollingThread):
             self,
             config=config,
             target_function=self.__process_submissions,
-            thread_name="monitor thread"
+            thread_name="monitor thread",
+            wakeup_statuses=('SB',),
+            adaptive_polling=config.adaptive_polling.get('monitor'),
         )
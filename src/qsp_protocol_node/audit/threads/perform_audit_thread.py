@@ -18,6 +18,8 @@ import json
 import copy
 import threading
 
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from threading import Thread
 from evt import is_police_check
 from utils.io import (
@@ -30,6 +32,7 @@ from solc.exceptions import ContractsNotFound, SolcError
 from solc import compile_standard
 from subprocess import TimeoutExpired
 
+from .audit_scheduler import AuditScheduler
 from .qsp_thread import TimeIntervalPollingThread
 
 
@@ -50,9 +53,86 @@ class PerformAuditThread(TimeIntervalPollingThread):
     __EMPTY_COMPRESSED_REPORT = ""
 
     def __process_incoming(self):
-        self.config.event_pool_manager.process_incoming_events(
-            self.__process_audit_request
-        )
+        """
+        Hands the incoming events to the audit workers by earliest deadline first, as long as
+        some are free. Only one page of the incoming events not already in flight is pulled per
+        sweep, and ordered, so that a backlog is never loaded at once. Events whose deadline
+        cannot be met are set to error instead, if so configured. Returns the number of events
+        handed or set to error.
+        """
+        with self.__in_flight_lock:
+            if len(self.__in_flight) >= self.config.max_concurrent_audits:
+                return 0
+            in_flight = set(self.__in_flight)
+        event_pool_manager = self.config.event_pool_manager
+        candidates = (evt for evt in event_pool_manager.incoming_events()
+                      if (evt['request_id'], evt['fk_type']) not in in_flight)
+        evts = list(islice(candidates, event_pool_manager.page_size))
+        if len(evts) == 0:
+            return 0
+        # The timeout and the latest block are only needed to tell the unmeetable deadlines
+        discard = self.config.discard_unmeetable_audits
+        timeout_limit_blocks = None
+        current_block = None
+        if discard:
+            timeout_limit_blocks = self.__scheduler.timeout_limit_blocks()
+            current_block = self.__current_block()
+
+        processed = 0
+        for evt in AuditScheduler.order(evts):
+            key = (evt['request_id'], evt['fk_type'])
+            with self.__in_flight_lock:
+                if key in self.__in_flight:
+                    continue
+            if discard and not self.__scheduler.can_finish(evt, timeout_limit_blocks,
+                                                           current_block):
+                self.__discard(evt, timeout_limit_blocks, current_block)
+                processed += 1
+                continue
+            with self.__in_flight_lock:
+                if len(self.__in_flight) >= self.config.max_concurrent_audits:
+                    continue
+                self.__in_flight.add(key)
+            self.__workers.submit(self.__process_in_flight, key, evt)
+            processed += 1
+        return processed
+
+    def __current_block(self):
+        """
+        Returns the latest block known to the block mined polling thread, only querying it if
+        unknown.
+        """
+        if self.__block_mined_polling_thread is not None:
+            current_block = self.__block_mined_polling_thread.current_block
+            if current_block > 0:
+                return current_block
+        return self.config.web3_client.eth.blockNumber
+
+    def __discard(self, evt, timeout_limit_blocks, current_block):
+        report_type = "police" if is_police_check(evt) else "audit"
+        evt['status_info'] = "Cannot produce {0} report before deadline block {1} " \
+                             "(current block {2})".format(
+                                 report_type,
+                                 AuditScheduler.deadline(evt, timeout_limit_blocks),
+                                 current_block)
+        self.logger.warning(evt['status_info'], requestId=evt['request_id'])
+        self.config.event_pool_manager.set_evt_status_to_error(evt)
+
+    def __process_in_flight(self, key, evt):
+        try:
+            ack = self._run_iteration(self.__process_audit_request, evt,
+                                      worker=threading.current_thread().name)
+            # The event leaves status AS once its write is executed, and must not be handed
+            # again until then
+            if ack is not None:
+                ack.result()
+        except Exception as error:
+            self.logger.exception("Error processing event {0}: {1}".format(evt, error))
+        finally:
+            with self.__in_flight_lock:
+                self.__in_flight.discard(key)
+            # A worker is free to process the next event right away
+            self.wake()
 
     def __create_err_result(self, errors, warnings, request_id, requestor, uri, target_contract):
         result = {
@@ -398,7 +478,7 @@ class PerformAuditThread(TimeIntervalPollingThread):
                 self.logger.debug(
                     msg.format(str(evt['audit_uri'])), requestId=request_id, evt=evt
                 )
-                self.config.event_pool_manager.set_evt_status_to_be_submitted(evt)
+                return self.config.event_pool_manager.set_evt_status_to_be_submitted(evt)
         except KeyError as error:
             self.logger.exception(
                 "KeyError when trying to produce {0} report from request event {1}: {2}".format(report_type, evt,
@@ -411,9 +491,16 @@ class PerformAuditThread(TimeIntervalPollingThread):
                 requestId=request_id,
             )
             evt['status_info'] = traceback.format_exc()
-            self.config.event_pool_manager.set_evt_status_to_error(evt)
+            return self.config.event_pool_manager.set_evt_status_to_error(evt)
+
+    def run(self):
+        try:
+            TimeIntervalPollingThread.run(self)
+        finally:
+            # Waits for the audits in flight
+            self.__workers.shutdown(wait=True)
 
-    def __init__(self, config):
+    def __init__(self, config, block_mined_polling_thread=None):
         """
         Builds a QSPAuditNode object from the given input parameters.
         """
@@ -421,5 +508,16 @@ class PerformAuditThread(TimeIntervalPollingThread):
             self,
             config=config,
             target_function=self.__process_incoming,
-            thread_name="audit thread"
+            thread_name="audit thread",
+            wakeup_statuses=('AS',),
+            adaptive_polling=config.adaptive_polling.get('audit'),
         )
+        # Audits are performed by a pool of workers, writing their outcome through the single
+        # writer of the event pool manager. The events being audited are kept in flight, so as
+        # not to be handed twice
+        self.__workers = ThreadPoolExecutor(max_workers=config.max_concurrent_audits,
+                                            thread_name_prefix="audit worker")
+        self.__in_flight = set()
+        self.__in_flight_lock = threading.Lock()
+        self.__scheduler = AuditScheduler(config)
+        self.__block_mined_polling_thread = block_mined_polling_thread
@@ -6,8 +6,10 @@
 ####################################################################################################
 
 from abc import ABC, abstractmethod
-from time import sleep
 from time import time
+from threading import Condition
+from threading import Event
+from threading import Lock
 from threading import Thread
 
 from log_streaming import get_logger
@@ -16,9 +18,11 @@ from log_streaming import get_logger
 class QSPThread(Thread, ABC):
     """
     A class that all threads inside of the audit node should inherit from.
+
+    Threads do not wake up periodically to check whether they have something to do. Instead,
+    they block until their next deadline, or until they are notified of what they react to
+    (including being stopped).
     """
-    # Determines how long threads will sleep between waking up to react to events
-    THREAD_SLEEP_TIME = 0.1
 
     def __init__(self, config, target_function, thread_name,
                  start_with_call=True):
@@ -45,12 +49,48 @@ class QSPThread(Thread, ABC):
         # property)
         self._exec = False
 
+        # Set to interrupt the wait of the thread before its next deadline
+        self._wakeup = Event()
+
+        self.__watchdog = None
+
     @abstractmethod
     def run(self):
         pass
 
-    def sleep_time(self):
-        return QSPThread.THREAD_SLEEP_TIME
+    @property
+    def watchdog(self):
+        return self.__watchdog
+
+    @watchdog.setter
+    def watchdog(self, watchdog):
+        """
+        Has the thread send its heartbeats to the given watchdog.
+        """
+        self.__watchdog = watchdog
+
+    def _run_iteration(self, function, *args, worker=None):
+        """
+        Runs an iteration of the work of the thread, sending a heartbeat to the watchdog (if
+        any) when it starts and ends. Iterations run by a worker of the thread are reported
+        under the name of the worker, with the budget of the thread.
+        """
+        watchdog = self.__watchdog
+        if watchdog is None:
+            return function(*args)
+        name = self.name if worker is None else worker
+        watchdog.iteration_started(name, self.name)
+        try:
+            return function(*args)
+        finally:
+            watchdog.iteration_done(name)
+
+    def _exited(self):
+        """
+        Notifies the watchdog (if any) that the thread exits. To be called by run().
+        """
+        if self.__watchdog is not None:
+            self.__watchdog.thread_exited(self)
 
     @property
     def config(self):
@@ -69,72 +109,375 @@ class QSPThread(Thread, ABC):
         Signals to the thread that the execution of the internal function loop should be stopped.
         """
         self._exec = False
+        self._wakeup.set()
 
 
 class TimeIntervalPollingThread(QSPThread):
 
     def __init__(self, config, target_function, thread_name,
-                 polling_interval=None, start_with_call=True):
+                 polling_interval=None, start_with_call=True, wakeup_statuses=(),
+                 adaptive_polling=None):
+        """
+        Builds a thread executing the target function with the given interval. While running,
+        the thread is also woken up (see wake) whenever the event pool manager moves events into
+        any of the wakeup statuses, the periodic execution remaining as a fallback.
+
+        If adaptive polling is given (as a dictionary with keys min_sec and max_sec), the
+        interval is halved (down to min_sec) whenever the target function reports it processed
+        work, by returning a truthy value, and doubled (up to max_sec) otherwise.
+        """
         if polling_interval is None:
             polling_interval = config.evt_polling
 
         QSPThread.__init__(self, config, target_function, thread_name,
                            start_with_call)
+        self.__min_polling_interval = None
+        self.__max_polling_interval = None
+        if adaptive_polling is not None:
+            self.__min_polling_interval = adaptive_polling['min_sec']
+            self.__max_polling_interval = adaptive_polling['max_sec']
+            polling_interval = min(max(polling_interval, self.__min_polling_interval),
+                                   self.__max_polling_interval)
         self.__polling_interval = polling_interval
+        self.__wakeup_statuses = wakeup_statuses
+
+    @property
+    def polling_interval(self):
+        return self.__polling_interval
+
+    def __adapt_polling_interval(self, processed):
+        if self.__min_polling_interval is None:
+            return
+        if processed:
+            self.__polling_interval = max(self.__polling_interval / 2,
+                                          self.__min_polling_interval)
+        else:
+            self.__polling_interval = min(self.__polling_interval * 2,
+                                          self.__max_polling_interval)
+
+    def wake(self, *args):
+        """
+        Has the target function executed right away rather than upon the next interval.
+        """
+        self._wakeup.set()
 
     # This was previously named `run_with_interval`
     def run(self):
         """
-        Periodically executes the function with a given interval.
+        Periodically executes the function with a given interval, or as soon as woken up.
         """
         self._exec = True
         last_called = 0
         if not self._start_with_call:
             last_called = time()
-        while self._exec:
-            now = time()
-            if now - last_called > self.__polling_interval:
-                self._target_function()
-                last_called = now
-            sleep(self.sleep_time())
+        # Unsubscribed from the very manager subscribed to, even if replaced meanwhile
+        event_pool_manager = self.config.event_pool_manager
+        for status in self.__wakeup_statuses:
+            event_pool_manager.subscribe(status, self.wake)
+        try:
+            while self._exec:
+                now = time()
+                if self._wakeup.is_set() or now - last_called >= self.__polling_interval:
+                    # Cleared beforehand, so that wake-ups arriving during the execution
+                    # trigger yet another one
+                    self._wakeup.clear()
+                    processed = self._run_iteration(self._target_function)
+                    self.__adapt_polling_interval(processed)
+                    last_called = now
+                self._wakeup.wait(max(last_called + self.__polling_interval - time(), 0))
+        finally:
+            for status in self.__wakeup_statuses:
+                event_pool_manager.unsubscribe(status, self.wake)
+            self._exited()
+
+
+class BlockMinedSubscription:
+    """
+    The blocks mined pending for a subscriber of a BlockMinedPollingThread. Since blocks are
+    numbered consecutively, the blocks pending are those after the last one handed to the
+    subscriber, up to the latest one published, such that none is lost no matter how far behind
+    the subscriber falls, while the subscription remains bounded in size.
+
+    A coalescing subscription hands the latest block only, skipping those in between.
+    """
+
+    def __init__(self, name, current_block, coalesce):
+        self.__name = name
+        self.__coalesce = coalesce
+        self.__condition = Condition()
+        self.__closed = False
+        self.__head = current_block
+        self.__last_block = None
+        self.__max_lag = 0
+        self.__delivered = 0
+        self.__coalesced = 0
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def lag(self):
+        """
+        Returns how many blocks the subscriber is behind the latest block published.
+        """
+        with self.__condition:
+            return self.__lag()
+
+    def __lag(self):
+        if self.__last_block is None:
+            return 0
+        return self.__head - self.__last_block
+
+    def publish(self, block_number):
+        with self.__condition:
+            self.__head = block_number
+            self.__max_lag = max(self.__max_lag, self.__lag())
+            self.__condition.notify_all()
+
+    def close(self):
+        """
+        Has the subscriber waiting for a block (if any) return right away.
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+    def __has_pending(self):
+        if self.__last_block is None:
+            return self.__head > 0
+        return self.__head > self.__last_block
+
+    def next_block(self):
+        """
+        Blocks until a block is pending, returning it, or until the subscription is closed,
+        returning None. The first block handed is the latest one published.
+        """
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__closed or self.__has_pending())
+            if self.__closed:
+                return None
+            if self.__last_block is None or self.__coalesce:
+                if self.__last_block is not None:
+                    self.__coalesced += self.__head - self.__last_block - 1
+                self.__last_block = self.__head
+            else:
+                self.__last_block += 1
+            self.__delivered += 1
+            return self.__last_block
+
+    @property
+    def metrics(self):
+        with self.__condition:
+            return {
+                'lag': self.__lag(),
+                'maxLag': self.__max_lag,
+                'delivered': self.__delivered,
+                'coalesced': self.__coalesced,
+            }
+
+
+class BlockSource(ABC):
+    """
+    Tells the number of the latest block mined to the BlockMinedPollingThread.
+    """
+
+    def __init__(self, config):
+        self.__config = config
+        self.__logger = get_logger(self.__class__.__qualname__)
+
+    @property
+    def config(self):
+        return self.__config
+
+    @property
+    def logger(self):
+        return self.__logger
+
+    @abstractmethod
+    def latest_block(self, current_block):
+        """
+        Returns the number of the latest block mined, given the latest one known so far.
+        """
+        pass
+
+
+class PollingBlockSource(BlockSource):
+    """
+    Queries the number of the latest block every time.
+    """
+
+    def latest_block(self, current_block):
+        return self.config.web3_client.eth.blockNumber
+
+
+class FilterBlockSource(BlockSource):
+    """
+    Installs a block filter on the node (eth_newBlockFilter), and derives the latest block from
+    the number of new blocks the filter reports (eth_getFilterChanges). The number of the latest
+    block is only queried upon start, once the filter is reinstalled, once several blocks are
+    reported at once (e.g., upon a reorganization), and every RESYNC_BLOCKS blocks otherwise.
+    Raises upon creation if the node does not support filters.
+
+    The filter is still polled, as web3 4.2 has no push notifications over HTTP, so that it takes
+    as many calls to the node as polling the latest block number.
+    """
+
+    # Number of blocks derived from the filter before the latest block number is queried again
+    RESYNC_BLOCKS = 100
+
+    def __init__(self, config):
+        BlockSource.__init__(self, config)
+        self.__filter = config.web3_client.eth.filter('latest')
+        self.__resync = True
+        self.__derived_blocks = 0
+
+    def latest_block(self, current_block):
+        try:
+            mined = len(self.__filter.get_new_entries())
+        except Exception as error:
+            # Nodes drop filters after a while without being polled (e.g., upon a restart), in
+            # which case the blocks mined meanwhile are unknown
+            self.logger.debug("Reinstalling the block filter after error: {0}".format(error))
+            self.__resync = True
+            self.__filter = self.config.web3_client.eth.filter('latest')
+            mined = 0
+        if mined > 1 or current_block == 0:
+            self.__resync = True
+        if self.__derived_blocks + mined > FilterBlockSource.RESYNC_BLOCKS:
+            self.__resync = True
+        if self.__resync:
+            latest_block = self.config.web3_client.eth.blockNumber
+            self.__resync = False
+            self.__derived_blocks = 0
+            return latest_block
+        self.__derived_blocks += mined
+        return current_block + mined
 
 
 class BlockMinedPollingThread(QSPThread):
 
     def __init__(self, config):
         QSPThread.__init__(self, config, None, "block_mined_polling thread", False)
-        self.current_block = 0
+        self.__subscriptions = []
+        self.__subscriptions_lock = Lock()
+        self.__current_block = 0
+
+    @property
+    def current_block(self):
+        return self.__current_block
+
+    @current_block.setter
+    def current_block(self, block_number):
+        """
+        Publishes a new block to every subscriber.
+        """
+        with self.__subscriptions_lock:
+            self.__current_block = block_number
+            subscriptions = list(self.__subscriptions)
+        for subscription in subscriptions:
+            subscription.publish(block_number)
+            lag = subscription.lag
+            if lag > 1:
+                self.logger.debug("{0} is {1} blocks behind block {2}".format(
+                    subscription.name, lag, block_number))
+
+    def subscribe(self, name, coalesce=True):
+        """
+        Returns a new subscription to the blocks mined from now on.
+        """
+        with self.__subscriptions_lock:
+            subscription = BlockMinedSubscription(name, self.__current_block, coalesce)
+            self.__subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.__subscriptions_lock:
+            if subscription in self.__subscriptions:
+                self.__subscriptions.remove(subscription)
+        subscription.close()
+
+    @property
+    def subscriber_metrics(self):
+        """
+        Returns the lag of each subscriber, along with how many blocks it handled and skipped.
+        """
+        with self.__subscriptions_lock:
+            subscriptions = list(self.__subscriptions)
+        return {subscription.name: subscription.metrics for subscription in subscriptions}
+
+    def __create_block_source(self):
+        if self.config.block_mined_source == 'filter':
+            try:
+                return FilterBlockSource(self.config)
+            except Exception as error:
+                self.logger.warning(
+                    "Block filters are not supported, falling back to polling: {0}".format(error))
+                return PollingBlockSource(self.config)
+        if self.config.block_mined_source == 'polling':
+            return PollingBlockSource(self.config)
+        raise ValueError("Unknown/Unsupported block source: {0}".format(
+            self.config.block_mined_source))
 
     # This was previously named `run_when_block_mined`
     def run(self):
         """
-        Checks if a new block is mined. Reacting to a new block the handler is called.
+        Checks if a new block is mined, publishing it to the subscribers.
         """
         self._exec = True
-        last_called = 0
-        while self._exec:
-            now = time()
-            if now - last_called > self.config.block_mined_polling:
-                last_called = now
-                remote_block_number = self.config.web3_client.eth.blockNumber
+        try:
+            block_source = self.__create_block_source()
+            while self._exec:
+                remote_block_number = self._run_iteration(block_source.latest_block,
+                                                          self.current_block)
                 if self.current_block < remote_block_number:
                     self.current_block = remote_block_number
-            sleep(self.sleep_time())
+                self._wakeup.wait(self.config.block_mined_polling)
+        finally:
+            self._exited()
 
 
 class BlockMinedSubscriberThread(QSPThread):
-    def __init__(self, config, target_function, thread_name, block_mined_polling_thread):
+    def __init__(self, config, target_function, thread_name, block_mined_polling_thread,
+                 coalesce=True):
+        """
+        Builds a thread calling the target function with the blocks mined, either every one of
+        them or only the latest one should the thread fall behind (coalesce).
+        """
         QSPThread.__init__(self, config, target_function, thread_name, True)
         self.__block_mined_polling_thread = block_mined_polling_thread
+        self.__coalesce = coalesce
+        self.__subscription = None
+        # Guards the subscription against the thread being stopped while subscribing
+        self.__subscription_lock = Lock()
+        self.__stopped = False
 
     def run(self):
         """
-        Checks if a new block is mined. Reacting to a new block the handler is called.
+        Waits for a new block to be mined. Reacting to a new block the handler is called.
         """
-        self._exec = True
-        last_block_number = 0
-        while self._exec:
-            if last_block_number != self.__block_mined_polling_thread.current_block:
-                last_block_number = self.__block_mined_polling_thread.current_block
-                self._target_function(last_block_number)
-            sleep(self.sleep_time())
+        with self.__subscription_lock:
+            if self.__stopped:
+                # Stopped before running: there is nothing to unsubscribe from
+                self._exited()
+                return
+            self._exec = True
+            self.__subscription = self.__block_mined_polling_thread.subscribe(self.name,
+                                                                              self.__coalesce)
+        try:
+            while self._exec:
+                block_number = self.__subscription.next_block()
+                if block_number is not None and self._exec:
+                    self._run_iteration(self._target_function, block_number)
+        finally:
+            self.__block_mined_polling_thread.unsubscribe(self.__subscription)
+            self._exited()
+
+    def stop(self):
+        with self.__subscription_lock:
+            self.__stopped = True
+            QSPThread.stop(self)
+            subscription = self.__subscription
+        # The thread waits on its subscription rather than on its own wakeup event
+        if subscription is not None:
+            subscription.close()
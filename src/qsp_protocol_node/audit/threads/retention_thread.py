@@ -0,0 +1,65 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2018, 2019 Quantstamp, Inc. This content and its use are governed by the license terms at    #
+# <https://s3.amazonaws.com/qsp-protocol-license/V2_LICENSE.txt>                                   #
+#                                                                                                  #
+####################################################################################################
+
+"""
+Provides the thread keeping the event database small in the QSP Audit node implementation.
+"""
+
+from .qsp_thread import TimeIntervalPollingThread
+
+
+class RetentionThread(TimeIntervalPollingThread):
+    # How often (in seconds) old events are looked for
+    RETENTION_INTERVAL = 10 * 60
+
+    def __apply_retention(self):
+        """
+        Removes (or archives) the events that reached a terminal status more than the configured
+        number of blocks ago, one small batch at a time, and then gives the freed space back to the
+        file system, a few pages at a time. Each step is a short write of its own, letting the
+        writes of the other threads through in between.
+        """
+        try:
+            current_block = self.config.web3_client.eth.blockNumber
+        except Exception as error:
+            self.logger.warning("Could not apply the event retention: {0}".format(error))
+            return
+
+        before_block = current_block - self.config.evt_db_retention_blocks
+        removed = 0
+        while self.exec:
+            count = self.config.event_pool_manager.apply_retention(
+                before_block,
+                self.config.evt_db_retention_batch_size,
+            )
+            if count == 0:
+                break
+            removed += count
+
+        if removed > 0:
+            self.logger.info("Removed {0} events assigned before block {1}".format(
+                removed, before_block))
+
+        # Stops once no free page is left, or once a step releases none
+        free_pages = None
+        while self.exec:
+            left = self.config.event_pool_manager.vacuum(self.config.evt_db_vacuum_pages)
+            if left == 0 or left == free_pages:
+                break
+            free_pages = left
+
+    def __init__(self, config):
+        """
+        Builds the thread object from the given input parameters.
+        """
+        TimeIntervalPollingThread.__init__(
+            self,
+            config=config,
+            target_function=self.__apply_retention,
+            thread_name="retention thread",
+            polling_interval=RetentionThread.RETENTION_INTERVAL
+        )
@@ -30,7 +30,7 @@ class SubmitReportThread(TimeIntervalPollingThread):
     __SIMILARITY_THRESHOLD = .6
 
     def process_events_to_be_submitted(self):
-        self.config.event_pool_manager.process_events_to_be_submitted(
+        return self.config.event_pool_manager.process_events_to_be_submitted(
             self.__process_submission_request
         )
 
@@ -221,5 +221,7 @@ class SubmitReportThread(TimeIntervalPollingThread):
             self,
             config=config,
             target_function=self.process_events_to_be_submitted,
-            thread_name="submission thread"
+            thread_name="submission thread",
+            wakeup_statuses=('TS',),
+            adaptive_polling=config.adaptive_polling.get('submission'),
         )
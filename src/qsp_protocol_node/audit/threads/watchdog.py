@@ -0,0 +1,169 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2018, 2019 Quantstamp, Inc. This content and its use are governed by the license terms at    #
+# <https://s3.amazonaws.com/qsp-protocol-license/V2_LICENSE.txt>                                   #
+#                                                                                                  #
+####################################################################################################
+
+"""
+Provides the watchdog keeping track of the health of the threads of the QSP Audit node.
+"""
+
+from threading import Condition
+from time import time
+
+from log_streaming import get_logger
+
+
+class Watchdog:
+    """
+    Receives the heartbeats of the threads of the node, sent whenever an iteration of their work
+    starts and ends, and the notification of their exit.
+
+    An iteration lasting longer than the budget of its thread is reported as stalled, which
+    tells which stage of the node is blocking the others (e.g., a transaction that takes forever
+    to be sent), even though its thread is still alive. Stalls are logged and counted in the
+    metrics of the threads, but do not stop the node: a stalled iteration may still complete.
+    """
+
+    def __init__(self, budget_sec, budgets=None):
+        """
+        Builds a watchdog allowing the iterations of every thread the given budget, unless
+        overridden for the thread in budgets (by thread name).
+        """
+        self.__logger = get_logger(self.__class__.__qualname__)
+        self.__budget_sec = budget_sec
+        self.__budgets = budgets if budgets is not None else {}
+        self.__condition = Condition()
+        self.__threads = {}
+        self.__exited = []
+        self.__woken = False
+
+    def budget(self, thread_name):
+        return self.__budgets.get(thread_name, self.__budget_sec)
+
+    def watch(self, threads):
+        """
+        Starts watching the given threads, forgetting about the ones watched before.
+        """
+        with self.__condition:
+            self.__threads = {}
+            self.__exited = []
+            self.__woken = False
+        for thread in threads:
+            thread.watchdog = self
+
+    def __health(self, thread_name):
+        health = self.__threads.get(thread_name)
+        if health is None:
+            health = {
+                'started': None,
+                'budgetName': thread_name,
+                'lastHeartbeat': None,
+                'iterations': 0,
+                'lastIterationSec': 0,
+                'maxIterationSec': 0,
+                'stalled': False,
+                'stalls': 0,
+            }
+            self.__threads[thread_name] = health
+        return health
+
+    def iteration_started(self, thread_name, budget_name=None):
+        """
+        Records the start of an iteration of the given thread, whose budget is the one of
+        budget_name if given (e.g., for the workers of a thread).
+        """
+        with self.__condition:
+            health = self.__health(thread_name)
+            health['budgetName'] = thread_name if budget_name is None else budget_name
+            health['started'] = time()
+            health['lastHeartbeat'] = health['started']
+            health['stalled'] = False
+            # The deadline of the iteration may come before the one waited upon
+            self.__condition.notify_all()
+
+    def iteration_done(self, thread_name):
+        with self.__condition:
+            health = self.__health(thread_name)
+            now = time()
+            duration = now - health['started']
+            if health['stalled']:
+                self.__logger.warning("{0} is no longer stalled after {1:.1f}s".format(
+                    thread_name, duration))
+            health['started'] = None
+            health['lastHeartbeat'] = now
+            health['iterations'] += 1
+            health['lastIterationSec'] = duration
+            health['maxIterationSec'] = max(health['maxIterationSec'], duration)
+            health['stalled'] = False
+
+    def thread_exited(self, thread):
+        with self.__condition:
+            self.__exited.append(thread)
+            self.__condition.notify_all()
+
+    def wake(self):
+        """
+        Has wait_for_exit return right away.
+        """
+        with self.__condition:
+            self.__woken = True
+            self.__condition.notify_all()
+
+    def __check_stalls(self, now):
+        """
+        Reports the iterations which went over their budget, returning the earliest deadline of
+        the others (None if there is none).
+        """
+        deadline = None
+        for thread_name, health in self.__threads.items():
+            if health['started'] is None or health['stalled']:
+                continue
+            budget = self.budget(health['budgetName'])
+            if now - health['started'] >= budget:
+                health['stalled'] = True
+                health['stalls'] += 1
+                self.__logger.warning("{0} is stalled: its iteration exceeds {1}s".format(
+                    thread_name, budget))
+            elif deadline is None or health['started'] + budget < deadline:
+                deadline = health['started'] + budget
+        return deadline
+
+    def wait_for_exit(self):
+        """
+        Blocks until a watched thread exits, returning it, or until woken up, returning None.
+        Stalled iterations are reported meanwhile, when their budget runs out.
+        """
+        with self.__condition:
+            while not self.__woken and len(self.__exited) == 0:
+                now = time()
+                deadline = self.__check_stalls(now)
+                self.__condition.wait(None if deadline is None else deadline - now)
+            if len(self.__exited) > 0:
+                return self.__exited.pop(0)
+            self.__woken = False
+            return None
+
+    @property
+    def metrics(self):
+        """
+        Returns, for each thread, when it last sent a heartbeat, how long its current iteration
+        (if any) has been running, how many iterations it completed and how long they took, and
+        how many times it stalled.
+        """
+        with self.__condition:
+            now = time()
+            return {
+                thread_name: {
+                    'lastHeartbeat': health['lastHeartbeat'],
+                    'busySec': 0 if health['started'] is None else now - health['started'],
+                    'iterations': health['iterations'],
+                    'lastIterationSec': health['lastIterationSec'],
+                    'maxIterationSec': health['maxIterationSec'],
+                    'budgetSec': self.budget(health['budgetName']),
+                    'stalled': health['stalled'],
+                    'stalls': health['stalls'],
+                }
+                for thread_name, health in self.__threads.items()
+            }
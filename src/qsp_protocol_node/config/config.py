@@ -15,8 +15,10 @@ import utils.io as io_utils
 from dpath.util import get
 from os.path import expanduser
 
+from audit import AnalyzerCache
 from audit.report_processing import ReportEncoder
 from evt import EventPoolManager
+from evt import InMemoryEventStore
 from utils.eth import mk_checksum_address
 
 # FIXME
@@ -48,6 +50,11 @@ class Config:
     """
     Provides a set of methods for accessing configuration parameters.
     """
+    @staticmethod
+    def __expand_path(path):
+        # Paths may be given relative to the home directory (e.g., "~/.audit_node.archive.db")
+        return None if path is None else expanduser(path)
+
     def __fetch_contract_metadata(self, cfg, config_utils, contract_abi):
         metadata_uri = config_utils.resolve_version(
             config_value(cfg, '/' + contract_abi + '/metadata'))
@@ -83,16 +90,45 @@ class Config:
         self.__max_assigned_requests = config_value(cfg, '/max_assigned_requests',
                                                     accept_none=False)
         self.__evt_polling_sec = config_value(cfg, '/evt_polling_sec', accept_none=False)
+        self.__max_concurrent_audits = config_value(cfg, '/max_concurrent_audits', 1)
+        self.__discard_unmeetable_audits = config_value(cfg, '/discard_unmeetable_audits', False)
         self.__block_mined_polling_interval_sec = config_value(cfg,
                                                                '/block_mined_polling_interval_sec',
                                                                accept_none=False)
+        self.__block_mined_source = config_value(cfg, '/block_mined_source', 'polling')
+        self.__watchdog_budget_sec = config_value(cfg, '/watchdog/budget_sec', 600)
+        self.__watchdog_budgets = config_value(cfg, '/watchdog/budgets', {})
+        self.__adaptive_polling = config_value(cfg, '/adaptive_polling', {})
         self.__analyzers = []
         self.__analyzers_config = config_value(cfg, '/analyzers', accept_none=False)
+        self.__analyzer_cache_path = Config.__expand_path(
+            config_value(cfg, '/analyzer_cache/path', None))
+        self.__analyzer_cache_max_size_mb = config_value(cfg, '/analyzer_cache/max_size_mb', 100)
         self.__account_keystore_file = config_value(cfg, '/keystore_file', None)
         self.__account_private_key = None
         self.__gas_limit = config_value(cfg, '/gas_limit')
         self.__evt_db_path = config_value(cfg, '/evt_db_path',
                                           expanduser("~") + "/" + ".audit_node.db")
+        self.__evt_db_group_commit_size = config_value(cfg, '/evt_db/group_commit_size', 1)
+        self.__evt_db_group_commit_latency_sec = config_value(cfg,
+                                                              '/evt_db/group_commit_latency_sec',
+                                                              0)
+        self.__evt_db_reader_pool_size = config_value(cfg, '/evt_db/reader_pool_size', 0)
+        self.__evt_db_wal_checkpoint_pages = config_value(cfg, '/evt_db/wal_checkpoint_pages',
+                                                          1000)
+        self.__evt_db_page_size = config_value(cfg, '/evt_db/page_size', 100)
+        self.__evt_db_archive_path = Config.__expand_path(
+            config_value(cfg, '/evt_db/archive_path', None))
+        self.__evt_db_retention_blocks = config_value(cfg, '/evt_db/retention_blocks', 0)
+        self.__evt_db_retention_batch_size = config_value(cfg, '/evt_db/retention_batch_size',
+                                                          100)
+        self.__evt_db_vacuum_pages = config_value(cfg, '/evt_db/vacuum_pages', 100)
+        self.__evt_db_rebuild_for_auto_vacuum = config_value(cfg,
+                                                             '/evt_db/rebuild_for_auto_vacuum',
+                                                             False)
+        self.__evt_db_engine = config_value(cfg, '/evt_db/engine', 'sqlite')
+        self.__evt_db_snapshot_path = Config.__expand_path(
+            config_value(cfg, '/evt_db/snapshot_path', None))
         self.__submission_timeout_limit_blocks = config_value(cfg,
                                                               '/submission_timeout_limit_blocks',
                                                               10)
@@ -138,6 +174,31 @@ class Config:
                                                    self.upload_provider_args,
                                                    self.upload_provider_is_enabled)
 
+    def __create_event_pool_manager(self):
+        """
+        Creates the event store of the configured engine.
+        """
+        if self.evt_db_engine == 'sqlite':
+            return EventPoolManager(
+                self.evt_db_path,
+                group_commit_size=self.evt_db_group_commit_size,
+                group_commit_latency_sec=self.evt_db_group_commit_latency_sec,
+                reader_pool_size=self.evt_db_reader_pool_size,
+                wal_checkpoint_pages=self.evt_db_wal_checkpoint_pages,
+                page_size=self.evt_db_page_size,
+                archive_path=self.evt_db_archive_path,
+                rebuild_for_auto_vacuum=self.evt_db_rebuild_for_auto_vacuum,
+            )
+
+        if self.evt_db_engine == 'memory':
+            return InMemoryEventStore(
+                snapshot_path=self.evt_db_snapshot_path,
+                page_size=self.evt_db_page_size,
+            )
+
+        raise ValueError("Unknown/Unsupported event database engine: {0}".format(
+            self.evt_db_engine))
+
     def __create_web3_client(self, config_utils):
         """
         Creates a Web3 client from the already set Ethereum provider.
@@ -155,11 +216,20 @@ class Config:
         return config_utils.create_contract(self.web3_client, self.audit_contract_abi_uri,
                                             self.audit_contract_address)
 
+    def __create_analyzer_cache(self):
+        """
+        Creates the cache of the analyzer reports, if configured.
+        """
+        if self.analyzer_cache_path is None:
+            return None
+        return AnalyzerCache(self.analyzer_cache_path,
+                             self.analyzer_cache_max_size_mb * 1024 * 1024)
+
     def __create_analyzers(self, config_utils):
         """
         Creates an instance of the each target analyzer that should be verifying a given contract.
         """
-        return config_utils.create_analyzers(self.analyzers_config)
+        return config_utils.create_analyzers(self.analyzers_config, self.analyzer_cache)
 
     def __create_components(self, config_utils, validate_contract_settings=True):
         # Creation of internal components
@@ -181,8 +251,9 @@ class Config:
         if validate_contract_settings:
             config_utils.check_configuration_settings(self)
 
+        self.__analyzer_cache = self.__create_analyzer_cache()
         self.__analyzers = self.__create_analyzers(config_utils)
-        self.__event_pool_manager = EventPoolManager(self.evt_db_path)
+        self.__event_pool_manager = self.__create_event_pool_manager()
         self.__report_encoder = ReportEncoder()
         self.__upload_provider = self.__create_upload_provider(config_utils)
 
@@ -208,6 +279,9 @@ class Config:
         self.__node_version = '2.0.4'
         self.__analyzers = []
         self.__analyzers_config = []
+        self.__analyzer_cache_path = None
+        self.__analyzer_cache_max_size_mb = 100
+        self.__analyzer_cache = None
         self.__audit_contract_name = None
         self.__audit_contract_address = None
         self.__audit_contract_abi_uri = None
@@ -220,7 +294,21 @@ class Config:
         self.__config_file_uri = None
         self.__gas_limit = 0
         self.__evt_db_path = None
+        self.__evt_db_group_commit_size = 1
+        self.__evt_db_group_commit_latency_sec = 0
+        self.__evt_db_reader_pool_size = 0
+        self.__evt_db_wal_checkpoint_pages = 1000
+        self.__evt_db_page_size = 100
+        self.__evt_db_archive_path = None
+        self.__evt_db_retention_blocks = 0
+        self.__evt_db_retention_batch_size = 100
+        self.__evt_db_vacuum_pages = 100
+        self.__evt_db_rebuild_for_auto_vacuum = False
+        self.__evt_db_engine = 'sqlite'
+        self.__evt_db_snapshot_path = None
         self.__evt_polling_sec = 0
+        self.__max_concurrent_audits = 1
+        self.__discard_unmeetable_audits = False
         self.__event_pool_manager = None
         self.__env = None
         self.__eth_provider_name = None
@@ -245,6 +333,10 @@ class Config:
         self.__submission_timeout_limit_blocks = 10
         self.__web3_client = None
         self.__block_discard_on_restart = 0
+        self.__block_mined_source = 'polling'
+        self.__watchdog_budget_sec = 600
+        self.__watchdog_budgets = {}
+        self.__adaptive_polling = {}
         self.__contract_version = None
         self.__enable_police_audit_polling = False
 
@@ -305,6 +397,21 @@ class Config:
         """
         return self.__max_assigned_requests
 
+    @property
+    def max_concurrent_audits(self):
+        """
+        Returns the maximum number of audits (and police checks) performed at once.
+        """
+        return self.__max_concurrent_audits
+
+    @property
+    def discard_unmeetable_audits(self):
+        """
+        Returns whether audits whose deadline cannot be met given the analyzer timeouts are set
+        to error rather than performed.
+        """
+        return self.__discard_unmeetable_audits
+
     @property
     def evt_polling(self):
         """
@@ -319,6 +426,39 @@ class Config:
         """
         return self.__block_mined_polling_interval_sec
 
+    @property
+    def block_mined_source(self):
+        """
+        Returns how new blocks are detected: "filter" (a block filter on the node, falling back to
+        polling if unsupported) or "polling" (querying the latest block number).
+        """
+        return self.__block_mined_source
+
+    @property
+    def watchdog_budget_sec(self):
+        """
+        Returns how long an iteration of a thread may take before being reported as stalled
+        (given in seconds).
+        """
+        return self.__watchdog_budget_sec
+
+    @property
+    def watchdog_budgets(self):
+        """
+        Returns the budgets (given in seconds) overriding watchdog_budget_sec for specific
+        threads, by thread name.
+        """
+        return self.__watchdog_budgets
+
+    @property
+    def adaptive_polling(self):
+        """
+        Returns the bounds (min_sec and max_sec) of the adaptive polling interval of the
+        threads processing events ("audit", "submission", and "monitor"), which poll every
+        evt_polling seconds unless given.
+        """
+        return self.__adaptive_polling
+
     @property
     def report_encoder(self):
         """
@@ -473,6 +613,91 @@ class Config:
         """
         return self.__evt_db_path
 
+    @property
+    def evt_db_group_commit_size(self):
+        """
+        Returns the maximum number of event pool writes committed in a single transaction.
+        """
+        return self.__evt_db_group_commit_size
+
+    @property
+    def evt_db_group_commit_latency_sec(self):
+        """
+        Returns how long a group commit may wait for further writes (given in seconds).
+        """
+        return self.__evt_db_group_commit_latency_sec
+
+    @property
+    def evt_db_reader_pool_size(self):
+        """
+        Returns the number of read-only connections serving event pool selects.
+        """
+        return self.__evt_db_reader_pool_size
+
+    @property
+    def evt_db_wal_checkpoint_pages(self):
+        """
+        Returns the size of the event database write-ahead log (in pages) triggering a checkpoint.
+        """
+        return self.__evt_db_wal_checkpoint_pages
+
+    @property
+    def evt_db_page_size(self):
+        """
+        Returns the maximum number of events fetched at once when scanning the event database.
+        """
+        return self.__evt_db_page_size
+
+    @property
+    def evt_db_archive_path(self):
+        """
+        Returns the path of the database archiving old events (None if they are dropped).
+        """
+        return self.__evt_db_archive_path
+
+    @property
+    def evt_db_retention_blocks(self):
+        """
+        Returns how many blocks old terminal events are kept in the event database (0 if forever).
+        """
+        return self.__evt_db_retention_blocks
+
+    @property
+    def evt_db_retention_batch_size(self):
+        """
+        Returns the maximum number of events removed from the event database in one transaction.
+        """
+        return self.__evt_db_retention_batch_size
+
+    @property
+    def evt_db_vacuum_pages(self):
+        """
+        Returns the maximum number of pages released by each incremental vacuum step.
+        """
+        return self.__evt_db_vacuum_pages
+
+    @property
+    def evt_db_rebuild_for_auto_vacuum(self):
+        """
+        Returns whether an event database created before incremental auto-vacuum was enabled is
+        rebuilt upon start up to enable it.
+        """
+        return self.__evt_db_rebuild_for_auto_vacuum
+
+    @property
+    def evt_db_engine(self):
+        """
+        Returns the engine storing the events ("sqlite" or "memory").
+        """
+        return self.__evt_db_engine
+
+    @property
+    def evt_db_snapshot_path(self):
+        """
+        Returns the file the in-memory engine snapshots the events to (None if it does not).
+        """
+        return self.__evt_db_snapshot_path
+
     @property
     def submission_timeout_limit_blocks(self):
         """
@@ -538,6 +763,27 @@ class Config:
     def analyzers_config(self):
         return self.__analyzers_config
 
+    @property
+    def analyzer_cache_path(self):
+        """
+        Returns the directory the analyzer reports are cached in (None if they are not).
+        """
+        return self.__analyzer_cache_path
+
+    @property
+    def analyzer_cache_max_size_mb(self):
+        """
+        Returns the size the analyzer report cache is bounded to (given in megabytes).
+        """
+        return self.__analyzer_cache_max_size_mb
+
+    @property
+    def analyzer_cache(self):
+        """
+        Returns the cache of the analyzer reports (None if they are not cached).
+        """
+        return self.__analyzer_cache
+
     @property
     def contract_version(self):
         """
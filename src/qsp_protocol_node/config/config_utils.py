@@ -240,9 +240,10 @@ class ConfigUtils:
             result = version.replace('{major-version}', major_version)
         return result
 
-    def create_analyzers(self, analyzers_config):
+    def create_analyzers(self, analyzers_config, analyzer_cache=None):
         """
-        Creates an instance of the each target analyzer that should be verifying a given contract.
+        Creates an instance of the each target analyzer that should be verifying a given contract,
+        sharing the given cache of reports (if any).
         """
         default_timeout_sec = 60
         default_storage = gettempdir()
@@ -273,7 +274,7 @@ class ConfigUtils:
                 analyzer_name,
             )
 
-            analyzers.append(Analyzer(wrapper))
+            analyzers.append(Analyzer(wrapper, analyzer_cache))
 
         return analyzers
 
@@ -5,10 +5,14 @@
 #                                                                                                  #
 ####################################################################################################
 
+from .evt import AuditEvent
 from .evt import is_audit
 from .evt import is_police_check
 from .evt import set_evt_as_audit
 from .evt import set_evt_as_police_check
+from .event_store import EventStore
 from .evt_pool_manager import EventPoolManager
+from .memory_event_store import InMemoryEventStore
 
-__all__ = ['EventPoolManager', 'is_audit', 'is_police_check', 'set_evt_as_audit', 'set_evt_as_police_check']
+__all__ = ['AuditEvent', 'EventPoolManager', 'EventStore', 'InMemoryEventStore', 'is_audit',
+           'is_police_check', 'set_evt_as_audit', 'set_evt_as_police_check']
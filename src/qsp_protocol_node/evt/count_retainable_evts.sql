@@ -0,0 +1,8 @@
+select count(*) as count
+from (
+    select 1
+    from audit_evt
+    where fk_status in ('DN', 'ER')
+      and assigned_block_nbr < ?
+    limit ?
+)
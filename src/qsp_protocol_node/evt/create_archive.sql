@@ -0,0 +1,9 @@
+create table if not exists archive.audit_evt as
+select *
+from main.audit_evt
+where 0;
+
+create table if not exists archive.audit_report as
+select *
+from main.audit_report
+where 0;
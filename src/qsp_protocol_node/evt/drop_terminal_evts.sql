@@ -0,0 +1,24 @@
+create temp table if not exists retained_evt (
+    request_id,
+    fk_type
+);
+
+delete from temp.retained_evt;
+
+insert into temp.retained_evt
+select request_id, fk_type
+from main.audit_evt
+where fk_status in ('DN', 'ER')
+  and assigned_block_nbr < :before_block
+order by assigned_block_nbr
+limit :batch_size;
+
+insert or ignore into main.removed_evt
+select request_id, fk_type
+from temp.retained_evt;
+
+delete from main.audit_report
+where (request_id, fk_type) in (select request_id, fk_type from temp.retained_evt);
+
+delete from main.audit_evt
+where (request_id, fk_type) in (select request_id, fk_type from temp.retained_evt);
@@ -0,0 +1,230 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2018, 2019 Quantstamp, Inc. This content and its use are governed by the license terms at    #
+# <https://s3.amazonaws.com/qsp-protocol-license/V2_LICENSE.txt>                                   #
+#                                                                                                  #
+####################################################################################################
+
+import threading
+
+from abc import ABC, abstractmethod
+from log_streaming import get_logger
+
+logger = get_logger(__name__)
+
+
+class EventStore(ABC):
+    """
+    Interface of the storage engines holding the audit events of the node, which the threads of
+    the node access through config.event_pool_manager.
+
+    Events go through the statuses AS (assigned), TS (to be submitted), SB (submitted), DN (done),
+    and ER (error), and are identified by their request id and type. Scans over the events of a
+    status yield them ordered by (request_id, fk_type), as AuditEvent records whose reports are
+    loaded on demand.
+
+    Every method writing to the store returns a WriteAck, which callers may wait upon to learn
+    whether the write committed, or None if the store is closed or the write belongs to a
+    transaction unit.
+
+    Writes publish the status they move events into to the callbacks subscribed to it, so that
+    the threads processing a status can be woken up right away rather than upon their next
+    sweep. Writes of a transaction unit are only published once the unit is committed.
+    """
+
+    def __init__(self):
+        self.__subscribers = {}
+        self.__subscribers_lock = threading.Lock()
+
+    def subscribe(self, status, callback):
+        """
+        Registers a callback, invoked (with the status) on the thread of the writer whenever
+        events are moved into the given status. Callbacks must thus return quickly.
+        """
+        with self.__subscribers_lock:
+            self.__subscribers.setdefault(status, []).append(callback)
+
+    def unsubscribe(self, status, callback):
+        with self.__subscribers_lock:
+            callbacks = self.__subscribers.get(status, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def _publish(self, statuses):
+        """
+        Invokes the callbacks subscribed to any of the given statuses.
+        """
+        for status in statuses:
+            with self.__subscribers_lock:
+                callbacks = list(self.__subscribers.get(status, ()))
+            for callback in callbacks:
+                try:
+                    callback(status)
+                except Exception as error:
+                    logger.error("Error notifying transition to {0}: {1}".format(status, error))
+
+    @abstractmethod
+    def transaction_unit(self):
+        """
+        Returns a context manager within which the writes of the calling thread are committed
+        atomically once the block exits, and discarded altogether should it raise. The unit it
+        yields holds the acknowledgement of its writes in its ack attribute once committed.
+        """
+        pass
+
+    @abstractmethod
+    def add_evt_to_be_assigned(self, evt):
+        pass
+
+    @abstractmethod
+    def add_evts_to_be_assigned(self, evts):
+        """
+        Adds many events at once. Events failing to be inserted (e.g., already existing ones) do
+        not prevent the insertion of the others.
+        """
+        pass
+
+    @abstractmethod
+    def is_request_processed(self, request_id, fk_type=None):
+        """
+        Returns whether an event (of the given type, if any) exists for a request id.
+        """
+        pass
+
+    @abstractmethod
+    def get_event_by_request_id(self, request_id):
+        """
+        Returns an event of the given request id, or an empty dictionary if there is none.
+        """
+        pass
+
+    @abstractmethod
+    def get_report(self, request_id, fk_type):
+        """
+        Returns the full and compressed reports of an event.
+        """
+        pass
+
+    @abstractmethod
+    def get_latest_block_number(self):
+        """
+        Returns the block number of the latest event in the store or -1 if the store is empty.
+        """
+        pass
+
+    @abstractmethod
+    def get_latest_request_id(self):
+        """
+        Returns the request id of the latest event in the store or -1 if the store is empty.
+        """
+        pass
+
+    @abstractmethod
+    def incoming_events(self):
+        """
+        Yields the events in status AS.
+        """
+        pass
+
+    @abstractmethod
+    def events_to_be_submitted(self):
+        """
+        Yields the events in status TS.
+        """
+        pass
+
+    @abstractmethod
+    def submission_events(self):
+        """
+        Yields the events in status SB.
+        """
+        pass
+
+    @abstractmethod
+    def set_evt_status_to_be_submitted(self, evt):
+        pass
+
+    @abstractmethod
+    def set_evt_status_to_submitted(self, evt):
+        pass
+
+    @abstractmethod
+    def set_evt_status_to_done(self, evt):
+        pass
+
+    @abstractmethod
+    def set_evt_status_to_error(self, evt):
+        pass
+
+    @abstractmethod
+    def apply_retention(self, before_block, batch_size=100):
+        """
+        Removes up to batch_size events having reached a terminal status (done or error) and
+        assigned before the given block, returning the number of events removed.
+        """
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    def vacuum(self, pages):
+        """
+        Returns up to the given number of free pages to the file system, returning the number of
+        free pages left. Stores without pages have nothing to return.
+        """
+        return 0
+
+    @property
+    def checkpoint_metrics(self):
+        """
+        Returns the checkpoint statistics of the store, if it has any.
+        """
+        return {}
+
+    @property
+    def query_metrics(self):
+        """
+        Returns the statistics of the queries run against the store, if it keeps any.
+        """
+        return {}
+
+    def dump_query_metrics(self):
+        """
+        Logs the statistics of the queries run against the store, if it keeps any.
+        """
+        pass
+
+    def get_next_block_number(self):
+        current = self.get_latest_block_number()
+        if current < 0 or current is None:
+            return 0
+        return current + 1
+
+    # The process_* methods return the number of events processed
+
+    def process_incoming_events(self, process_fct):
+        processed = 0
+        for evt in self.incoming_events():
+            process_fct(evt)
+            processed += 1
+        return processed
+
+    def process_events_to_be_submitted(self, process_fct):
+        processed = 0
+        for evt in self.events_to_be_submitted():
+            process_fct(evt)
+            processed += 1
+        return processed
+
+    def process_submission_events(self, monitor_fct, timeout_limit_blocks):
+        """
+        Monitors the submitted events, returning the number of them whose status changed (i.e.,
+        for which monitor_fct returns True). Events still waiting for their submission to be
+        confirmed are not counted as processed.
+        """
+        processed = 0
+        for evt in self.submission_events():
+            if monitor_fct(evt, timeout_limit_blocks=timeout_limit_blocks):
+                processed += 1
+        return processed
@@ -25,3 +25,116 @@ def set_evt_as_audit(evt):
 def set_evt_as_police_check(evt):
     evt['fk_type'] = __POLICE_CHECK
     return evt
+
+
+class AuditEvent:
+    """
+    Compact record of an audit event, holding one slot per column of audit_evt (plus the reports,
+    which are only fetched from the database, and decompressed, upon first access). It supports
+    the dictionary operations used throughout the node, so it can be used wherever an event dict
+    is expected. As with a dict, fields never assigned are absent.
+    """
+    FIELDS = (
+        'request_id',
+        'requestor',
+        'contract_uri',
+        'evt_name',
+        'assigned_block_nbr',
+        'submission_block_nbr',
+        'fk_status',
+        'fk_type',
+        'price',
+        'status_info',
+        'tx_hash',
+        'submission_attempts',
+        'is_persisted',
+        'audit_uri',
+        'audit_hash',
+        'audit_state',
+    )
+    REPORT_KEYS = ('full_report', 'compressed_report')
+    KEYS = FIELDS + REPORT_KEYS
+
+    __slots__ = KEYS + ('__load_report',)
+    __hash__ = None
+
+    def __init__(self, fields=(), load_report=None):
+        self.__load_report = load_report
+        for key, value in dict(fields).items():
+            self[key] = value
+
+    @classmethod
+    def record_factory(cls, load_report=None):
+        """
+        Returns a record factory (as expected by a RowTracer) building events out of the rows of
+        a statement. The slot of each column is looked up once per statement, not once per row.
+        """
+        def make_record_builder(columns):
+            slots = [(i, getattr(cls, column)) for i, column in enumerate(columns)
+                     if column in cls.KEYS]
+
+            def build(row):
+                evt = cls.__new__(cls)
+                evt.__load_report = load_report
+                for i, slot in slots:
+                    slot.__set__(evt, row[i])
+                return evt
+
+            return build
+
+        return make_record_builder
+
+    def __load_reports(self):
+        reports = self.__load_report(self['request_id'], self['fk_type'])
+        for key in AuditEvent.REPORT_KEYS:
+            # Reports assigned in the meantime take precedence over the stored ones
+            if key not in self:
+                setattr(self, key, reports.get(key))
+
+    def __getitem__(self, key):
+        if key not in AuditEvent.KEYS:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            if key not in AuditEvent.REPORT_KEYS or self.__load_report is None:
+                raise KeyError(key)
+        self.__load_reports()
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in AuditEvent.KEYS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in AuditEvent.KEYS and hasattr(self, key)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if not isinstance(other, (AuditEvent, dict)):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+
+    def __repr__(self):
+        return "AuditEvent({0})".format(dict(self.items()))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [key for key in AuditEvent.KEYS if hasattr(self, key)]
+
+    def values(self):
+        return [getattr(self, key) for key in self.keys()]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
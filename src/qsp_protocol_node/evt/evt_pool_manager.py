@@ -7,63 +7,125 @@
 
 import apsw
 import os
+import threading
+import zlib
 
+from contextlib import contextmanager
 from log_streaming import get_logger
 
 from pathlib import Path
+from utils.db import Sqlite3ReaderPool
 from utils.db import Sqlite3Worker
+from utils.db import TransactionUnit
 from utils.db import get_first
 
+from .event_store import EventStore
+from .evt import AuditEvent
+from .statement_registry import StatementRegistry
+
 logger = get_logger(__name__)
 
 
-class EventPoolManager:
-    @staticmethod
-    def __encode(dictionary):
-        if dictionary is None:
-            return None
+class EventPoolManager(EventStore):
+    """
+    Event store backed by a SQLite database, accessed through a single writer thread (see
+    Sqlite3Worker) and the statements of the .sql files alongside this module.
+    """
 
-        new_dictionary = {}
-        for key in dictionary.keys():
-            if dictionary[key] is not None \
-                and (key == "price" or key == 'assigned_block_nbr' or key == 'submission_block_nbr'):
-                new_dictionary[key] = str(dictionary[key])
-            else:
-                new_dictionary[key] = dictionary[key]
+    # Prices (in wei) may not fit into a SQLite integer. They are stored as decimal strings,
+    # zero-padded to the width of a uint256 so that their order is the numeric one
+    __PRICE_DIGITS = 78
 
-        return new_dictionary
+    # Key preceding that of every event, from which paginated scans start
+    __FIRST_PAGE_KEY = (-1, '')
 
     @staticmethod
-    def __decode(dictionary):
-        if dictionary is None:
+    def __encode_price(price):
+        return str(price).zfill(EventPoolManager.__PRICE_DIGITS)
+
+    @staticmethod
+    def __decode(row):
+        """
+        Converts, in place, the price of a row fetched from the database back to an integer.
+        Block numbers are stored as integers and need no conversion.
+        """
+        if row is None:
             return None
 
-        new_dictionary = {}
-        for key in dictionary.keys():
-            if dictionary[key] is not None \
-                and (key == "price" or key == 'assigned_block_nbr' or key == 'submission_block_nbr'):
-                new_dictionary[key] = int(dictionary[key])
-            else:
-                new_dictionary[key] = dictionary[key]
+        price = row.get('price')
+        if price is not None:
+            row['price'] = int(price)
 
-        return new_dictionary
+        return row
 
     @staticmethod
-    def __query_path(query):
-        return "{0}/{1}.sql".format(
-            os.path.dirname(os.path.abspath(__file__)),
-            query,
-        )
+    def __compress_report(report):
+        if report is None:
+            return None
+        return zlib.compress(report.encode('utf-8'))
 
     @staticmethod
-    def __exec_sql(worker, query, values=(), error_handler=None):
-        query_file = EventPoolManager.__query_path(query)
-        result = worker.execute_script(query_file, values, error_handler)
+    def __decompress_report(compressed):
+        if compressed is None:
+            return None
+        return zlib.decompress(compressed).decode('utf-8')
+
+    def __exec_sql(self, query, values=(), error_handler=None, record_factory=None, wait=False):
+        statement = self.__statements[query]
+        unit = self.__current_unit
+        if unit is not None and not statement.is_select and not wait:
+            # Deferred until the unit of the calling thread is committed
+            unit.add(statement.sql, values, error_handler)
+            return None
+
+        if self.__reader_pool is not None and statement.is_select:
+            # Selects are served concurrently by the reader pool
+            result = self.__reader_pool.execute(statement.sql, values, error_handler,
+                                                record_factory=record_factory,
+                                                name=query)
+        else:
+            result = self.__sqlworker.execute(statement.sql, values, error_handler,
+                                              wait=wait,
+                                              is_select=statement.is_select,
+                                              record_factory=record_factory,
+                                              name=query)
         if result == Sqlite3Worker.EXIT_TOKEN:
-            return []
+            return [] if statement.is_select else None
         else:
             return result
 
+    def __migrate(self):
+        """
+        Brings the schema of the database up to date, applying (in order) every migration whose
+        version is greater than the one recorded in the database. Each migration runs in its own
+        transaction, which also records its version.
+        """
+        version = self.schema_version
+        for name in self.__migrations.names:
+            migration_version = int(name.split('_')[0])
+            if migration_version <= version:
+                continue
+
+            migration = self.__migrations[name]
+            err = self.__sqlworker.execute(
+                "{0}\npragma user_version = {1};".format(migration.sql, migration_version),
+                wait=True,
+                is_select=False,
+            )
+            if err is not None:
+                raise Exception("Could not apply migration {0}: {1}".format(name, err))
+
+            logger.info("Applied event database migration {0}".format(name))
+            version = migration_version
+
+    @property
+    def schema_version(self):
+        """
+        Returns the version of the schema recorded in the database.
+        """
+        rows = self.__sqlworker.execute("pragma user_version", is_select=True)
+        return get_first(rows, 'user_version')
+
     @staticmethod
     def insert_error_handler(sql_worker, query, values, err):
         """
@@ -89,16 +151,45 @@ class EventPoolManager:
                 err
             )
 
-    def __init__(self, db_path):
+    def __init__(self, db_path, group_commit_size=1, group_commit_latency_sec=0,
+                 reader_pool_size=0, wal_checkpoint_pages=1000, page_size=100,
+                 archive_path=None, rebuild_for_auto_vacuum=False):
         # Gets a connection with the SQL3Lite server
         # Must be explicitly closed by calling `close` on the same
         # EventPool object. The connection is created with autocommit
-        # mode on
+        # mode on, unless group commit is enabled (group_commit_size > 1), in which
+        # case queued writes are committed together.
+        #
+        # The database is opened in WAL mode. The single worker thread remains
+        # the only writer, whereas selects are served by a pool of read-only
+        # connections (if reader_pool_size > 0)
+        #
+        # Scans over events sharing a status fetch at most page_size events at a time
+        #
+        # The database is in incremental auto-vacuum mode, so that the space of the events
+        # removed by the retention (and moved to the archive database, if any) is given back
+        # to the file system in small steps. A database created before is only switched to that
+        # mode (by rebuilding it, which can take long) if rebuild_for_auto_vacuum is set
+        EventStore.__init__(self)
         db_existed = False
         db_created = False
         error = False
 
         self.__sqlworker = None
+        self.__reader_pool = None
+        self.__page_size = page_size
+        self.__archive_path = archive_path
+        # Types of the events known for each request id, answering whether a request has been
+        # processed without querying the database
+        self.__request_types = {}
+        self.__request_types_lock = threading.Lock()
+        # Transaction unit (if any) collecting the writes of each thread
+        self.__units = threading.local()
+        # Events are fetched as AuditEvent records, loading their reports on demand
+        self.__evt_record_factory = AuditEvent.record_factory(self.get_report)
+        self.__statements = StatementRegistry(os.path.dirname(os.path.abspath(__file__)))
+        self.__migrations = StatementRegistry(
+            "{0}/migrations".format(os.path.dirname(os.path.abspath(__file__))))
         db_file = None
         try:
             db_file = Path(db_path)
@@ -106,11 +197,38 @@ class EventPoolManager:
             if db_file.is_file() and db_file.stat().st_size > 0:
                 db_existed = True
 
-            self.__sqlworker = Sqlite3Worker(file_name=db_path, max_queue_size=10000)
+            self.__sqlworker = Sqlite3Worker(file_name=db_path,
+                                             max_queue_size=10000,
+                                             group_commit_size=group_commit_size,
+                                             group_commit_latency_sec=group_commit_latency_sec,
+                                             journal_mode="wal",
+                                             wal_checkpoint_pages=wal_checkpoint_pages,
+                                             auto_vacuum="incremental",
+                                             rebuild_for_auto_vacuum=rebuild_for_auto_vacuum)
             db_created = True
 
+            # Makes compression available to migrations moving reports around
+            self.__sqlworker.create_scalar_function('zlib_compress',
+                                                    EventPoolManager.__compress_report, 1)
+
             if not db_existed:
-                EventPoolManager.__exec_sql(self.__sqlworker, 'createdb')
+                self.__exec_sql('createdb')
+
+            self.__migrate()
+
+            if archive_path is not None:
+                err = self.__sqlworker.attach(archive_path, 'archive')
+                if err is not None:
+                    raise Exception("Could not attach archive database: {0}".format(err))
+                self.__exec_sql('create_archive', wait=True)
+
+            # Loaded before the reader pool is created, since its connections do not see the
+            # archive database
+            self.__load_request_keys()
+
+            if reader_pool_size > 0:
+                self.__reader_pool = Sqlite3ReaderPool(db_path, self.__sqlworker,
+                                                       size=reader_pool_size)
 
         except Exception:
             error = True
@@ -118,6 +236,8 @@ class EventPoolManager:
 
         finally:
             if error:
+                if self.__reader_pool is not None:
+                    self.__reader_pool.close()
                 if self.__sqlworker is not None:
                     self.__sqlworker.close()
 
@@ -128,129 +248,325 @@ class EventPoolManager:
     def sql3lite_worker(self):
         return self.__sqlworker
 
+    @property
+    def reader_pool(self):
+        return self.__reader_pool
+
+    @property
+    def __current_unit(self):
+        return getattr(self.__units, 'current', None)
+
+    @contextmanager
+    def transaction_unit(self):
+        """
+        Collects the writes the calling thread issues within the block into a transaction unit,
+        queued as a single job and committed atomically once the block exits (unless it raises).
+        Writes issued within the block return None, the acknowledgement of the whole unit being
+        left in the ack attribute of the unit. Blocks nested within a unit join it.
+        """
+        unit = self.__current_unit
+        if unit is not None:
+            yield unit
+            return
+
+        unit = TransactionUnit()
+        self.__units.current = unit
+        self.__units.statuses = set()
+        try:
+            yield unit
+        finally:
+            self.__units.current = None
+
+        if len(unit) > 0:
+            self.__sqlworker.execute_unit(unit, name='transaction_unit')
+            self._publish(self.__units.statuses)
+
+    def __publish(self, status):
+        """
+        Publishes a transition, once the unit of the calling thread (if any) is committed. Since
+        reads are served after the writes queued before them, subscribers see the transition
+        even though its write may not have been executed yet.
+        """
+        if self.__current_unit is not None:
+            self.__units.statuses.add(status)
+        else:
+            self._publish((status,))
+
+    @property
+    def page_size(self):
+        return self.__page_size
+
+    @property
+    def checkpoint_metrics(self):
+        """
+        Returns the WAL checkpoint statistics of the event database.
+        """
+        return self.__sqlworker.checkpoint_stats
+
+    @property
+    def query_metrics(self):
+        """
+        Returns the statistics of the queries run against the event database: for each of them,
+        its wait and execution time histograms, counts, and rows, plus the peak queue depth.
+        """
+        return self.__sqlworker.query_stats.snapshot()
+
+    def dump_query_metrics(self):
+        """
+        Logs the statistics of the queries run against the event database, one line per query.
+        """
+        logger.debug("Event database query statistics:\n{0}".format(
+            self.__sqlworker.query_stats.dump()))
+
     def get_latest_block_number(self):
         """
         Returns the block number of the latest event in the database or -1 if the database is empty.
         """
-        row = get_first(EventPoolManager.__exec_sql(self.__sqlworker, 'get_latest_block_number'))
-        return EventPoolManager.__decode(row).get('assigned_block_nbr')
+        return get_first(self.__exec_sql('get_latest_block_number'), 'assigned_block_nbr')
 
-    def is_request_processed(self, request_id):
-        row = self.get_event_by_request_id(request_id)
-        return not (row is None or row == {})
-
-    def get_next_block_number(self):
-        current = self.get_latest_block_number()
-        if current < 0 or current is None:
-            return 0
-        return current + 1
+    @staticmethod
+    def __request_key(request_id):
+        # Request ids have numeric affinity in the database, so that 1 and '1' are the same
+        try:
+            return int(request_id)
+        except (TypeError, ValueError):
+            return request_id
+
+    def __add_request_key(self, request_id, fk_type):
+        with self.__request_types_lock:
+            key = EventPoolManager.__request_key(request_id)
+            self.__request_types.setdefault(key, set()).add(fk_type)
+
+    def __remove_request_key(self, request_id, fk_type):
+        with self.__request_types_lock:
+            key = EventPoolManager.__request_key(request_id)
+            types = self.__request_types.get(key, set())
+            types.discard(fk_type)
+            if len(types) == 0:
+                self.__request_types.pop(key, None)
+
+    def __load_request_keys(self):
+        """
+        Loads the keys of the events of the database, including those the retention moved to
+        the archive database (if any) or dropped.
+        """
+        query_names = ['get_request_keys']
+        if self.__archive_path is not None:
+            query_names.append('get_archived_request_keys')
+        for query_name in query_names:
+            for row in self.__exec_sql(query_name):
+                self.__add_request_key(row['request_id'], row['fk_type'])
+
+    def __add_evt_error_handler(self, sql_worker, query, values, err):
+        EventPoolManager.insert_error_handler(sql_worker, query, values, err)
+        if not (isinstance(err, apsw.ConstraintError) and "audit_evt.request_id" in str(err)):
+            # The event did not make it into the database
+            self.__remove_request_key(values[0], values[6])
+
+    def is_request_processed(self, request_id, fk_type=None):
+        """
+        Returns whether an event (of the given type, if any) exists for a request id. The answer
+        comes from memory and accounts for events whose insertion is still queued.
+        """
+        with self.__request_types_lock:
+            types = self.__request_types.get(EventPoolManager.__request_key(request_id), set())
+            return len(types) > 0 if fk_type is None else fk_type in types
 
     def get_latest_request_id(self):
         """
         Returns the request id of the latest event in the database or -1 if the database is empty.
         """
-        row = get_first(EventPoolManager.__exec_sql(self.__sqlworker, 'get_latest_request_id'))
-        return EventPoolManager.__decode(row).get('request_id')
+        return get_first(self.__exec_sql('get_latest_request_id'), 'request_id')
+
+    def __to_be_assigned_values(self, evt):
+        self.__add_request_key(evt['request_id'], evt['fk_type'])
+        return (
+            evt['request_id'],
+            evt['requestor'],
+            evt['contract_uri'],
+            evt['evt_name'],
+            evt['assigned_block_nbr'],
+            evt['status_info'],
+            evt['fk_type'],
+            EventPoolManager.__encode_price(evt['price']),
+        )
 
     def add_evt_to_be_assigned(self, evt):
-        encoded_evt = EventPoolManager.__encode(evt)
-
-        EventPoolManager.__exec_sql(
-            self.__sqlworker,
+        ack = self.__exec_sql(
             'add_evt_to_be_assigned',
-            values=(
-                encoded_evt['request_id'],
-                encoded_evt['requestor'],
-                encoded_evt['contract_uri'],
-                encoded_evt['evt_name'],
-                encoded_evt['assigned_block_nbr'],
-                encoded_evt['status_info'],
-                encoded_evt['fk_type'],
-                encoded_evt['price'],
-            ),
-            error_handler=EventPoolManager.insert_error_handler
+            values=self.__to_be_assigned_values(evt),
+            error_handler=self.__add_evt_error_handler
         )
+        self.__publish('AS')
+        return ack
+
+    def add_evts_to_be_assigned(self, evts):
+        """
+        Adds many events at once, inserted within a single transaction. Events failing to be
+        inserted (e.g., already existing ones) are reported as add_evt_to_be_assigned does,
+        without preventing the insertion of the others. For that reason, the insertion is never
+        part of a transaction unit, being queued on its own even within one.
+        """
+        values_list = [self.__to_be_assigned_values(evt) for evt in evts]
+        if len(values_list) == 0:
+            return None
 
-    def __process_evt_with_status(self, query_name, fct, values=(), fct_kwargs=None):
-        for evt in EventPoolManager.__exec_sql(self.__sqlworker, query_name, values):
-            decoded_evt = EventPoolManager.__decode(evt)
-            if fct_kwargs is None:
-                fct(decoded_evt, **{})
-            else:
-                fct(decoded_evt, **fct_kwargs)
+        ack = self.__sqlworker.execute_many(
+            self.__statements['add_evt_to_be_assigned'].sql,
+            values_list,
+            error_handler=self.__add_evt_error_handler,
+            name='add_evts_to_be_assigned',
+        )
+        if ack == Sqlite3Worker.EXIT_TOKEN:
+            return None
+        self._publish(('AS',))
+        return ack
+
+    def __iter_evt_with_status(self, query_name):
+        """
+        Yields the events returned by a query, fetching them one page at a time. Pages are
+        delimited by the key of the last event seen (rather than an offset), so that events
+        changing status while being iterated over neither get skipped nor repeated.
+        """
+        key = EventPoolManager.__FIRST_PAGE_KEY
+        while True:
+            rows = self.__exec_sql(query_name, key + (self.__page_size,),
+                                   record_factory=self.__evt_record_factory)
+            for row in rows:
+                yield EventPoolManager.__decode(row)
+
+            if len(rows) < self.__page_size:
+                break
+            key = (rows[-1]['request_id'], rows[-1]['fk_type'])
 
     def get_event_by_request_id(self, request_id):
-        rows = EventPoolManager.__exec_sql(self.__sqlworker, 'get_event_by_request_id',
-                                           (request_id,))
+        rows = self.__exec_sql('get_event_by_request_id', (request_id,),
+                               record_factory=self.__evt_record_factory)
         row = get_first(rows)
+        if len(row) == 0:
+            return row
         return EventPoolManager.__decode(row)
 
-    def process_incoming_events(self, process_fct):
-        self.__process_evt_with_status(
-            'get_events_to_be_processed',
-            process_fct,
-        )
+    def get_report(self, request_id, fk_type):
+        """
+        Returns the (decompressed) full and compressed reports of an event.
+        """
+        row = get_first(self.__exec_sql('get_evt_report', (request_id, fk_type)))
+        return {
+            'full_report': EventPoolManager.__decompress_report(row.get('full_report')),
+            'compressed_report': EventPoolManager.__decompress_report(
+                row.get('compressed_report')),
+        }
 
-    def process_events_to_be_submitted(self, process_fct):
-        self.__process_evt_with_status(
-            'get_events_to_be_submitted',
-            process_fct,
-        )
+    def incoming_events(self):
+        return self.__iter_evt_with_status('get_events_to_be_processed')
 
-    def process_submission_events(self, monitor_fct, timeout_limit_blocks):
-        kw_args = {'timeout_limit_blocks': timeout_limit_blocks}
-        self.__process_evt_with_status(
-            'get_events_to_be_monitored',
-            monitor_fct,
-            fct_kwargs=kw_args,
-        )
+    def events_to_be_submitted(self):
+        return self.__iter_evt_with_status('get_events_to_be_submitted')
+
+    def submission_events(self):
+        return self.__iter_evt_with_status('get_events_to_be_monitored')
 
     def set_evt_status_to_be_submitted(self, evt):
-        encoded_evt = EventPoolManager.__encode(evt)
-        EventPoolManager.__exec_sql(
-            self.__sqlworker,
-            'set_evt_status_to_be_submitted',
-            (encoded_evt['status_info'],
-             encoded_evt['tx_hash'],
-             encoded_evt['audit_uri'],
-             encoded_evt['audit_hash'],
-             encoded_evt['audit_state'],
-             encoded_evt['full_report'],
-             encoded_evt['compressed_report'],
-             encoded_evt['submission_block_nbr'],
-             encoded_evt['request_id'],
-             ),
-        )
+        # Reports are only (re)written when the event carries them, i.e., not when
+        # resubmitting an event whose reports have never been loaded. The report and
+        # the status are committed together
+        with self.transaction_unit() as unit:
+            if 'full_report' in evt or 'compressed_report' in evt:
+                self.__exec_sql(
+                    'set_evt_report',
+                    (evt['request_id'],
+                     evt['fk_type'],
+                     EventPoolManager.__compress_report(evt['full_report']),
+                     EventPoolManager.__compress_report(evt['compressed_report']),
+                     ),
+                )
+            self.__exec_sql(
+                'set_evt_status_to_be_submitted',
+                (evt['status_info'],
+                 evt['tx_hash'],
+                 evt['audit_uri'],
+                 evt['audit_hash'],
+                 evt['audit_state'],
+                 evt['submission_block_nbr'],
+                 evt['request_id'],
+                 ),
+            )
+            self.__publish('TS')
+        return unit.ack
 
     def set_evt_status_to_submitted(self, evt):
-        encoded_evt = EventPoolManager.__encode(evt)
-        EventPoolManager.__exec_sql(
-            self.__sqlworker,
+        ack = self.__exec_sql(
             'set_evt_status_to_submitted',
-            (encoded_evt['tx_hash'],
-             encoded_evt['status_info'],
-             encoded_evt['audit_uri'],
-             encoded_evt['audit_hash'],
-             encoded_evt['audit_state'],
-             encoded_evt['request_id'],
+            (evt['tx_hash'],
+             evt['status_info'],
+             evt['audit_uri'],
+             evt['audit_hash'],
+             evt['audit_state'],
+             evt['request_id'],
              ),
         )
+        self.__publish('SB')
+        return ack
 
     def set_evt_status_to_done(self, evt):
-        encoded_evt = EventPoolManager.__encode(evt)
-        EventPoolManager.__exec_sql(
-            self.__sqlworker,
+        ack = self.__exec_sql(
             'set_evt_status_to_done',
-            (encoded_evt['status_info'], encoded_evt['request_id'],),
+            (evt['status_info'], evt['request_id'],),
         )
+        self.__publish('DN')
+        return ack
 
     def set_evt_status_to_error(self, evt):
-        encoded_evt = EventPoolManager.__encode(evt)
-        EventPoolManager.__exec_sql(
-            self.__sqlworker,
+        ack = self.__exec_sql(
             'set_evt_status_to_error',
-            (encoded_evt['status_info'], encoded_evt['request_id'],),
+            (evt['status_info'], evt['request_id'],),
         )
+        self.__publish('ER')
+        return ack
+
+    def apply_retention(self, before_block, batch_size=100):
+        """
+        Removes up to batch_size events having reached a terminal status (done or error) and
+        assigned before the given block, moving them (along with their reports) to the archive
+        database, if any. The events are removed within a single, short transaction. Returns the
+        number of events actually removed by it.
+
+        Removed events are still regarded as processed, including after a restart: the keys of
+        the dropped ones are kept in the removed_evt table.
+        """
+        count = get_first(
+            self.__exec_sql('count_retainable_evts', (before_block, batch_size)), 'count')
+        if not count:
+            return 0
+
+        query_name = 'archive_terminal_evts'
+        if self.__archive_path is None:
+            query_name = 'drop_terminal_evts'
+        err = self.__exec_sql(
+            query_name,
+            {'before_block': before_block, 'batch_size': batch_size},
+            wait=True,
+        )
+        if err is not None:
+            return 0
+        # The events removed are those the statement retained, which only the connection of the
+        # writer sees
+        statement = self.__statements['count_retained_evts']
+        rows = self.__sqlworker.execute(statement.sql, is_select=True, name=statement.name)
+        if isinstance(rows, str):
+            # Exiting, or failed (the error being logged by the worker)
+            return 0
+        return get_first(rows, 'count')
+
+    def vacuum(self, pages):
+        """
+        Returns up to the given number of free pages to the file system, returning the number of
+        free pages left.
+        """
+        return self.__sqlworker.incremental_vacuum(pages)
 
     def close(self):
+        if self.__reader_pool is not None:
+            self.__reader_pool.close()
         self.__sqlworker.close()
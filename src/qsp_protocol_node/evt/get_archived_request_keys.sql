@@ -0,0 +1,2 @@
+select request_id, fk_type
+from archive.audit_evt
@@ -1,3 +1,6 @@
 select *
 from audit_evt
 where fk_status = 'TS'
+  and (request_id, fk_type) > (?, ?)
+order by request_id, fk_type
+limit ?
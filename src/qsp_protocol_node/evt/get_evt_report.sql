@@ -0,0 +1,3 @@
+select full_report, compressed_report
+from audit_report
+where request_id = ? and fk_type = ?
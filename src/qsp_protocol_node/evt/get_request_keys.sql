@@ -0,0 +1,5 @@
+select request_id, fk_type
+from audit_evt
+union
+select request_id, fk_type
+from removed_evt
@@ -0,0 +1,476 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2018, 2019 Quantstamp, Inc. This content and its use are governed by the license terms at    #
+# <https://s3.amazonaws.com/qsp-protocol-license/V2_LICENSE.txt>                                   #
+#                                                                                                  #
+####################################################################################################
+
+import heapq
+import json
+import os
+import threading
+
+from concurrent.futures import Future
+from contextlib import contextmanager
+from log_streaming import get_logger
+from utils.db import WriteAck
+
+from .event_store import EventStore
+from .evt import AuditEvent
+
+logger = get_logger(__name__)
+
+
+class MemoryUnit:
+    """
+    Writes of a transaction unit of an InMemoryEventStore, applied together once committed.
+    """
+
+    def __init__(self):
+        self.__writes = []
+        # Acknowledgement of the unit, once committed
+        self.ack = None
+        # Statuses the writes of the unit move events into, published once committed
+        self.statuses = set()
+
+    def add(self, write):
+        self.__writes.append(write)
+
+    @property
+    def writes(self):
+        return list(self.__writes)
+
+    def __len__(self):
+        return len(self.__writes)
+
+
+class InMemoryEventStore(EventStore):
+    """
+    Event store keeping the events in memory, in a dictionary keyed by (request_id, fk_type) plus
+    the set of keys in each status, so that neither SQLite nor a writer thread are involved. Each
+    operation follows the statement of the SQLite engine (EventPoolManager) it stands for, so that
+    both engines can be compared on identical workloads.
+
+    Writes are applied right away, under a lock, and acknowledged as committed. If a snapshot path
+    is given, the events are loaded from it (if it exists) upon creation and written back to it
+    upon snapshot() and close(); otherwise, they are lost once the store is closed.
+    """
+
+    STATUSES = ('AS', 'TS', 'SB', 'DN', 'ER')
+
+    # Statuses from which events may be set to TS or DN
+    __PENDING_STATUSES = ('AS', 'TS', 'SB')
+
+    __TERMINAL_STATUSES = ('DN', 'ER')
+
+    @staticmethod
+    def __numeric(value):
+        # Mirrors the numeric affinity of the request id and block number columns, so that 1
+        # and '1' are the same
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+
+    @staticmethod
+    def __order(key):
+        # Numbers come before strings, as they do in SQLite
+        request_id, fk_type = key
+        return isinstance(request_id, str), request_id, fk_type
+
+    def __init__(self, snapshot_path=None, page_size=100):
+        EventStore.__init__(self)
+        self.__snapshot_path = snapshot_path
+        self.__page_size = page_size
+        self.__lock = threading.RLock()
+        self.__closed = False
+        # Fields and reports of each event, keyed by (request_id, fk_type)
+        self.__evts = {}
+        self.__reports = {}
+        self.__keys_by_status = {status: set() for status in InMemoryEventStore.STATUSES}
+        # Number of times an event entered each status, telling scans when to sort again
+        self.__status_entries = dict.fromkeys(InMemoryEventStore.STATUSES, 0)
+        self.__types_by_request = {}
+        # Types of the events ever added for each request id, which (as in the SQLite engine)
+        # still count as processed once removed by the retention
+        self.__request_types = {}
+        # Maxima of the block numbers and request ids, recomputed only once an event holding
+        # them is removed
+        self.__latest = None
+        # Transaction unit (if any) collecting the writes of each thread
+        self.__units = threading.local()
+
+        if snapshot_path is not None and os.path.isfile(snapshot_path):
+            self.__load_snapshot()
+
+    @property
+    def page_size(self):
+        return self.__page_size
+
+    @property
+    def __current_unit(self):
+        return getattr(self.__units, 'current', None)
+
+    @contextmanager
+    def transaction_unit(self):
+        """
+        Collects the writes the calling thread issues within the block, applying them together
+        once the block exits (unless it raises). Should any of them fail, those already applied
+        are undone. Blocks nested within a unit join it.
+        """
+        unit = self.__current_unit
+        if unit is not None:
+            yield unit
+            return
+
+        unit = MemoryUnit()
+        self.__units.current = unit
+        try:
+            yield unit
+        finally:
+            self.__units.current = None
+
+        if len(unit) > 0:
+            unit.ack = self.__commit(unit.writes)
+            self._publish(unit.statuses)
+
+    def __write(self, write, status):
+        unit = self.__current_unit
+        if unit is not None:
+            unit.add(write)
+            unit.statuses.add(status)
+            return None
+        ack = self.__commit([write])
+        self._publish((status,))
+        return ack
+
+    def __commit(self, writes):
+        """
+        Applies writes (each one a function taking the undo log and returning an error or None)
+        atomically, returning the WriteAck of their outcome.
+        """
+        if self.__closed:
+            return None
+        with self.__lock:
+            undo = []
+            outcome = None
+            for write in writes:
+                outcome = write(undo)
+                if outcome is not None:
+                    for restore in reversed(undo):
+                        restore()
+                    break
+        future = Future()
+        future.set_result(outcome)
+        return WriteAck(future)
+
+    def __set_evt(self, key, evt, undo=None):
+        """
+        Replaces (or removes, if evt is None) the event of a key, keeping the indexes in sync.
+        """
+        if undo is not None:
+            previous = self.__evts.get(key)
+            undo.append(lambda: self.__set_evt(key, previous))
+
+        previous = self.__evts.pop(key, None)
+        previous_status = None if previous is None else previous['fk_status']
+        status = None if evt is None else evt['fk_status']
+        if previous_status != status:
+            if previous_status is not None:
+                self.__keys_by_status[previous_status].discard(key)
+            if status is not None:
+                self.__keys_by_status[status].add(key)
+                self.__status_entries[status] += 1
+
+        if evt is None:
+            if previous is not None:
+                types = self.__types_by_request[key[0]]
+                types.discard(key[1])
+                if len(types) == 0:
+                    del self.__types_by_request[key[0]]
+                self.__latest = None
+            return
+
+        self.__evts[key] = evt
+        self.__types_by_request.setdefault(key[0], set()).add(key[1])
+        if self.__latest is not None:
+            self.__latest = (max(self.__latest[0], evt['assigned_block_nbr']),
+                             max(self.__latest[1], key[0]))
+
+    def __set_report(self, key, report, undo=None):
+        if undo is not None:
+            previous = self.__reports.get(key)
+            undo.append(lambda: self.__set_report(key, previous))
+        if report is None:
+            self.__reports.pop(key, None)
+        else:
+            self.__reports[key] = report
+
+    def __add_request_type(self, key, undo=None):
+        types = self.__request_types.setdefault(key[0], set())
+        if key[1] in types:
+            return
+        types.add(key[1])
+        if undo is not None:
+            undo.append(lambda: types.discard(key[1]))
+
+    def __update(self, request_id, statuses, changes, undo):
+        """
+        Applies changes (a function updating the fields of an event) to the events of a request
+        id whose status is one of the given ones (None for any), as the update statements of the
+        SQLite engine do.
+        """
+        request_id = InMemoryEventStore.__numeric(request_id)
+        for fk_type in list(self.__types_by_request.get(request_id, ())):
+            key = (request_id, fk_type)
+            evt = self.__evts[key]
+            if statuses is None or evt['fk_status'] in statuses:
+                updated = dict(evt)
+                changes(updated)
+                self.__set_evt(key, updated, undo)
+
+    def __to_be_assigned(self, evt):
+        request_id = InMemoryEventStore.__numeric(evt['request_id'])
+        fields = dict.fromkeys(AuditEvent.FIELDS)
+        fields.update({
+            'request_id': request_id,
+            'requestor': evt['requestor'],
+            'contract_uri': evt['contract_uri'],
+            'evt_name': evt['evt_name'],
+            'assigned_block_nbr': InMemoryEventStore.__numeric(evt['assigned_block_nbr']),
+            'status_info': evt['status_info'],
+            'fk_status': 'AS',
+            'fk_type': evt['fk_type'],
+            'price': int(evt['price']),
+            'submission_attempts': 0,
+            'is_persisted': 0,
+        })
+
+        def write(undo):
+            key = (request_id, fields['fk_type'])
+            if key in self.__evts:
+                logger.warning("Audit request already exists: %s", key)
+                return KeyError("Audit request already exists: {0}".format(key))
+            self.__set_evt(key, fields, undo)
+            self.__add_request_type(key, undo)
+            return None
+
+        return write
+
+    def add_evt_to_be_assigned(self, evt):
+        return self.__write(self.__to_be_assigned(evt), 'AS')
+
+    def add_evts_to_be_assigned(self, evts):
+        """
+        Adds many events at once, under a single acquisition of the lock. As in the SQLite
+        engine, the insertion is never part of a transaction unit.
+        """
+        writes = [self.__to_be_assigned(evt) for evt in evts]
+        if len(writes) == 0 or self.__closed:
+            return None
+        with self.__lock:
+            outcomes = [write([]) for write in writes]
+        future = Future()
+        future.set_result(outcomes)
+        self._publish(('AS',))
+        return WriteAck(future)
+
+    def is_request_processed(self, request_id, fk_type=None):
+        with self.__lock:
+            types = self.__request_types.get(InMemoryEventStore.__numeric(request_id), set())
+            return len(types) > 0 if fk_type is None else fk_type in types
+
+    def __record(self, key):
+        return AuditEvent(self.__evts[key], load_report=self.get_report)
+
+    def get_event_by_request_id(self, request_id):
+        request_id = InMemoryEventStore.__numeric(request_id)
+        with self.__lock:
+            types = self.__types_by_request.get(request_id)
+            if not types:
+                return {}
+            return self.__record((request_id, min(types)))
+
+    def get_report(self, request_id, fk_type):
+        with self.__lock:
+            report = self.__reports.get((InMemoryEventStore.__numeric(request_id), fk_type), {})
+            return {
+                'full_report': report.get('full_report'),
+                'compressed_report': report.get('compressed_report'),
+            }
+
+    def __get_latest(self):
+        with self.__lock:
+            if self.__latest is None:
+                if len(self.__evts) == 0:
+                    return -1, -1
+                self.__latest = (
+                    max(evt['assigned_block_nbr'] for evt in self.__evts.values()),
+                    max(request_id for request_id, _ in self.__evts),
+                )
+            return self.__latest
+
+    def get_latest_block_number(self):
+        return self.__get_latest()[0]
+
+    def get_latest_request_id(self):
+        return self.__get_latest()[1]
+
+    def __iter_evt_with_status(self, status):
+        """
+        Yields the events of a status one page at a time, each page starting after the key of
+        the last event seen (as the paginated scans of the SQLite engine do). The keys of the
+        status are sorted once, and only sorted again if events entered the status meanwhile;
+        those having left it are skipped.
+        """
+        last = None
+        ordered = []
+        position = 0
+        entries = None
+        while True:
+            with self.__lock:
+                keys = self.__keys_by_status[status]
+                if entries != self.__status_entries[status]:
+                    entries = self.__status_entries[status]
+                    candidates = keys
+                    if last is not None:
+                        last_order = InMemoryEventStore.__order(last)
+                        candidates = [key for key in keys
+                                      if InMemoryEventStore.__order(key) > last_order]
+                    ordered = sorted(candidates, key=InMemoryEventStore.__order)
+                    position = 0
+                page = []
+                while position < len(ordered) and len(page) < self.__page_size:
+                    if ordered[position] in keys:
+                        page.append(ordered[position])
+                    position += 1
+                evts = [self.__record(key) for key in page]
+            for evt in evts:
+                yield evt
+
+            if len(page) < self.__page_size:
+                break
+            last = page[-1]
+
+    def incoming_events(self):
+        return self.__iter_evt_with_status('AS')
+
+    def events_to_be_submitted(self):
+        return self.__iter_evt_with_status('TS')
+
+    def submission_events(self):
+        return self.__iter_evt_with_status('SB')
+
+    def set_evt_status_to_be_submitted(self, evt):
+        def changes(stored):
+            stored.update({
+                'fk_status': 'TS',
+                'status_info': evt['status_info'],
+                'tx_hash': evt['tx_hash'],
+                'audit_uri': evt['audit_uri'],
+                'audit_hash': evt['audit_hash'],
+                'audit_state': evt['audit_state'],
+                'submission_block_nbr': evt['submission_block_nbr'],
+                'submission_attempts': stored['submission_attempts'] + 1,
+            })
+
+        def write(undo):
+            # Reports are only (re)written when the event carries them
+            if 'full_report' in evt or 'compressed_report' in evt:
+                key = (InMemoryEventStore.__numeric(evt['request_id']), evt['fk_type'])
+                self.__set_report(key, {'full_report': evt['full_report'],
+                                        'compressed_report': evt['compressed_report']}, undo)
+            self.__update(evt['request_id'], InMemoryEventStore.__PENDING_STATUSES, changes, undo)
+
+        return self.__write(write, 'TS')
+
+    def set_evt_status_to_submitted(self, evt):
+        def changes(stored):
+            stored.update({
+                'fk_status': 'SB',
+                'tx_hash': evt['tx_hash'],
+                'status_info': evt['status_info'],
+                'audit_uri': evt['audit_uri'],
+                'audit_hash': evt['audit_hash'],
+                'audit_state': evt['audit_state'],
+            })
+
+        return self.__write(
+            lambda undo: self.__update(evt['request_id'], ('TS',), changes, undo), 'SB')
+
+    def set_evt_status_to_done(self, evt):
+        def changes(stored):
+            stored.update({'fk_status': 'DN', 'status_info': evt['status_info'], 'is_persisted': 1})
+
+        return self.__write(lambda undo: self.__update(
+            evt['request_id'], InMemoryEventStore.__PENDING_STATUSES, changes, undo), 'DN')
+
+    def set_evt_status_to_error(self, evt):
+        def changes(stored):
+            stored.update({'fk_status': 'ER', 'status_info': evt['status_info']})
+
+        return self.__write(
+            lambda undo: self.__update(evt['request_id'], None, changes, undo), 'ER')
+
+    def apply_retention(self, before_block, batch_size=100):
+        """
+        Removes up to batch_size events having reached a terminal status (done or error) and
+        assigned before the given block, along with their reports, returning the number of events
+        removed. There is no archive: removed events are gone (though still regarded as
+        processed, including once loaded back from a snapshot).
+        """
+        if self.__closed:
+            return 0
+        with self.__lock:
+            keys = [key for status in InMemoryEventStore.__TERMINAL_STATUSES
+                    for key in self.__keys_by_status[status]
+                    if self.__evts[key]['assigned_block_nbr'] < before_block]
+            keys = heapq.nsmallest(batch_size, keys,
+                                   key=lambda key: self.__evts[key]['assigned_block_nbr'])
+            for key in keys:
+                self.__set_evt(key, None)
+                self.__set_report(key, None)
+            return len(keys)
+
+    def snapshot(self):
+        """
+        Writes the events to the snapshot path (if any). The snapshot is first written to a
+        temporary file, which then replaces the previous one, so that it is never left halfway.
+        """
+        if self.__snapshot_path is None:
+            return
+        with self.__lock:
+            content = {
+                'events': list(self.__evts.values()),
+                'reports': [[key[0], key[1], report]
+                            for key, report in self.__reports.items()],
+                # Keys of the events removed by the retention
+                'removed': [[request_id, fk_type]
+                            for request_id, types in self.__request_types.items()
+                            for fk_type in types
+                            if (request_id, fk_type) not in self.__evts],
+            }
+        temp_path = "{0}.tmp".format(self.__snapshot_path)
+        with open(temp_path, 'w') as snapshot_stream:
+            json.dump(content, snapshot_stream)
+        os.replace(temp_path, self.__snapshot_path)
+
+    def __load_snapshot(self):
+        with open(self.__snapshot_path) as snapshot_stream:
+            content = json.load(snapshot_stream)
+        for evt in content['events']:
+            key = (evt['request_id'], evt['fk_type'])
+            self.__set_evt(key, evt)
+            self.__add_request_type(key)
+        for request_id, fk_type, report in content['reports']:
+            self.__set_report((request_id, fk_type), report)
+        for request_id, fk_type in content.get('removed', []):
+            self.__add_request_type((request_id, fk_type))
+        logger.info("Loaded {0} events from snapshot {1}".format(
+            len(self.__evts), self.__snapshot_path))
+
+    def close(self):
+        if self.__closed:
+            return
+        self.__closed = True
+        self.snapshot()
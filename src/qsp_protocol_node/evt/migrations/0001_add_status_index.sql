@@ -0,0 +1,2 @@
+create index if not exists audit_evt_status_idx
+on audit_evt(fk_status, request_id);
@@ -0,0 +1,2 @@
+create index if not exists audit_evt_assigned_block_idx
+on audit_evt(assigned_block_nbr);
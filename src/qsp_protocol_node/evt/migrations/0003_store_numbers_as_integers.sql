@@ -0,0 +1,54 @@
+create table audit_evt_new (
+    request_id          string not null,
+    requestor           text not null,
+    contract_uri        text not null,
+    evt_name            varchar(100) not null,
+    assigned_block_nbr   integer not null,
+    submission_block_nbr integer default null,
+    fk_status           char(2) not null,
+    fk_type             char(2) not null,
+    price               text not null,
+    status_info         text,
+    tx_hash             text default null,
+    submission_attempts smallint not null default 0,
+    is_persisted        boolean not null default false,
+    audit_uri           text default null,
+    audit_hash          text default null,
+    audit_state         smallint default null,
+    full_report         text default null,
+    compressed_report   text default null,
+    primary key(request_id, fk_type),
+    foreign key(fk_type) references audit_type(id),
+    foreign key(fk_status) references evt_status(id)
+);
+
+insert into audit_evt_new
+select request_id,
+    requestor,
+    contract_uri,
+    evt_name,
+    cast(assigned_block_nbr as integer),
+    cast(submission_block_nbr as integer),
+    fk_status,
+    fk_type,
+    substr('000000000000000000000000000000000000000000000000000000000000000000000000000000' || price, -78, 78),
+    status_info,
+    tx_hash,
+    submission_attempts,
+    is_persisted,
+    audit_uri,
+    audit_hash,
+    audit_state,
+    full_report,
+    compressed_report
+from audit_evt;
+
+drop table audit_evt;
+
+alter table audit_evt_new rename to audit_evt;
+
+create index audit_evt_status_idx
+on audit_evt(fk_status, request_id);
+
+create index audit_evt_assigned_block_idx
+on audit_evt(assigned_block_nbr);
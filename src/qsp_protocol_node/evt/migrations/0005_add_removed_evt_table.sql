@@ -0,0 +1,5 @@
+create table if not exists removed_evt (
+    request_id          string not null,
+    fk_type             char(2) not null,
+    primary key(request_id, fk_type)
+);
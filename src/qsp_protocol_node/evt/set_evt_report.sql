@@ -0,0 +1,8 @@
+insert or replace into
+audit_report(
+    request_id,
+    fk_type,
+    full_report,
+    compressed_report
+)
+values(?, ?, ?, ?)
@@ -0,0 +1,50 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2018, 2019 Quantstamp, Inc. This content and its use are governed by the license terms at    #
+# <https://s3.amazonaws.com/qsp-protocol-license/V2_LICENSE.txt>                                   #
+#                                                                                                  #
+####################################################################################################
+
+"""
+Provides the registry of SQL statements used by the event pool manager.
+"""
+
+import os
+
+from collections import namedtuple
+from glob import glob
+
+Statement = namedtuple('Statement', ['name', 'sql', 'is_select'])
+
+
+class StatementRegistry:
+    """
+    Loads every .sql file of a directory once, keeping its text and whether it is a select.
+    Since the text of a statement never changes, apsw prepares it only once and reuses it from
+    its statement cache on every subsequent execution.
+    """
+
+    def __init__(self, directory):
+        self.__statements = {}
+        for query_file in glob("{0}/*.sql".format(directory)):
+            name = os.path.splitext(os.path.basename(query_file))[0]
+            with open(query_file) as query_stream:
+                sql = query_stream.read().strip()
+            self.__statements[name] = Statement(
+                name=name,
+                sql=sql,
+                is_select=sql.lower().startswith("select"),
+            )
+
+    def __getitem__(self, name):
+        return self.__statements[name]
+
+    def __contains__(self, name):
+        return name in self.__statements
+
+    def __len__(self):
+        return len(self.__statements)
+
+    @property
+    def names(self):
+        return sorted(self.__statements.keys())
@@ -6,6 +6,11 @@
 ####################################################################################################
 
 from .sql3liteworker import Sqlite3Worker
+from .sql3liteworker import TransactionUnit
+from .sql3liteworker import WriteAck
+from .reader_pool import Sqlite3ReaderPool
+from .query_stats import QueryStats
 from .query_result import get_first
 
-__all__ = ['Sqlite3Worker', 'get_first']
+__all__ = ['Sqlite3Worker', 'Sqlite3ReaderPool', 'QueryStats', 'TransactionUnit', 'WriteAck',
+           'get_first']
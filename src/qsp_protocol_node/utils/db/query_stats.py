@@ -0,0 +1,132 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2018, 2019 Quantstamp, Inc. This content and its use are governed by the license terms at    #
+# <https://s3.amazonaws.com/qsp-protocol-license/V2_LICENSE.txt>                                   #
+#                                                                                                  #
+####################################################################################################
+
+"""Per-query latency, row count, and queue depth statistics of a Sqlite3Worker."""
+
+import bisect
+import threading
+
+
+class Histogram:
+    """
+    Counts observations (in seconds) into fixed buckets, each bucket counting the observations
+    up to its bound, plus an overflow bucket for those above the last bound.
+    """
+
+    # Upper bounds (in seconds) of the buckets
+    BOUNDS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+    def __init__(self):
+        self.__counts = [0] * (len(Histogram.BOUNDS) + 1)
+        self.__total = 0
+        self.__max = 0
+
+    def observe(self, value):
+        self.__counts[bisect.bisect_left(Histogram.BOUNDS, value)] += 1
+        self.__total += value
+        self.__max = max(self.__max, value)
+
+    def snapshot(self):
+        """Return the bucket counts (keyed by bound, "inf" for the overflow), sum, and max."""
+        buckets = {str(bound): count for bound, count in zip(Histogram.BOUNDS, self.__counts)}
+        buckets['inf'] = self.__counts[-1]
+        return {'buckets': buckets, 'sum': self.__total, 'max': self.__max}
+
+
+class QueryStats:
+    """
+    Collects, for each named query, how long it waited before being executed (in the queue of
+    the worker or for a reader connection), how long its execution took, how many times it ran
+    and failed, and how many rows it returned or changed. Also keeps track of the deepest the
+    worker queue has been, which tells how close it gets to its maximum size, where queueing
+    starts timing out.
+
+    Statistics are updated from the worker, the reader pool, and the callers queueing queries,
+    and may be read from any thread.
+    """
+
+    def __init__(self, max_queue_size):
+        self.__lock = threading.Lock()
+        self.__queries = {}
+        self.__max_queue_size = max_queue_size
+        self.__peak_queue_depth = 0
+
+    def record_queue_depth(self, depth):
+        with self.__lock:
+            self.__peak_queue_depth = max(self.__peak_queue_depth, depth)
+
+    def record(self, name, wait_sec, exec_sec, rows, failed=False):
+        """Record an execution of a named query.
+
+        Args:
+            name: The name of the query.
+            wait_sec: How long the query waited before being executed.
+            exec_sec: How long the execution of the query took.
+            rows: The number of rows returned (selects) or changed (writes).
+            failed: Whether the query raised an error.
+        """
+        with self.__lock:
+            stats = self.__queries.get(name)
+            if stats is None:
+                stats = {
+                    'count': 0,
+                    'errors': 0,
+                    'rows': 0,
+                    'wait': Histogram(),
+                    'exec': Histogram(),
+                }
+                self.__queries[name] = stats
+            stats['count'] += 1
+            stats['errors'] += 1 if failed else 0
+            stats['rows'] += rows
+            stats['wait'].observe(wait_sec)
+            stats['exec'].observe(exec_sec)
+
+    @property
+    def peak_queue_depth(self):
+        return self.__peak_queue_depth
+
+    def snapshot(self):
+        """Return a JSON serializable copy of the statistics."""
+        with self.__lock:
+            queries = {
+                name: {
+                    'count': stats['count'],
+                    'errors': stats['errors'],
+                    'rows': stats['rows'],
+                    'wait': stats['wait'].snapshot(),
+                    'exec': stats['exec'].snapshot(),
+                }
+                for name, stats in self.__queries.items()
+            }
+            return {
+                'maxQueueSize': self.__max_queue_size,
+                'peakQueueDepth': self.__peak_queue_depth,
+                'queries': queries,
+            }
+
+    def dump(self):
+        """Return the statistics as a human readable table, one line per query."""
+        snapshot = self.snapshot()
+        lines = ["peak queue depth {0}/{1}".format(snapshot['peakQueueDepth'],
+                                                   snapshot['maxQueueSize'])]
+        line_format = "{0:<40} {1:>8} {2:>6} {3:>10} {4:>12} {5:>12} {6:>12} {7:>12}"
+        lines.append(line_format.format("query", "count", "errors", "rows", "avg wait ms",
+                                        "max wait ms", "avg exec ms", "max exec ms"))
+        for name in sorted(snapshot['queries']):
+            stats = snapshot['queries'][name]
+            lines.append(line_format.format(
+                name,
+                stats['count'],
+                stats['errors'],
+                stats['rows'],
+                "{0:.3f}".format(1000 * stats['wait']['sum'] / stats['count']),
+                "{0:.3f}".format(1000 * stats['wait']['max']),
+                "{0:.3f}".format(1000 * stats['exec']['sum'] / stats['count']),
+                "{0:.3f}".format(1000 * stats['exec']['max']),
+            ))
+        return "\n".join(lines)
@@ -0,0 +1,113 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2018, 2019 Quantstamp, Inc. This content and its use are governed by the license terms at    #
+# <https://s3.amazonaws.com/qsp-protocol-license/V2_LICENSE.txt>                                   #
+#                                                                                                  #
+####################################################################################################
+
+"""Pool of read-only sqlite3 connections serving selects concurrently to a Sqlite3Worker."""
+
+import apsw
+import queue as Queue
+import time
+
+from log_streaming import get_logger
+
+from .sql3liteworker import RowTracer, Sqlite3Worker
+
+
+class Sqlite3ReaderPool:
+    """
+    Serves select statements from a fixed number of read-only connections, so that reads neither
+    wait on each other nor on the single writer thread. The database must be in WAL mode for
+    readers and the writer not to block one another.
+
+    Before reading, each select waits for the writes queued so far in the associated writer to
+    be executed, which preserves the read-your-writes ordering of a single Sqlite3Worker.
+
+    Named selects are timed into the query_stats of the writer, their wait covering both the
+    pending writes and getting hold of a connection.
+    """
+
+    def __init__(self, file_name, writer, size=2):
+        """
+        Opens the read-only connections of the pool.
+
+        Args:
+            file_name: The name of the file.
+            writer: The Sqlite3Worker executing the writes on the same file.
+            size: The number of read-only connections.
+        """
+        self.logger = get_logger(self.__class__.__qualname__)
+        self.__writer = writer
+        self.__size = size
+        self.__connections = Queue.Queue(maxsize=size)
+        self.__closed = False
+
+        for _ in range(size):
+            connection = apsw.Connection(file_name, flags=apsw.SQLITE_OPEN_READONLY)
+            self.__connections.put(connection)
+
+    @property
+    def size(self):
+        """Return the number of connections in the pool."""
+        return self.__size
+
+    @property
+    def available(self):
+        """Return the number of connections not currently executing a select."""
+        return self.__connections.qsize()
+
+    def execute(self, query, values=None, error_handler=None, record_factory=None, name=None):
+        """Execute a select query in one of the connections of the pool.
+
+        Args:
+            query: The sql string using ? for placeholders of dynamic values.
+            values: A tuple of values to be replaced into the ? of the query.
+            error_handler: An optional custom handler to deal with a possible error.
+            record_factory: An optional factory of the returned records (see RowTracer).
+                None returns dictionaries.
+            name: An optional name under which the query is timed (see Sqlite3Worker).
+
+        Returns:
+            The results of the query, or an error string if the query failed.
+        """
+        if self.__closed:
+            return Sqlite3Worker.EXIT_TOKEN
+        values = values or []
+
+        enqueued_at = time.perf_counter()
+        self.__writer.wait_for_writes()
+        connection = self.__connections.get()
+        start = time.perf_counter()
+        rows = None
+        try:
+            cursor = connection.cursor()
+            cursor.setrowtrace(RowTracer(record_factory))
+            rows = cursor.execute(query, values).fetchall()
+            return rows
+        except apsw.Error as err:
+            result = "Query returned error: %s: %s: %s" % (query, values, err)
+            if error_handler is None:
+                self.logger.error("Query returned error: %s: %s: %s", query, values, err)
+            else:
+                error_handler(self, query, values, err)
+            return result
+        finally:
+            self.__connections.put(connection)
+            if name is not None:
+                self.__writer.query_stats.record(
+                    name,
+                    start - enqueued_at,
+                    time.perf_counter() - start,
+                    0 if rows is None else len(rows),
+                    rows is None,
+                )
+
+    def close(self):
+        """Close every connection of the pool once it is returned."""
+        if self.__closed:
+            return
+        self.__closed = True
+        for _ in range(self.__size):
+            self.__connections.get().close()
@@ -31,13 +31,145 @@ __email__ = "shawnl@palantir.com"
 __license__ = "MIT"
 
 import apsw
+import asyncio
 import queue as Queue
 import threading
 import time
 import uuid
 
+from collections import namedtuple
+from concurrent.futures import Future
+
 from log_streaming import get_logger
 
+from .query_stats import QueryStats
+
+
+# A query queued for the worker thread, of one of the kinds below
+QueuedQuery = namedtuple('QueuedQuery', [
+    'token',
+    'query',
+    'values',
+    'error_handler',
+    'future',
+    'is_select',
+    'record_factory',
+    'kind',
+    'name',
+    'enqueued_at',
+])
+
+# A single statement
+SINGLE = 'single'
+# A statement executed once per value tuple, values carrying the list of tuples
+MANY = 'many'
+# Statements committed atomically, values carrying the list of (query, values, error_handler)
+UNIT = 'unit'
+
+
+class TransactionUnit:
+    """Statements executed by a Sqlite3Worker as a single queued job, and committed atomically.
+
+    Should any statement fail, the whole unit is rolled back and the error handler of the
+    failing statement fires.
+    """
+
+    def __init__(self):
+        self.__statements = []
+        # Acknowledgement of the unit, once queued without waiting
+        self.ack = None
+
+    def add(self, query, values=None, error_handler=None):
+        """Add a non-select statement to the unit.
+
+        Args:
+            query: The sql string using ? for placeholders of dynamic values.
+            values: A tuple of values to be replaced into the ? of the query.
+            error_handler: An optional custom handler to deal with a possible error.
+        """
+        self.__statements.append((query, values or [], error_handler))
+
+    @property
+    def statements(self):
+        """Return the (query, values, error_handler) statements of the unit."""
+        return list(self.__statements)
+
+    def __len__(self):
+        return len(self.__statements)
+
+
+class WriteAck:
+    """Acknowledgement of a queued write.
+
+    Completes once the worker thread has executed the write, carrying its outcome: None if it
+    committed or the apsw error it raised (execute_many carries the outcome of each row). It can
+    be waited upon from any thread, or awaited from a coroutine. Nothing is kept on behalf of
+    acknowledgements that are discarded without being looked at.
+    """
+
+    def __init__(self, future):
+        self.__future = future
+
+    def done(self):
+        """Return whether the write has been executed."""
+        return self.__future.done()
+
+    def result(self, timeout=None):
+        """Block until the write has been executed, returning its outcome.
+
+        Args:
+            timeout: The maximum number of seconds to wait (None waits forever).
+        """
+        return self.__future.result(timeout)
+
+    def committed(self, timeout=None):
+        """Block until the write has been executed, returning whether it committed.
+
+        Args:
+            timeout: The maximum number of seconds to wait (None waits forever).
+        """
+        outcome = self.result(timeout)
+        if isinstance(outcome, list):
+            return all(row_outcome is None for row_outcome in outcome)
+        return outcome is None
+
+    def __await__(self):
+        return asyncio.wrap_future(self.__future).__await__()
+
+    @staticmethod
+    def wait_all(acks, timeout=None):
+        """Block until all the given writes have been executed, returning their outcomes.
+
+        Args:
+            acks: The acknowledgements of the writes.
+            timeout: The maximum number of seconds to wait for each write (None waits forever).
+        """
+        return [ack.result(timeout) for ack in acks]
+
+
+def dict_record(columns):
+    """Record factory building each row as a dictionary keyed by column name."""
+    return lambda row: dict(zip(columns, row))
+
+
+class RowTracer:
+    """Row tracer turning the rows of a statement into records instead of tuples.
+
+    The columns of the statement are only read upon its first row, and handed to the record
+    factory, which returns the function building a record out of each row. A tracer must thus
+    be used for a single statement execution.
+    """
+
+    def __init__(self, record_factory=None):
+        self.__record_factory = record_factory or dict_record
+        self.__build_record = None
+
+    def __call__(self, cursor, row):
+        if self.__build_record is None:
+            columns = tuple(description[0] for description in cursor.getdescription())
+            self.__build_record = self.__record_factory(columns)
+        return self.__build_record(row)
+
 
 class Sqlite3Worker(threading.Thread):
     """Sqlite thread safe object.
@@ -56,39 +188,101 @@ class Sqlite3Worker(threading.Thread):
 
     Each call to execute runs within a transaction (except in the case of selects).
 
+    Every queued statement carries a Future that the worker thread completes as soon as the
+    statement has been executed. Selects block on it to fetch their rows; writes may optionally
+    block on it (wait=True) to learn whether the statement was committed.
+
     Calls to execute_script, in turn, have certain limitations:
         - scripts may contain at most one select statement
         - non-select statements should not be mixed with select statements
         - scripts must not have comments
 
     As with execute, execute_script executes within a transaction.
+
+    When group commit is enabled (group_commit_size > 1), non-select statements waiting in the
+    queue are drained into a single transaction, each one running within its own savepoint. A
+    failing statement is thus rolled back alone (and its error handler still fires) while the
+    remaining ones are committed together. Should the group fail as a whole (e.g., upon commit),
+    it is rolled back and its statements are executed again one by one, so that each caller
+    still learns the outcome of its own statement.
+
+    When the database is in WAL mode, the worker checkpoints the write-ahead log itself once it
+    grows past wal_checkpoint_pages, keeping track of how checkpoints perform.
+
+    When the database is in incremental auto-vacuum mode, the pages freed by deletions are only
+    returned to the file system upon incremental_vacuum, a few pages at a time. Switching an
+    existing database to another mode requires rebuilding it (a full VACUUM, holding the write
+    lock throughout), which only happens if asked for.
+
+    Queries given a name are timed, their statistics being kept in query_stats along with the
+    deepest the queue has been.
     """
 
     EXIT_TOKEN = "Exit Called"
 
-    def __init__(self, file_name, max_queue_size=100):
+    # Name of the savepoint wrapping each statement of a group commit
+    SAVEPOINT = "group_commit_stmt"
+
+    # Name of the savepoint wrapping the rows of an execute_many
+    MANY_SAVEPOINT = "execute_many"
+
+    # Values of the auto_vacuum pragma
+    AUTO_VACUUM_MODES = {'none': 0, 'full': 1, 'incremental': 2}
+
+    def __init__(self, file_name, max_queue_size=100, group_commit_size=1,
+                 group_commit_latency_sec=0, journal_mode=None, wal_checkpoint_pages=1000,
+                 auto_vacuum=None, rebuild_for_auto_vacuum=False):
         """Automatically starts the thread.
 
         Args:
             file_name: The name of the file.
             max_queue_size: The max queries that will be queued.
+            group_commit_size: The max number of writes committed in a single transaction.
+            group_commit_latency_sec: How long a group commit may wait for further writes
+                to arrive before committing.
+            journal_mode: An optional journal mode (e.g., "wal") for the database file.
+            wal_checkpoint_pages: The size of the write-ahead log (in pages) triggering
+                a checkpoint.
+            auto_vacuum: An optional auto-vacuum mode (e.g., "incremental") for the database
+                file.
+            rebuild_for_auto_vacuum: Whether an existing database whose mode differs is rebuilt
+                to switch to the given mode (otherwise, its mode is left as it is).
         """
         self.logger = get_logger(self.__class__.__qualname__)
         threading.Thread.__init__(self)
         self.daemon = True
         self.sqlite3_conn = apsw.Connection(file_name)
+        self.sqlite3_cursor = self.sqlite3_conn.cursor()
 
-        # Configures the connection always to return a dictionary
-        # instead of a tuple
-        def row_factory(cursor, row):
-            return {k[0]: row[i] for i, k in enumerate(cursor.getdescription())}
+        self.wal_checkpoint_pages = wal_checkpoint_pages
+        self.__wal_pages = 0
+        self.__checkpoint_stats = {
+            'wal_pages': 0,
+            'checkpoints': 0,
+            'last_checkpoint_log_pages': 0,
+            'last_checkpoint_checkpointed_pages': 0,
+            'last_checkpoint_sec': 0,
+            'total_checkpoint_sec': 0,
+        }
+        if auto_vacuum is not None:
+            self.__set_auto_vacuum(auto_vacuum, rebuild_for_auto_vacuum)
+        if journal_mode is not None:
+            self.sqlite3_cursor.execute("pragma journal_mode={0}".format(journal_mode))
+            if journal_mode.lower() == "wal":
+                # Installing a hook replaces SQLite's automatic checkpoints,
+                # which are then run by the worker itself
+                self.sqlite3_conn.setwalhook(self.__on_wal_commit)
 
-        self.sqlite3_conn.setrowtrace(row_factory)
-        self.sqlite3_cursor = self.sqlite3_conn.cursor()
         self.sql_queue = Queue.Queue(maxsize=max_queue_size)
-        self.results = {}
         self.max_queue_size = max_queue_size
+        self.query_stats = QueryStats(max_queue_size)
+        self.group_commit_size = group_commit_size
+        self.group_commit_latency_sec = group_commit_latency_sec
         self.exit_set = False
+        self.__exited = threading.Event()
+        # Future of the last write queued, used to wait for pending writes
+        self.__last_write = None
+        self.__last_write_lock = threading.Lock()
         # Token that is put into queue when close() is called.
         self.exit_token = str(uuid.uuid4())
         self.start()
@@ -97,31 +291,42 @@ class Sqlite3Worker(threading.Thread):
     def run(self):
         """Thread loop.
 
-        This is an infinite loop.  The iter method calls self.sql_queue.get()
+        This is an infinite loop.  The loop calls self.sql_queue.get()
         which blocks if there are not values in the queue.  As soon as values
         are placed into the queue the process will continue.
 
-        If many executes happen at once it will churn through them all before
-        calling commit() to speed things up by reducing the number of times
-        commit is called.
+        If many executes happen at once and group commit is enabled, it will
+        churn through them all before calling commit() to speed things up by
+        reducing the number of times commit is called.
         """
-        execute_count = 0
-        for token, query, values, error_handler in iter(self.sql_queue.get, None):
-            if token != self.exit_token:
-                self.run_query(token, query, values, error_handler)
-                execute_count += 1
-
-                if self.sql_queue.empty() or execute_count == self.max_queue_size:
-                    execute_count = 0
+        pending = None
+        while True:
+            if pending is None:
+                pending = self.sql_queue.get()
+            if pending.token != self.exit_token:
+                if self.group_commit_size > 1 and not pending.is_select:
+                    # Any statement dequeued but not belonging to the group
+                    # is executed next
+                    pending = self.run_group_commit(pending)
+                else:
+                    item, pending = pending, None
+                    self.run_query(item.token, item.query, item.values, item.error_handler,
+                                   item.future, item.is_select, item.record_factory,
+                                   item.kind, item.name, item.enqueued_at)
+                self.__checkpoint_if_needed()
+            else:
+                pending = None
 
             # Only exit if the queue is empty. Otherwise keep getting
             # through the queue until it's empty.
-            if self.exit_set and self.sql_queue.empty():
+            if self.exit_set and self.sql_queue.empty() and pending is None:
                 self.sqlite3_conn.close()
                 self.thread_running = False
+                self.__exited.set()
                 return
 
-    def run_query(self, token, query, values, error_handler):
+    def run_query(self, token, query, values, error_handler, future=None, is_select=None,
+                  record_factory=None, kind=SINGLE, name=None, enqueued_at=None):
         """Run a query.
 
         Args:
@@ -129,101 +334,466 @@ class Sqlite3Worker(threading.Thread):
             query: A sql query with ? placeholders for values.
             values: A tuple of values to replace "?" in query.
             error_handler: A function to handle error. None executes the default.
+            future: An optional Future completed with the outcome of the query.
+            is_select: Whether the query is a select. None inspects the query.
+            record_factory: An optional factory of the records returned by a select
+                (see RowTracer). None returns dictionaries.
+            kind: The kind of query (SINGLE, MANY or UNIT), telling how values are given.
+            name: An optional name under which the query is timed (see query_stats).
+            enqueued_at: When the query was queued (as given by time.perf_counter).
+        """
+        if is_select is None:
+            is_select = Sqlite3Worker.is_select(query)
+        result = None
+        start = time.perf_counter()
+        total_changes = self.sqlite3_conn.totalchanges()
+        try:
+            result = self.__run_query(query, values, error_handler, is_select, record_factory,
+                                      kind)
+        finally:
+            # Recorded before waking up the caller, so that the statistics are up to date
+            # once the query is known to be executed
+            self.__record_stats(name, is_select, enqueued_at or start, start, total_changes,
+                                result)
+            # Wakes up whoever is waiting on the query, even if an error
+            # handler raised
+            if future is not None:
+                future.set_result(result)
+
+    def run_group_commit(self, first_item):
+        """Run a write, plus the writes queued right behind it, within a single transaction.
+
+        Args:
+            first_item: The queued item of the first write of the group.
+
+        Returns:
+            The item dequeued but not part of the group (or None if there is none).
         """
-        if query.lower().strip().startswith("select"):
+        items = []
+        results = []
+        leftover = None
+        deadline = time.time() + self.group_commit_latency_sec
+        item = first_item
+
+        try:
+            self.sqlite3_cursor.execute("begin")
+            while True:
+                items.append(item)
+                start = time.perf_counter()
+                total_changes = self.sqlite3_conn.totalchanges()
+                if item.kind == MANY:
+                    result = self.__run_many(item.query, item.values, item.error_handler)
+                elif item.kind == UNIT:
+                    result = self.__run_in_savepoint(item.values)
+                else:
+                    result = self.__run_in_savepoint(
+                        [(item.query, item.values, item.error_handler)])
+                self.__record_stats(item.name, False, item.enqueued_at, start, total_changes,
+                                    result)
+                results.append(result)
+                if len(items) >= self.group_commit_size:
+                    break
+                try:
+                    remaining = deadline - time.time()
+                    if remaining > 0:
+                        item = self.sql_queue.get(timeout=remaining)
+                    else:
+                        item = self.sql_queue.get_nowait()
+                except Queue.Empty:
+                    break
+                if item.token == self.exit_token or item.is_select:
+                    leftover = item
+                    break
+            self.sqlite3_cursor.execute("commit")
+        except Exception as err:
+            # The batch is always finished, so that no caller is left waiting
+            self.logger.error("Group commit of %s statements returned error: %s", len(items), err)
+            self.__rollback()
+            self.__rerun_one_by_one(items or [first_item], results)
+            return leftover
+
+        for item, result in zip(items, results):
+            if item.future is not None:
+                item.future.set_result(result)
+
+        return leftover
+
+    def __rollback(self):
+        try:
+            self.sqlite3_cursor.execute("rollback")
+        except apsw.Error as err:
+            # No transaction is left open (e.g., begin itself failed)
+            self.logger.debug("Rollback returned error: %s", err)
+
+    def __rerun_one_by_one(self, items, results):
+        """
+        Executes again, each within its own transaction, the writes of a group that could not be
+        committed, so that their outcome (and the firing of their error handlers) is that of each
+        write on its own. Writes which already failed within the group were rolled back and
+        handed to their error handler then, and are not executed again.
+        """
+        for index, item in enumerate(items):
+            result = results[index] if index < len(results) else None
+            try:
+                if item.kind == MANY and isinstance(result, list):
+                    rows = [row for row, row_result in enumerate(result) if row_result is None]
+                    if len(rows) > 0:
+                        rerun = self.__run_query(item.query, [item.values[row] for row in rows],
+                                                 item.error_handler, False, kind=MANY)
+                        result = list(result)
+                        for position, row in enumerate(rows):
+                            result[row] = rerun[position] if isinstance(rerun, list) else rerun
+                elif result is None:
+                    result = self.__run_query(item.query, item.values, item.error_handler, False,
+                                              kind=item.kind)
+            except Exception as err:
+                self.logger.error("Query returned error: %s: %s: %s", item.query, item.values,
+                                  err)
+                result = err
+            if item.future is not None:
+                item.future.set_result(result)
+
+    def __run_in_savepoint(self, statements):
+        """
+        Executes (query, values, error_handler) statements within a savepoint of the current
+        transaction, rolling all of them back should any fail.
+        """
+        self.sqlite3_cursor.execute("savepoint " + Sqlite3Worker.SAVEPOINT)
+        for query, values, error_handler in statements:
             try:
                 self.sqlite3_cursor.execute(query, values)
-                self.results[token] = self.sqlite3_cursor.fetchall()
             except apsw.Error as err:
-                # Put the error into the output queue since a response
+                self.sqlite3_cursor.execute("rollback to " + Sqlite3Worker.SAVEPOINT)
+                self.sqlite3_cursor.execute("release " + Sqlite3Worker.SAVEPOINT)
+                self.__handle_write_error(query, values, error_handler, err)
+                return err
+        self.sqlite3_cursor.execute("release " + Sqlite3Worker.SAVEPOINT)
+        return None
+
+    def __run_many(self, query, values_list, error_handler):
+        """
+        Executes a statement once per value tuple, within the current transaction, returning the
+        outcome (None or the raised error) of each. All rows are first attempted at once; should
+        any of them fail, they are replayed one by one so that only the failing ones are rolled
+        back and handed to the error handler.
+        """
+        self.sqlite3_cursor.execute("savepoint " + Sqlite3Worker.MANY_SAVEPOINT)
+        try:
+            self.sqlite3_cursor.executemany(query, values_list)
+            results = [None] * len(values_list)
+        except apsw.Error:
+            self.sqlite3_cursor.execute("rollback to " + Sqlite3Worker.MANY_SAVEPOINT)
+            results = [self.__run_in_savepoint([(query, values, error_handler)])
+                       for values in values_list]
+        self.sqlite3_cursor.execute("release " + Sqlite3Worker.MANY_SAVEPOINT)
+        return results
+
+    def __record_stats(self, name, is_select, enqueued_at, start, total_changes, result):
+        """
+        Records the statistics of a named query, executed from start on with the given outcome.
+        Rows changed are those changed since the connection had the given total changes.
+        """
+        if name is None:
+            return
+        end = time.perf_counter()
+        if is_select:
+            failed = not isinstance(result, list)
+            rows = 0 if failed else len(result)
+        else:
+            if isinstance(result, list):
+                failed = any(row_result is not None for row_result in result)
+            else:
+                failed = result is not None
+            rows = self.sqlite3_conn.totalchanges() - total_changes
+        self.query_stats.record(name, start - enqueued_at, end - start, rows, failed)
+
+    def __handle_write_error(self, query, values, error_handler, err):
+        if error_handler is None:
+            self.logger.error(
+                "Query returned error: %s: %s: %s",
+                query,
+                values,
+                err,
+            )
+            return
+        try:
+            error_handler(self, query, values, err)
+        except Exception as handler_err:
+            # A failing handler must neither leave a transaction open nor keep the remaining
+            # statements from being executed
+            self.logger.error("Error handler of query %s: %s raised: %s", query, values,
+                              handler_err)
+
+    def __set_auto_vacuum(self, mode, rebuild):
+        current_mode = self.sqlite3_cursor.execute("pragma auto_vacuum").fetchall()[0][0]
+        self.sqlite3_cursor.execute("pragma auto_vacuum={0}".format(mode))
+        if current_mode == Sqlite3Worker.AUTO_VACUUM_MODES[mode.lower()]:
+            return
+
+        # The mode of a database already holding tables only changes once it is rebuilt
+        page_count = self.sqlite3_cursor.execute("pragma page_count").fetchall()[0][0]
+        if page_count == 0:
+            return
+        page_size = self.sqlite3_cursor.execute("pragma page_size").fetchall()[0][0]
+        size_mb = page_count * page_size / (1024 * 1024)
+        if not rebuild:
+            self.logger.warning(
+                "Database is not in %s auto-vacuum mode, which requires rebuilding it "
+                "(%s pages, %.1f MB)", mode, page_count, size_mb)
+            return
+
+        self.logger.info("Rebuilding database to set its auto-vacuum mode to %s "
+                         "(%s pages, %.1f MB)", mode, page_count, size_mb)
+        start = time.time()
+        self.sqlite3_cursor.execute("vacuum")
+        self.logger.info("Rebuilt database in %.1fs", time.time() - start)
+
+    def __on_wal_commit(self, connection, dbname, pages):
+        self.__wal_pages = pages
+        self.__checkpoint_stats['wal_pages'] = pages
+        return apsw.SQLITE_OK
+
+    def __checkpoint_if_needed(self):
+        if self.__wal_pages < self.wal_checkpoint_pages:
+            return
+        start = time.time()
+        try:
+            log_pages, checkpointed_pages = self.sqlite3_conn.wal_checkpoint(
+                mode=apsw.SQLITE_CHECKPOINT_PASSIVE)
+        except apsw.Error as err:
+            self.logger.error("WAL checkpoint returned error: %s", err)
+            return
+        elapsed = time.time() - start
+
+        self.__wal_pages = 0
+        self.__checkpoint_stats['checkpoints'] += 1
+        self.__checkpoint_stats['last_checkpoint_log_pages'] = log_pages
+        self.__checkpoint_stats['last_checkpoint_checkpointed_pages'] = checkpointed_pages
+        self.__checkpoint_stats['last_checkpoint_sec'] = elapsed
+        self.__checkpoint_stats['total_checkpoint_sec'] += elapsed
+
+    def create_scalar_function(self, name, function, num_args=-1):
+        """Register a Python function that can be called from within queries.
+
+        Args:
+            name: The name of the function in SQL.
+            function: The Python function to be called.
+            num_args: The number of arguments taken by the function (-1 for any).
+        """
+        self.sqlite3_conn.createscalarfunction(name, function, num_args)
+
+    def attach(self, file_name, schema_name):
+        """Attach another database file to the connection of the worker.
+
+        Args:
+            file_name: The name of the file.
+            schema_name: The name under which its tables are referred to in queries.
+
+        Returns:
+            An error string if the file could not be attached, None otherwise.
+        """
+        # Attaching cannot happen within a transaction, which (as for selects) the
+        # statement is thus executed without
+        result = self.execute("attach database ? as {0}".format(schema_name), (file_name,),
+                              is_select=True)
+        return result if isinstance(result, str) else None
+
+    def incremental_vacuum(self, pages):
+        """Return up to the given number of free pages of the database to the file system.
+
+        Only has an effect if the database is in incremental auto-vacuum mode.
+
+        Args:
+            pages: The maximum number of pages to be released.
+
+        Returns:
+            The number of free pages still left in the database, or 0 if the database
+            is not in incremental auto-vacuum mode (its free pages cannot be released).
+        """
+        rows = self.execute("pragma auto_vacuum", is_select=True)
+        if isinstance(rows, str):
+            return 0
+        if rows[0]['auto_vacuum'] != Sqlite3Worker.AUTO_VACUUM_MODES['incremental']:
+            return 0
+        # The pragma releases one page per step, so that all of its (empty) rows
+        # must be fetched, as done for selects
+        self.execute("pragma incremental_vacuum({0})".format(int(pages)), is_select=True)
+        rows = self.execute("pragma freelist_count", is_select=True)
+        if isinstance(rows, str):
+            return 0
+        return rows[0]['freelist_count']
+
+    @property
+    def checkpoint_stats(self):
+        """Return a snapshot of the WAL checkpoint statistics."""
+        return dict(self.__checkpoint_stats)
+
+    @staticmethod
+    def is_select(query):
+        """Return whether the given query is a select."""
+        return query.lower().strip().startswith("select")
+
+    def __run_query(self, query, values, error_handler, is_select, record_factory=None,
+                    kind=SINGLE):
+        if is_select:
+            try:
+                self.sqlite3_cursor.setrowtrace(RowTracer(record_factory))
+                self.sqlite3_cursor.execute(query, values)
+                return self.sqlite3_cursor.fetchall()
+            except apsw.Error as err:
+                # Hand the error back to the caller since a response
                 # is required.
-                self.results[token] = ("Query returned error: %s: %s: %s" % (query, values, err))
+                result = ("Query returned error: %s: %s: %s" % (query, values, err))
                 if error_handler is None:
                     self.logger.error("Query returned error: %s: %s: %s".format(query, values, err))
                 else:
                     error_handler(self, query, values, err)
+                return result
         else:
+            result = None
             try:
                 self.sqlite3_cursor.execute("begin")
-                self.sqlite3_cursor.execute(query, values)
+                if kind == MANY:
+                    result = self.__run_many(query, values, error_handler)
+                elif kind == UNIT:
+                    result = self.__run_in_savepoint(values)
+                else:
+                    self.sqlite3_cursor.execute(query, values)
                 self.sqlite3_cursor.execute("commit")
             except apsw.Error as err:
-                self.results[token] = err
                 self.sqlite3_cursor.execute("rollback")
-                if error_handler is None:
-                    self.logger.error(
-                        "Query returned error: %s: %s: %s",
-                        query,
-                        values,
-                        err,
-                    )
-                else:
-                    error_handler(self, query, values, err)
+                self.__handle_write_error(query, values, error_handler, err)
+                return err
+            return result
 
     def close(self):
         """Close down the thread and close the sqlite3 database file."""
         self.exit_set = True
-        self.sql_queue.put((self.exit_token, "", "", None), timeout=5)
-        # Sleep and check that the thread is done before returning.
-        while self.thread_running:
-            time.sleep(.01)  # Don't kill the CPU waiting.
+        self.sql_queue.put(QueuedQuery(self.exit_token, "", "", None, None, False, None, SINGLE,
+                                       None, None),
+                           timeout=5)
+        # Block until the thread is done before returning.
+        self.__exited.wait()
 
     @property
     def queue_size(self):
         """Return the queue size."""
         return self.sql_queue.qsize()
 
-    def query_results(self, token):
-        """Get the query results for a specific token.
-
-        Args:
-            token: A uuid object of the query you want returned.
-
-        Returns:
-            Return the results of the query when it's executed by the thread.
-        """
-        delay = .001
-        while True:
-            if token in self.results:
-                return_val = self.results[token]
-                del self.results[token]
-                return return_val
-            # Double back on the delay to a max of 8 seconds.  This prevents
-            # a long lived select statement from trashing the CPU with this
-            # infinite loop as it's waiting for the query results.
-            # self.logger.debug("Sleeping: %s %s", delay, token)
-            time.sleep(delay)
-            if delay < 8:
-                delay += delay
-
-    def execute(self, query, values=None, error_handler=None):
+    def execute(self, query, values=None, error_handler=None, wait=False, is_select=None,
+                record_factory=None, name=None):
         """Execute a query.
 
         Args:
             query: The sql string using ? for placeholders of dynamic values.
             values: A tuple of values to be replaced into the ? of the query.
             error_handler: An optional custom handler to deal with a possible error.
+            wait: If set, non-select queries block until they have been executed.
+            is_select: Whether the query is a select, if known beforehand. None
+                inspects the query.
+            record_factory: An optional factory of the records returned by a select
+                (see RowTracer). None returns dictionaries.
+            name: An optional name under which the query is timed (see query_stats).
 
         Returns:
-            If it's a select query it will return the results of the query.
+            If it's a select query it will return the results of the query. If it is
+            a non-select query executed with wait set, it returns the raised apsw error
+            (or None if the query succeeded). Otherwise, it returns the WriteAck of the
+            query.
         """
         if self.exit_set:
             return Sqlite3Worker.EXIT_TOKEN
         values = values or []
         # A token to track this query with.
         token = str(uuid.uuid4())
-        # If it's a select we queue it up with a token to mark the results
-        # into the output queue so we know what results are ours.
-        if query.lower().strip().startswith("select"):
-            self.sql_queue.put((token, query, values, error_handler), timeout=5)
-            return self.query_results(token)
-        else:
-            self.sql_queue.put((token, query, values, error_handler), timeout=5)
+        # The future is completed by the worker thread once the query is
+        # executed, waking up the caller right away
+        future = Future()
+        if is_select is None:
+            is_select = Sqlite3Worker.is_select(query)
+        if is_select:
+            self.__put(QueuedQuery(token, query, values, error_handler, future, True,
+                                   record_factory, SINGLE, name, time.perf_counter()))
+            return future.result()
+
+        return self.__queue_write(
+            QueuedQuery(token, query, values, error_handler, future, False, None, SINGLE, name,
+                        time.perf_counter()),
+            wait)
+
+    def execute_many(self, query, values_list, error_handler=None, wait=False, name=None):
+        """Execute a non-select query once per value tuple, within a single transaction.
+
+        Rows failing (e.g., due to a constraint) are rolled back alone and handed to the error
+        handler, without aborting the other rows.
 
-        return None
+        Args:
+            query: The sql string using ? for placeholders of dynamic values.
+            values_list: An iterable of tuples of values, each replaced into the ? of the query.
+            error_handler: An optional custom handler to deal with a possible error of each row.
+            wait: If set, blocks until the rows have been executed.
+            name: An optional name under which the query is timed (see query_stats).
+
+        Returns:
+            If executed with wait set, the outcome of each row (None or the raised apsw error),
+            or the raised apsw error if the whole transaction failed. Otherwise, the WriteAck
+            of the rows.
+        """
+        if self.exit_set:
+            return Sqlite3Worker.EXIT_TOKEN
+        token = str(uuid.uuid4())
+        future = Future()
+        return self.__queue_write(
+            QueuedQuery(token, query, list(values_list), error_handler, future, False, None, MANY,
+                        name, time.perf_counter()),
+            wait)
 
-    def execute_script(self, query_file, values=(), error_handler=None):
+    def execute_unit(self, unit, wait=False, name=None):
+        """Execute the statements of a transaction unit as a single job, committing them
+        atomically.
+
+        Args:
+            unit: The TransactionUnit to be executed.
+            wait: If set, blocks until the unit has been executed.
+            name: An optional name under which the unit is timed (see query_stats).
+
+        Returns:
+            If executed with wait set, the apsw error raised by the failing statement (or None
+            if the unit committed). Otherwise, the WriteAck of the unit.
+        """
+        if self.exit_set:
+            return Sqlite3Worker.EXIT_TOKEN
+        token = str(uuid.uuid4())
+        future = Future()
+        result = self.__queue_write(
+            QueuedQuery(token, None, unit.statements, None, future, False, None, UNIT, name,
+                        time.perf_counter()),
+            wait)
+        if not wait:
+            unit.ack = result
+        return result
+
+    def __put(self, item):
+        self.sql_queue.put(item, timeout=5)
+        self.query_stats.record_queue_depth(self.sql_queue.qsize())
+
+    def __queue_write(self, item, wait):
+        with self.__last_write_lock:
+            self.__put(item)
+            self.__last_write = item.future
+        if wait:
+            return item.future.result()
+
+        return WriteAck(item.future)
+
+    def wait_for_writes(self):
+        """Block until every write queued so far has been executed."""
+        last_write = self.__last_write
+        if last_write is not None:
+            last_write.result()
+
+    def execute_script(self, query_file, values=(), error_handler=None, wait=False):
         with open(query_file) as query_stream:
             query = query_stream.read().strip()
 
-        return self.execute(query, values, error_handler)
+        return self.execute(query, values, error_handler, wait)
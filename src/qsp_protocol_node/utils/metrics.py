@@ -17,9 +17,11 @@ from log_streaming import get_logger
 
 class MetricCollector:
 
-    def __init__(self, config):
+    def __init__(self, config, block_mined_polling_thread=None, watchdog=None):
         self.__logger = get_logger(self.__class__.__qualname__)
         self.__config = config
+        self.__block_mined_polling_thread = block_mined_polling_thread
+        self.__watchdog = watchdog
         self.__process_identifier = "{0}-{1}".format(socket.gethostname(), os.getpid())
 
     def __get_auth_header(self, content):
@@ -74,6 +76,21 @@ class MetricCollector:
                 endpoint=self.__config.metric_collection_destination_endpoint
             )
 
+    def __get_block_mined_subscribers(self):
+        if self.__block_mined_polling_thread is None:
+            return {}
+        return self.__block_mined_polling_thread.subscriber_metrics
+
+    def __get_threads(self):
+        if self.__watchdog is None:
+            return {}
+        return self.__watchdog.metrics
+
+    def __get_analyzer_cache(self):
+        if self.__config.analyzer_cache is None:
+            return {}
+        return self.__config.analyzer_cache.metrics
+
     def collect_and_send(self):
         try:
             metrics_json = {
@@ -87,8 +104,14 @@ class MetricCollector:
                 'hostMemory': psutil.virtual_memory().percent,
                 'hostDisk': psutil.disk_usage('/').percent,
                 'minPrice': self.__config.min_price_in_qsp,
-                'account': self.__config.account
+                'account': self.__config.account,
+                'evtDbQueries': self.__config.event_pool_manager.query_metrics,
+                'evtDbCheckpoints': self.__config.event_pool_manager.checkpoint_metrics,
+                'blockMinedSubscribers': self.__get_block_mined_subscribers(),
+                'threads': self.__get_threads(),
+                'analyzerCache': self.__get_analyzer_cache(),
             }
+            self.__config.event_pool_manager.dump_query_metrics()
 
             if self.__config.metric_collection_destination_endpoint is not None:
                 self.send_to_dashboard(metrics_json)
@@ -0,0 +1,100 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2018, 2019 Quantstamp, Inc. This content and its use are governed by the license terms at    #
+# <https://s3.amazonaws.com/qsp-protocol-license/V2_LICENSE.txt>                                   #
+#                                                                                                  #
+####################################################################################################
+
+import json
+import os
+
+from tempfile import TemporaryDirectory
+from unittest.mock import MagicMock
+
+from audit import Analyzer
+from audit import AnalyzerCache
+from helpers.resource import resource_uri
+from helpers.qsp_test import QSPTest
+from utils.io import fetch_file
+
+
+class TestAnalyzerCache(QSPTest):
+
+    def setUp(self):
+        self.__directory = TemporaryDirectory()
+        self.__contract = fetch_file(resource_uri("DAOBug.sol"))
+
+    def tearDown(self):
+        self.__directory.cleanup()
+
+    def __report(self, index):
+        return {'status': 'success', 'potential_vulnerabilities': [], 'index': index}
+
+    def __size(self, index):
+        return len(json.dumps(self.__report(index)).encode('utf-8'))
+
+    def test_key(self):
+        """
+        Tests that the key changes with any of the contract, the analyzer, its version and args.
+        """
+        key = AnalyzerCache.key(self.__contract, "mythril", "sha256:1", "", "DAOBug.sol")
+        self.assertEqual(key, AnalyzerCache.key(self.__contract, "mythril", "sha256:1", "",
+                                                "DAOBug.sol"))
+        other_contract = fetch_file(resource_uri("BasicToken.sol"))
+        for other_key in [
+            AnalyzerCache.key(other_contract, "mythril", "sha256:1", "", "DAOBug.sol"),
+            AnalyzerCache.key(self.__contract, "securify", "sha256:1", "", "DAOBug.sol"),
+            AnalyzerCache.key(self.__contract, "mythril", "sha256:2", "", "DAOBug.sol"),
+            AnalyzerCache.key(self.__contract, "mythril", "sha256:1", "-t 2", "DAOBug.sol"),
+            AnalyzerCache.key(self.__contract, "mythril", "sha256:1", "", "Other.sol"),
+        ]:
+            self.assertNotEqual(key, other_key)
+
+    def test_lru_eviction(self):
+        """
+        Tests that the least recently used reports are evicted beyond the size of the cache, and
+        that the cache is reloaded from disk.
+        """
+        cache = AnalyzerCache(self.__directory.name, self.__size(0) * 2)
+        self.assertIsNone(cache.get("0"))
+        cache.put("0", self.__report(0))
+        cache.put("1", self.__report(1))
+        self.assertEqual(self.__report(0), cache.get("0"))
+        cache.put("2", self.__report(2))
+        self.assertIsNone(cache.get("1"))
+        self.assertEqual(self.__report(2), cache.get("2"))
+        self.assertEqual({'hits': 2, 'misses': 2, 'evictions': 1, 'entries': 2,
+                          'sizeBytes': self.__size(0) * 2}, cache.metrics)
+        self.assertEqual(2, len(os.listdir(self.__directory.name)))
+
+        reloaded = AnalyzerCache(self.__directory.name, self.__size(0) * 2)
+        self.assertEqual(self.__report(0), reloaded.get("0"))
+        self.assertEqual(self.__report(2), reloaded.get("2"))
+        reloaded = AnalyzerCache(self.__directory.name, self.__size(0))
+        self.assertEqual({'hits': 0, 'misses': 0, 'evictions': 1, 'entries': 1,
+                          'sizeBytes': self.__size(0)}, reloaded.metrics)
+
+    def test_analyzer_uses_cache(self):
+        """
+        Tests that an analyzer only runs its wrapper when its report is not cached, successful
+        reports being the only ones cached.
+        """
+        wrapper = MagicMock()
+        wrapper.analyzer_name = "mythril"
+        wrapper.args = ""
+        wrapper.get_metadata.return_value = {'name': "mythril", 'version': "sha256:1"}
+        wrapper.check.return_value = {'status': 'error', 'errors': ["Boom!"]}
+        cache = AnalyzerCache(self.__directory.name, 1024 * 1024)
+        analyzer = Analyzer(wrapper, cache)
+
+        analyzer.check(self.__contract, 1, "DAOBug.sol")
+        analyzer.check(self.__contract, 2, "DAOBug.sol")
+        self.assertEqual(2, wrapper.check.call_count)
+
+        wrapper.check.return_value = self.__report(0)
+        self.assertEqual(self.__report(0), analyzer.check(self.__contract, 3, "DAOBug.sol"))
+        self.assertEqual(self.__report(0), analyzer.check(self.__contract, 4, "DAOBug.sol"))
+        self.assertEqual(3, wrapper.check.call_count)
+        wrapper.get_metadata.assert_called_once()
+        self.assertEqual(1, cache.metrics['hits'])
+        self.assertEqual(3, cache.metrics['misses'])
@@ -395,7 +395,7 @@ class TestQSPAuditNode(QSPTest):
                         "submission_block_nbr": "IGNORE",
                         "fk_status": "DN",
                         "fk_type": "AU",
-                        "price": str(self.__PRICE),
+                        "price": str(self.__PRICE).zfill(78),
                         "status_info": "Report successfully submitted",
                         "tx_hash": "IGNORE",
                         "submission_attempts": 1,
@@ -403,9 +403,9 @@ class TestQSPAuditNode(QSPTest):
                         "audit_uri": "IGNORE",
                         "audit_hash": "IGNORE",
                         "audit_state": 4,
-                        "full_report": "IGNORE",
-                        "compressed_report": compressed_report
                         }
+        self.assertEqual(compressed_report,
+                         self.__config.event_pool_manager.get_report(1, "AU")['compressed_report'])
         self.assert_event_table_contains(self.__config, [expected_row],
                                          ignore_keys=[key for key in expected_row if expected_row[key] == "IGNORE"])
 
@@ -456,7 +456,7 @@ class TestQSPAuditNode(QSPTest):
                         "submission_block_nbr": "IGNORE",
                         "fk_status": "DN",
                         "fk_type": "AU",
-                        "price": str(self.__PRICE),
+                        "price": str(self.__PRICE).zfill(78),
                         "status_info": "Report successfully submitted",
                         "tx_hash": "IGNORE",
                         "submission_attempts": 1,
@@ -464,9 +464,9 @@ class TestQSPAuditNode(QSPTest):
                         "audit_uri": "IGNORE",
                         "audit_hash": "IGNORE",
                         "audit_state": 5,
-                        "full_report": "IGNORE",
-                        "compressed_report": compressed_report
                         }
+        self.assertEqual(compressed_report,
+                         self.__config.event_pool_manager.get_report(1, "AU")['compressed_report'])
         self.assert_event_table_contains(self.__config, [expected_row],
                                          ignore_keys=[key for key in expected_row if expected_row[key] == "IGNORE"])
 
@@ -517,7 +517,7 @@ class TestQSPAuditNode(QSPTest):
                         "submission_block_nbr": "IGNORE",
                         "fk_status": "DN",
                         "fk_type": "AU",
-                        "price": str(self.__PRICE),
+                        "price": str(self.__PRICE).zfill(78),
                         "status_info": "Report successfully submitted",
                         "tx_hash": "IGNORE",
                         "submission_attempts": 1,
@@ -525,9 +525,9 @@ class TestQSPAuditNode(QSPTest):
                         "audit_uri": "IGNORE",
                         "audit_hash": "IGNORE",
                         "audit_state": 5,
-                        "full_report": "IGNORE",
-                        "compressed_report": compressed_report
                         }
+        self.assertEqual(compressed_report,
+                         self.__config.event_pool_manager.get_report(1, "AU")['compressed_report'])
         self.assert_event_table_contains(self.__config, [expected_row],
                                           ignore_keys=[key for key in expected_row if expected_row[key] == "IGNORE"])
 
@@ -562,7 +562,7 @@ class TestQSPAuditNode(QSPTest):
                         "submission_block_nbr": "IGNORE",
                         "fk_status": "DN",
                         "fk_type": "AU",
-                        "price": str(self.__PRICE),
+                        "price": str(self.__PRICE).zfill(78),
                         "status_info": "Report successfully submitted",
                         "tx_hash": "IGNORE",
                         "submission_attempts": 1,
@@ -570,9 +570,9 @@ class TestQSPAuditNode(QSPTest):
                         "audit_uri": "IGNORE",
                         "audit_hash": "IGNORE",
                         "audit_state": self.__AUDIT_STATE_ERROR,
-                        "full_report": "IGNORE",
-                        "compressed_report": compressed_report
                         }
+        self.assertEqual(compressed_report,
+                         self.__config.event_pool_manager.get_report(1, "AU")['compressed_report'])
         self.assert_event_table_contains(self.__config, [expected_row],
                                          ignore_keys=[key for key in expected_row if expected_row[key] == "IGNORE"])
 
@@ -591,7 +591,7 @@ class TestQSPAuditNode(QSPTest):
         for thread_i in theads_to_die:
             try:
                 thread_to_die = self.__audit_node._QSPAuditNode__internal_threads[thread_i]
-                thread_to_die._exec = False
+                thread_to_die.stop()
                 thread_to_die.join()
                 self.__audit_node._QSPAuditNode__check_all_threads()
                 self.assertTrue(False, "Dead threads were not detected")
@@ -699,7 +699,7 @@ class TestQSPAuditNode(QSPTest):
                              "submission_block_nbr": "IGNORE",
                              "fk_status": "DN",
                              "fk_type": "AU",
-                             "price": str(self.__PRICE),
+                             "price": str(self.__PRICE).zfill(78),
                              "status_info": "Report successfully submitted",
                              "tx_hash": "IGNORE",
                              "submission_attempts": 1,
@@ -707,9 +707,9 @@ class TestQSPAuditNode(QSPTest):
                              "audit_uri": "IGNORE",
                              "audit_hash": "IGNORE",
                              "audit_state": self.__AUDIT_STATE_ERROR,
-                             "full_report": "IGNORE",
-                             "compressed_report": compressed_report
                              }
+        self.assertEqual(compressed_report,
+                         self.__config.event_pool_manager.get_report(1, "AU")['compressed_report'])
         self.assert_event_table_contains(self.__config, [expected_row],
                                             ignore_keys=[key for key in expected_row if expected_row[key] == "IGNORE"])
 
@@ -741,7 +741,7 @@ class TestQSPAuditNode(QSPTest):
                         "submission_block_nbr": "IGNORE",
                         "fk_status": "DN",
                         "fk_type": "AU",
-                        "price": str(self.__PRICE),
+                        "price": str(self.__PRICE).zfill(78),
                         "status_info": "Report successfully submitted",
                         "tx_hash": "IGNORE",
                         "submission_attempts": 1,
@@ -749,9 +749,9 @@ class TestQSPAuditNode(QSPTest):
                         "audit_uri": "IGNORE",
                         "audit_hash": "IGNORE",
                         "audit_state": self.__AUDIT_STATE_ERROR,
-                        "full_report": "IGNORE",
-                        "compressed_report": compressed_report
                         }
+        self.assertEqual(compressed_report,
+                         self.__config.event_pool_manager.get_report(1, "AU")['compressed_report'])
         self.assert_event_table_contains(self.__config, [expected_row],
                                             ignore_keys=[key for key in expected_row if expected_row[key] == "IGNORE"])
 
@@ -856,7 +856,7 @@ class TestQSPAuditNode(QSPTest):
                         "submission_block_nbr": "IGNORE",
                         "fk_status": "DN",
                         "fk_type": "AU",
-                        "price": str(self.__PRICE),
+                        "price": str(self.__PRICE).zfill(78),
                         "status_info": "Report successfully submitted",
                         "tx_hash": "IGNORE",
                         "submission_attempts": 1,
@@ -864,9 +864,9 @@ class TestQSPAuditNode(QSPTest):
                         "audit_uri": "IGNORE",
                         "audit_hash": "IGNORE",
                         "audit_state": self.__AUDIT_STATE_ERROR,
-                        "full_report": "IGNORE",
-                        "compressed_report": compressed_report
                         }
+        self.assertEqual(compressed_report,
+                         self.__config.event_pool_manager.get_report(1, "AU")['compressed_report'])
         self.assert_event_table_contains(self.__config, [expected_row],
                                             ignore_keys=[key for key in expected_row if expected_row[key] == "IGNORE"])
 
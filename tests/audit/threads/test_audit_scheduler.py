@@ -0,0 +1,68 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2018, 2019 Quantstamp, Inc. This content and its use are governed by the license terms at    #
+# <https://s3.amazonaws.com/qsp-protocol-license/V2_LICENSE.txt>                                   #
+#                                                                                                  #
+####################################################################################################
+
+from unittest.mock import MagicMock
+
+from audit.threads.audit_scheduler import AuditScheduler
+from helpers.qsp_test import QSPTest
+
+
+class TestAuditScheduler(QSPTest):
+
+    def setUp(self):
+        self.__config = MagicMock()
+        analyzers = [MagicMock(), MagicMock()]
+        analyzers[0].wrapper.timeout_sec = 60
+        analyzers[1].wrapper.timeout_sec = 120
+        self.__config.analyzers = analyzers
+        # A block every 10 seconds
+        self.__config.web3_client.eth.getBlock.side_effect = \
+            lambda number: {'timestamp': 10 * number}
+        self.__scheduler = AuditScheduler(self.__config)
+
+    def test_order(self):
+        """
+        Tests that events are ordered by earliest deadline first, and then by decreasing price.
+        """
+        evts = [
+            {'request_id': 1, 'assigned_block_nbr': 110, 'price': 5},
+            {'request_id': 2, 'assigned_block_nbr': 100, 'price': 1},
+            {'request_id': 3, 'assigned_block_nbr': 100, 'price': 3},
+            {'request_id': 4, 'assigned_block_nbr': 105, 'price': 2},
+        ]
+        self.assertEqual([3, 2, 4, 1],
+                         [evt['request_id'] for evt in AuditScheduler.order(evts)])
+
+    def test_can_finish(self):
+        """
+        Tests that events can only be audited if the analyzers may run up to their timeout and the
+        report be submitted before the deadline.
+        """
+        self.assertEqual(120, self.__scheduler.audit_time)
+        self.assertEqual(10, self.__scheduler.block_time(1000))
+        evt = {'fk_type': 'AU', 'assigned_block_nbr': 960}
+        self.assertTrue(self.__scheduler.can_finish(evt, 53, 1000))
+        self.assertFalse(self.__scheduler.can_finish(evt, 52, 1000))
+
+    def test_can_finish_police_check(self):
+        """
+        Tests that police checks, whose deadline is not known, are never deemed unable to finish.
+        """
+        evt = {'fk_type': 'PC', 'assigned_block_nbr': 960}
+        self.assertTrue(self.__scheduler.can_finish(evt, 0, 1000))
+
+    def test_block_time(self):
+        """
+        Tests that the block time is measured again only once enough blocks have been mined,
+        falling back to a default on chains too short.
+        """
+        self.assertEqual(AuditScheduler.DEFAULT_BLOCK_TIME_SEC, self.__scheduler.block_time(5))
+        self.assertEqual(10, self.__scheduler.block_time(AuditScheduler.BLOCK_TIME_SAMPLE + 5))
+        self.__config.web3_client.eth.getBlock.side_effect = \
+            lambda number: {'timestamp': 15 * number}
+        self.assertEqual(10, self.__scheduler.block_time(AuditScheduler.BLOCK_TIME_SAMPLE + 6))
+        self.assertEqual(15, self.__scheduler.block_time(2 * AuditScheduler.BLOCK_TIME_SAMPLE + 5))
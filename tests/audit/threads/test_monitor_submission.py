@@ -49,7 +49,7 @@ class TestMonitorSubmissionThreads(QSPTest):
 
         with mock.patch('evt.evt_pool_manager.EventPoolManager._EventPoolManager__exec_sql',
                         return_value=[event]):
-            self.thread._MonitorSubmissionThread__process_submissions()
+            self.assertEqual(1, self.thread._MonitorSubmissionThread__process_submissions())
             event['status_info'] = "Submission of audit report outside completion window ({0} blocks)".format(
                 self.timeout_limit_blocks
             )
@@ -57,6 +57,35 @@ class TestMonitorSubmissionThreads(QSPTest):
             self.evt_pool_manager.set_evt_status_to_done.assert_not_called()
             self.evt_pool_manager.set_evt_status_to_be_submitted.assert_not_called()
 
+    @timeout(15, timeout_exception=StopIteration)
+    def test_waiting_for_confirmation(self):
+        """
+        Tests that events whose submission is not yet confirmed are left as they are, and not
+        counted as processed.
+        """
+        current_block = 100000000000
+
+        web3_mock = MagicMock()
+        web3_mock.eth.blockNumber = current_block
+        self.config._Config__web3_client = web3_mock
+        self.config._Config__n_blocks_confirmation = 6
+
+        event = {
+            'assigned_block_nbr': current_block,
+            'submission_block_nbr': current_block,
+            'submission_attempts': 1,
+            'request_id': 17
+        }
+
+        with mock.patch('evt.evt_pool_manager.EventPoolManager._EventPoolManager__exec_sql',
+                        return_value=[event]), \
+                mock.patch('audit.threads.monitor_submission_thread.mk_read_only_call',
+                           side_effect=[self.timeout_limit_blocks, True]):
+            self.assertEqual(0, self.thread._MonitorSubmissionThread__process_submissions())
+            self.evt_pool_manager.set_evt_status_to_error.assert_not_called()
+            self.evt_pool_manager.set_evt_status_to_done.assert_not_called()
+            self.evt_pool_manager.set_evt_status_to_be_submitted.assert_not_called()
+
     @timeout(15, timeout_exception=StopIteration)
     def test_timeout_after_reaching_global_limit_but_missing_assigned_block_nbr(self):
         current_block = 100000000000
@@ -5,6 +5,9 @@
 #                                                                                                  #
 ####################################################################################################
 
+from threading import Event
+from unittest import mock
+
 from audit import PerformAuditThread
 from helpers.qsp_test import QSPTest
 from helpers.resource import (
@@ -78,6 +81,99 @@ class TestPerformAuditThread(QSPTest):
                                                                1)
         self.compare_json(report, "reports/BasicTokenErrorWithMetadata.json", json_loaded=True)
 
+    @timeout(30, timeout_exception=StopIteration)
+    def test_concurrent_audits(self):
+        """
+        Tests that events are audited concurrently, up to max_concurrent_audits at once, and never
+        handed twice while in flight.
+        """
+        self.__config._Config__max_concurrent_audits = 2
+        thread = PerformAuditThread(self.__config)
+        evts = [{'request_id': request_id, 'fk_type': 'AU', 'assigned_block_nbr': 0, 'price': 1}
+                for request_id in [1, 1, 2, 3]]
+        started = []
+        in_flight = Event()
+        release = Event()
+
+        def process(evt):
+            started.append(evt['request_id'])
+            if len(started) == 2:
+                in_flight.set()
+            release.wait()
+
+        with mock.patch.object(self.__config.event_pool_manager, 'incoming_events',
+                               return_value=evts), \
+                mock.patch.object(thread, '_PerformAuditThread__process_audit_request',
+                                  side_effect=process):
+            self.assertEqual(2, thread._PerformAuditThread__process_incoming())
+            in_flight.wait()
+            self.assertEqual(0, thread._PerformAuditThread__process_incoming())
+            release.set()
+            thread._PerformAuditThread__workers.shutdown(wait=True)
+        self.assertEqual([1, 2], sorted(started))
+        self.assertEqual(set(), thread._PerformAuditThread__in_flight)
+
+    @timeout(30, timeout_exception=StopIteration)
+    def test_incoming_window(self):
+        """
+        Tests that only one page of the incoming events is pulled per sweep, and that the events
+        are handed by earliest deadline first within that page.
+        """
+        self.__config._Config__max_concurrent_audits = 1
+        thread = PerformAuditThread(self.__config)
+        pulled = []
+        started = []
+        release = Event()
+
+        def process(evt):
+            started.append(evt['request_id'])
+            release.wait()
+
+        def incoming_events():
+            for request_id, assigned_block_nbr in enumerate([50, 40, 30, 20, 10]):
+                pulled.append(request_id)
+                yield {'request_id': request_id, 'fk_type': 'AU',
+                       'assigned_block_nbr': assigned_block_nbr, 'price': 1}
+
+        with mock.patch.object(self.__config.event_pool_manager, 'incoming_events',
+                               side_effect=incoming_events), \
+                mock.patch.object(type(self.__config.event_pool_manager), 'page_size',
+                                  new_callable=mock.PropertyMock, return_value=2), \
+                mock.patch.object(thread, '_PerformAuditThread__process_audit_request',
+                                  side_effect=process):
+            self.assertEqual(1, thread._PerformAuditThread__process_incoming())
+            release.set()
+            thread._PerformAuditThread__workers.shutdown(wait=True)
+        self.assertEqual([0, 1], pulled)
+        self.assertEqual([1], started)
+
+    @timeout(30, timeout_exception=StopIteration)
+    def test_incoming_deadlines(self):
+        """
+        Tests that the audit timeout is only queried if unmeetable audits are discarded, the
+        latest block being then taken from the block mined polling thread.
+        """
+        block_mined_polling_thread = mock.MagicMock()
+        block_mined_polling_thread.current_block = 1000
+        evts = [{'request_id': 1, 'fk_type': 'AU', 'assigned_block_nbr': 990, 'price': 1}]
+        for discard in [False, True]:
+            self.__config._Config__discard_unmeetable_audits = discard
+            thread = PerformAuditThread(self.__config, block_mined_polling_thread)
+            scheduler = thread._PerformAuditThread__scheduler
+            with mock.patch.object(self.__config.event_pool_manager, 'incoming_events',
+                                   return_value=evts), \
+                    mock.patch.object(scheduler, 'timeout_limit_blocks',
+                                      return_value=50) as timeout_limit_blocks, \
+                    mock.patch.object(scheduler, 'can_finish', return_value=True) as can_finish, \
+                    mock.patch.object(thread, '_PerformAuditThread__process_audit_request'):
+                self.assertEqual(1, thread._PerformAuditThread__process_incoming())
+                thread._PerformAuditThread__workers.shutdown(wait=True)
+            self.assertEqual(discard, timeout_limit_blocks.called)
+            if discard:
+                can_finish.assert_called_once_with(evts[0], 50, 1000)
+            else:
+                can_finish.assert_not_called()
+
     def __check_audit_result(self, statuses, expected_state, expected_status):
         wrappers = [WrapperMock() for _ in statuses]
         local_reports = [{"status": i} for i in statuses]
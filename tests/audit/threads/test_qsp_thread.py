@@ -0,0 +1,182 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2018, 2019 Quantstamp, Inc. This content and its use are governed by the license terms at    #
+# <https://s3.amazonaws.com/qsp-protocol-license/V2_LICENSE.txt>                                   #
+#                                                                                                  #
+####################################################################################################
+
+from threading import Event
+from unittest.mock import MagicMock
+
+from audit.threads.qsp_thread import BlockMinedPollingThread
+from audit.threads.qsp_thread import BlockMinedSubscription
+from audit.threads.qsp_thread import BlockMinedSubscriberThread
+from audit.threads.qsp_thread import FilterBlockSource
+from audit.threads.qsp_thread import PollingBlockSource
+from audit.threads.qsp_thread import TimeIntervalPollingThread
+from helpers.qsp_test import QSPTest
+from timeout_decorator import timeout
+
+
+class TestQSPThread(QSPTest):
+
+    @timeout(15, timeout_exception=StopIteration)
+    def test_time_interval_stop(self):
+        """
+        Tests that a thread waiting for its next interval stops right away.
+        """
+        called = Event()
+        thread = TimeIntervalPollingThread(MagicMock(), called.set, "interval thread",
+                                           polling_interval=1000)
+        thread.start()
+        called.wait()
+        thread.stop()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(thread.exec)
+
+    @timeout(15, timeout_exception=StopIteration)
+    def test_adaptive_polling(self):
+        """
+        Tests that the interval shrinks down to its floor while work is processed, and backs off
+        up to its ceiling otherwise.
+        """
+        processed = [3, 1, 2, 0, 0, 0, 0]
+        intervals = []
+        done = Event()
+
+        def process():
+            intervals.append(thread.polling_interval)
+            if len(processed) == 1:
+                done.set()
+            return processed.pop(0) if len(processed) > 0 else 0
+
+        thread = TimeIntervalPollingThread(MagicMock(), process, "adaptive thread",
+                                           polling_interval=0.1,
+                                           adaptive_polling={'min_sec': 0.02, 'max_sec': 0.2})
+        thread.start()
+        done.wait()
+        thread.stop()
+        thread.join()
+        self.assertEqual([0.1, 0.05, 0.025, 0.02, 0.04, 0.08, 0.16], intervals[:7])
+        self.assertEqual(0.2, thread.polling_interval)
+
+    @timeout(15, timeout_exception=StopIteration)
+    def test_block_mined(self):
+        """
+        Tests that subscribers are called upon every new block they see, and stop right away when
+        waiting for one.
+        """
+        config = MagicMock()
+        config.block_mined_polling = 1000
+        config.block_mined_source = 'polling'
+        config.web3_client.eth.blockNumber = 10
+        polling_thread = BlockMinedPollingThread(config)
+        blocks = []
+        called = Event()
+
+        def on_block_mined(block_number):
+            blocks.append(block_number)
+            called.set()
+
+        thread = BlockMinedSubscriberThread(config, on_block_mined, "subscriber thread",
+                                            polling_thread)
+        polling_thread.start()
+        thread.start()
+        called.wait()
+        called.clear()
+        polling_thread.current_block = 11
+        called.wait()
+        self.assertEqual([10, 11], blocks)
+
+        for stopped in [thread, polling_thread]:
+            stopped.stop()
+            stopped.join(timeout=5)
+            self.assertFalse(stopped.is_alive())
+        self.assertEqual([10, 11], blocks)
+
+    @timeout(15, timeout_exception=StopIteration)
+    def test_block_mined_stop_before_run(self):
+        """
+        Tests that a subscriber stopped before running neither runs nor stays subscribed.
+        """
+        config = MagicMock()
+        config.block_mined_polling = 1000
+        config.block_mined_source = 'polling'
+        config.web3_client.eth.blockNumber = 10
+        polling_thread = BlockMinedPollingThread(config)
+        target = MagicMock()
+        thread = BlockMinedSubscriberThread(config, target, "subscriber thread", polling_thread)
+        thread.stop()
+        thread.start()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(target.called)
+        self.assertEqual({}, polling_thread.subscriber_metrics)
+
+    def test_block_mined_subscription(self):
+        """
+        Tests that subscriptions hand every block pending, or the latest one only if coalescing,
+        and keep track of how far behind their subscriber is.
+        """
+        every = BlockMinedSubscription("every", 10, coalesce=False)
+        coalescing = BlockMinedSubscription("coalescing", 10, coalesce=True)
+        for subscription in [every, coalescing]:
+            self.assertEqual(10, subscription.next_block())
+            subscription.publish(14)
+            self.assertEqual(4, subscription.lag)
+
+        self.assertEqual([11, 12, 13, 14], [every.next_block() for _ in range(4)])
+        self.assertEqual(14, coalescing.next_block())
+        self.assertEqual({'lag': 0, 'maxLag': 4, 'delivered': 5, 'coalesced': 0}, every.metrics)
+        self.assertEqual({'lag': 0, 'maxLag': 4, 'delivered': 2, 'coalesced': 3},
+                         coalescing.metrics)
+
+        every.close()
+        self.assertIsNone(every.next_block())
+
+    def test_filter_block_source(self):
+        """
+        Tests that the latest block is derived from the blocks the filter reports, its number
+        being only queried upon start, when several blocks are reported at once, every
+        RESYNC_BLOCKS blocks, and once the filter is reinstalled after being dropped by the node.
+        """
+        config = MagicMock()
+        config.web3_client.eth.blockNumber = 10
+        block_filter = config.web3_client.eth.filter.return_value
+        block_filter.get_new_entries.return_value = []
+        source = FilterBlockSource(config)
+        config.web3_client.eth.filter.assert_called_once_with('latest')
+        self.assertEqual(10, source.latest_block(0))
+        self.assertEqual(10, source.latest_block(10))
+
+        config.web3_client.eth.blockNumber = 12
+        self.assertEqual(10, source.latest_block(10))
+        block_filter.get_new_entries.return_value = ['0x1', '0x2']
+        self.assertEqual(12, source.latest_block(10))
+
+        # The latest block number is stale on purpose, showing it is not queried
+        config.web3_client.eth.blockNumber = 99
+        block_filter.get_new_entries.return_value = ['0x3']
+        for block_number in range(12, 12 + FilterBlockSource.RESYNC_BLOCKS):
+            self.assertEqual(block_number + 1, source.latest_block(block_number))
+        self.assertEqual(99, source.latest_block(12 + FilterBlockSource.RESYNC_BLOCKS))
+
+        config.web3_client.eth.blockNumber = 100
+        block_filter.get_new_entries.side_effect = ValueError("filter not found")
+        self.assertEqual(100, source.latest_block(99))
+        self.assertEqual(2, config.web3_client.eth.filter.call_count)
+
+    def test_block_source_fallback(self):
+        """
+        Tests that blocks are polled for if the node does not support filters.
+        """
+        config = MagicMock()
+        config.block_mined_source = 'filter'
+        config.web3_client.eth.filter.side_effect = ValueError("method not found")
+        thread = BlockMinedPollingThread(config)
+        self.assertTrue(isinstance(thread._BlockMinedPollingThread__create_block_source(),
+                                   PollingBlockSource))
+        config.block_mined_source = 'unknown'
+        with self.assertRaises(ValueError):
+            thread._BlockMinedPollingThread__create_block_source()
@@ -0,0 +1,80 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2018, 2019 Quantstamp, Inc. This content and its use are governed by the license terms at    #
+# <https://s3.amazonaws.com/qsp-protocol-license/V2_LICENSE.txt>                                   #
+#                                                                                                  #
+####################################################################################################
+
+from unittest.mock import MagicMock
+
+from audit import RetentionThread
+from helpers.resource import fetch_config, remove
+from helpers.qsp_test import QSPTest
+
+
+class TestRetentionThread(QSPTest):
+
+    @classmethod
+    def setUpClass(cls):
+        QSPTest.setUpClass()
+        config = fetch_config(inject_contract=True)
+        remove(config.evt_db_path)
+
+    def setUp(self):
+        self.__config = fetch_config(inject_contract=True)
+        self.__config._Config__evt_db_retention_blocks = 10
+        self.__retention_thread = RetentionThread(self.__config)
+
+    def test_init(self):
+        self.assertEqual(self.__config, self.__retention_thread.config)
+
+    def test_stop(self):
+        self.__retention_thread.stop()
+        self.assertFalse(self.__retention_thread.exec)
+
+    def test_apply_retention(self):
+        """
+        Tests that old events are removed batch after batch, before the freed space is given back
+        step after step.
+        """
+        event_pool_manager = self.__config.event_pool_manager
+        event_pool_manager.apply_retention = MagicMock(side_effect=[100, 20, 0])
+        event_pool_manager.vacuum = MagicMock(side_effect=[50, 0])
+        current_block = self.__config.web3_client.eth.blockNumber
+
+        self.__retention_thread._exec = True
+        self.__retention_thread._RetentionThread__apply_retention()
+        self.__retention_thread._exec = False
+
+        self.assertEqual(3, event_pool_manager.apply_retention.call_count)
+        event_pool_manager.apply_retention.assert_called_with(current_block - 10, 100)
+        self.assertEqual(2, event_pool_manager.vacuum.call_count)
+        event_pool_manager.vacuum.assert_called_with(100)
+
+    def test_vacuum_releasing_no_page(self):
+        """
+        Tests that the freed space stops being given back once a step releases no page, e.g.,
+        when the database is not in incremental auto-vacuum mode.
+        """
+        event_pool_manager = self.__config.event_pool_manager
+        event_pool_manager.apply_retention = MagicMock(side_effect=[100, 0])
+        event_pool_manager.vacuum = MagicMock(return_value=500)
+
+        self.__retention_thread._exec = True
+        self.__retention_thread._RetentionThread__apply_retention()
+        self.__retention_thread._exec = False
+
+        self.assertEqual(2, event_pool_manager.vacuum.call_count)
+
+    def test_apply_retention_when_stopped(self):
+        """
+        Tests that nothing is removed once the thread is signaled to stop.
+        """
+        event_pool_manager = self.__config.event_pool_manager
+        event_pool_manager.apply_retention = MagicMock(return_value=100)
+        event_pool_manager.vacuum = MagicMock(return_value=50)
+
+        self.__retention_thread._RetentionThread__apply_retention()
+
+        event_pool_manager.apply_retention.assert_not_called()
+        event_pool_manager.vacuum.assert_not_called()
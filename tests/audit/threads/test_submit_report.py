@@ -6,6 +6,8 @@
 ####################################################################################################
 
 from hexbytes import HexBytes
+from time import sleep
+from timeout_decorator import timeout
 from unittest import mock
 from unittest.mock import MagicMock
 
@@ -25,6 +27,27 @@ class TestSubmitReportThread(QSPTest):
         self.__config = fetch_config(inject_contract=True)
         self.__submit_thread = SubmitReportThread(self.__config)
 
+    @timeout(10, timeout_exception=StopIteration)
+    def test_woken_up_by_transition(self):
+        """
+        Tests that events set to be submitted are processed right away, rather than upon the next
+        polling interval.
+        """
+        self.__submit_thread._TimeIntervalPollingThread__polling_interval = 1000
+        manager = self.__config.event_pool_manager
+        evt = {'request_id': 1, 'fk_type': 'AU', 'status_info': '', 'tx_hash': None,
+               'audit_uri': None, 'audit_hash': None, 'audit_state': None,
+               'submission_block_nbr': None}
+        with mock.patch.object(manager, 'process_events_to_be_submitted') as process_mock:
+            self.__submit_thread.start()
+            while process_mock.call_count < 1:
+                sleep(0.1)
+            manager.set_evt_status_to_be_submitted(evt)
+            while process_mock.call_count < 2:
+                sleep(0.1)
+            self.__submit_thread.stop()
+            self.__submit_thread.join()
+
     def test_get_report_in_blockchain_no_exception(self):
         """
         Tests whether calling the smart contract to get a report in the blockchain works.
@@ -0,0 +1,74 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2018, 2019 Quantstamp, Inc. This content and its use are governed by the license terms at    #
+# <https://s3.amazonaws.com/qsp-protocol-license/V2_LICENSE.txt>                                   #
+#                                                                                                  #
+####################################################################################################
+
+from threading import Event
+from threading import Thread
+from unittest.mock import MagicMock
+
+from audit import Watchdog
+from audit.threads.qsp_thread import TimeIntervalPollingThread
+from helpers.qsp_test import QSPTest
+from timeout_decorator import timeout
+
+
+class TestWatchdog(QSPTest):
+
+    @timeout(15, timeout_exception=StopIteration)
+    def test_stall(self):
+        """
+        Tests that an iteration going over the budget of its thread is reported as stalled until
+        it completes, while the others are not.
+        """
+        watchdog = Watchdog(1000, {'stuck thread': 0.1})
+        unblock = Event()
+        stuck = TimeIntervalPollingThread(MagicMock(), unblock.wait, "stuck thread",
+                                          polling_interval=1000)
+        idle = TimeIntervalPollingThread(MagicMock(), lambda: None, "idle thread",
+                                         polling_interval=1000)
+        watchdog.watch([stuck, idle])
+        self.assertEqual(watchdog, stuck.watchdog)
+        for thread in [stuck, idle]:
+            thread.start()
+
+        waiter = Thread(target=watchdog.wait_for_exit)
+        waiter.start()
+        while not watchdog.metrics.get('stuck thread', {}).get('stalled', False):
+            waiter.join(timeout=0.05)
+        metrics = watchdog.metrics
+        self.assertEqual(1, metrics['stuck thread']['stalls'])
+        self.assertEqual(0, metrics['stuck thread']['iterations'])
+        self.assertTrue(metrics['stuck thread']['busySec'] >= 0.1)
+        self.assertEqual(0.1, metrics['stuck thread']['budgetSec'])
+        self.assertEqual(1, metrics['idle thread']['iterations'])
+        self.assertEqual(0, metrics['idle thread']['stalls'])
+
+        unblock.set()
+        while watchdog.metrics['stuck thread']['iterations'] == 0:
+            waiter.join(timeout=0.05)
+        self.assertFalse(watchdog.metrics['stuck thread']['stalled'])
+        self.assertEqual(1, watchdog.metrics['stuck thread']['stalls'])
+
+        watchdog.wake()
+        waiter.join()
+        for thread in [stuck, idle]:
+            thread.stop()
+            thread.join()
+
+    @timeout(15, timeout_exception=StopIteration)
+    def test_exit(self):
+        """
+        Tests that waiting returns the thread exiting, or None once woken up.
+        """
+        watchdog = Watchdog(1000)
+        thread = TimeIntervalPollingThread(MagicMock(), lambda: None, "thread",
+                                           polling_interval=1000)
+        watchdog.watch([thread])
+        thread.start()
+        thread.stop()
+        self.assertEqual(thread, watchdog.wait_for_exit())
+        watchdog.wake()
+        self.assertIsNone(watchdog.wait_for_exit())
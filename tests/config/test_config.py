@@ -32,7 +32,7 @@ class ConfigUtilsDummy:
     def create_eth_provider(self, provider, args):
         return self.return_values.get('create_eth_provider', None)
 
-    def create_analyzers(self, analyzers_config):
+    def create_analyzers(self, analyzers_config, analyzer_cache=None):
         return self.return_values.get('create_analyzers', None)
 
     def check_audit_contract_settings(self):
@@ -72,11 +72,11 @@ class ConfigUtilsMock(SimpleMock):
         arguments_to_check = ['provider', 'args']
         return self.call('create_eth_provider', arguments_to_check, locals())
 
-    def create_analyzers(self, analyzers_config):
+    def create_analyzers(self, analyzers_config, analyzer_cache=None):
         """
         A stub for configure_logging method.
         """
-        arguments_to_check = ['analyzers_config']
+        arguments_to_check = ['analyzers_config', 'analyzer_cache']
         return self.call('create_analyzers', arguments_to_check, locals())
 
     def check_audit_contract_settings(self, config):
@@ -257,7 +257,8 @@ class TestConfig(QSPTest):
         config._Config__logger = logger
         utils = ConfigUtilsMock()
         utils.expect('create_analyzers',
-                     {'analyzers_config': analyzers_config, 'logger': logger},
+                     {'analyzers_config': analyzers_config, 'analyzer_cache': None,
+                      'logger': logger},
                      return_value)
         result = config._Config__create_analyzers(utils)
         self.assertEqual(return_value, result)
@@ -310,7 +311,28 @@ class TestConfig(QSPTest):
         self.assertEqual("dynamic", config.gas_price_strategy)
         self.assertIsNone(config.config_file_uri)
         self.assertIsNone(config.evt_db_path)
+        self.assertEqual(1, config.evt_db_group_commit_size)
+        self.assertEqual(0, config.evt_db_group_commit_latency_sec)
+        self.assertEqual(0, config.evt_db_reader_pool_size)
+        self.assertEqual(1000, config.evt_db_wal_checkpoint_pages)
+        self.assertEqual(100, config.evt_db_page_size)
+        self.assertIsNone(config.evt_db_archive_path)
+        self.assertEqual(0, config.evt_db_retention_blocks)
+        self.assertEqual(100, config.evt_db_retention_batch_size)
+        self.assertEqual(100, config.evt_db_vacuum_pages)
+        self.assertFalse(config.evt_db_rebuild_for_auto_vacuum)
+        self.assertEqual('sqlite', config.evt_db_engine)
+        self.assertIsNone(config.evt_db_snapshot_path)
         self.assertEqual(10, config.submission_timeout_limit_blocks)
+        self.assertEqual('polling', config.block_mined_source)
+        self.assertEqual(600, config.watchdog_budget_sec)
+        self.assertEqual({}, config.watchdog_budgets)
+        self.assertEqual({}, config.adaptive_polling)
+        self.assertEqual(1, config.max_concurrent_audits)
+        self.assertFalse(config.discard_unmeetable_audits)
+        self.assertIsNone(config.analyzer_cache_path)
+        self.assertEqual(100, config.analyzer_cache_max_size_mb)
+        self.assertIsNone(config.analyzer_cache)
         self.assertIsNone(config.event_pool_manager)
         self.assertTrue(config.metric_collection_is_enabled)
         self.assertEquals(30, config.metric_collection_interval_seconds)
@@ -373,7 +395,7 @@ class TestConfig(QSPTest):
                      {'config': config},
                      None)
         utils.expect('create_analyzers',
-                     {'analyzers_config': analyzers_config},
+                     {'analyzers_config': analyzers_config, 'analyzer_cache': None},
                      created_analyzers)
         utils.expect('create_upload_provider',
                      {'account': new_account,
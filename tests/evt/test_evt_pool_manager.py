@@ -11,10 +11,12 @@ import unittest
 from unittest import mock
 
 from config import config_value
+from evt import AuditEvent
 from evt import EventPoolManager
 from helpers.resource import remove
 from helpers.resource import resource_uri
 from helpers.qsp_test import QSPTest
+from utils.db import get_first
 from utils.io import fetch_file, load_yaml
 
 
@@ -57,27 +59,60 @@ class TestEvtPoolManager(QSPTest):
         remove(TestEvtPoolManager.db_file)
         TestEvtPoolManager.PROCESSED = []
 
-    def test_encode(self):
+    def test_encode_price(self):
         """
-        Tests that encoding dictionaries to string values works.
+        Tests that prices are encoded as zero-padded strings preserving their numeric order.
         """
-        self.assertIsNone(EventPoolManager._EventPoolManager__encode(None))
-        to_encode = {"price": 1, 'assigned_block_nbr': 2, "anything": "string"}
-        encoded = EventPoolManager._EventPoolManager__encode(to_encode)
-        self.assertEqual("1", encoded["price"])
-        self.assertEqual("2", encoded['assigned_block_nbr'])
-        self.assertEqual("string", encoded["anything"])
+        encoded = EventPoolManager._EventPoolManager__encode_price(12)
+        self.assertEqual(78, len(encoded))
+        self.assertEqual(12, int(encoded))
+        large_price = 10 ** 30
+        self.assertTrue(encoded < EventPoolManager._EventPoolManager__encode_price(large_price))
 
     def test_decode(self):
         """
-        Tests that encoding dictionaries to string values works.
+        Tests that decoding converts the price of a row back to an integer, in place.
         """
         self.assertIsNone(EventPoolManager._EventPoolManager__decode(None))
-        to_decode = {"price": "1", 'assigned_block_nbr': "2", "anything": "string"}
-        encoded = EventPoolManager._EventPoolManager__decode(to_decode)
-        self.assertEqual(1, encoded["price"])
-        self.assertEqual(2, encoded['assigned_block_nbr'])
-        self.assertEqual("string", encoded["anything"])
+        to_decode = {"price": "0001", 'assigned_block_nbr': 2, "anything": "string"}
+        decoded = EventPoolManager._EventPoolManager__decode(to_decode)
+        self.assertIs(to_decode, decoded)
+        self.assertEqual(1, decoded["price"])
+        self.assertEqual(2, decoded['assigned_block_nbr'])
+        self.assertEqual("string", decoded["anything"])
+
+    def test_large_price(self):
+        self.evt_first['price'] = 10 ** 30
+        self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
+        evt = self.evt_pool_manager.get_event_by_request_id(self.evt_first['request_id'])
+        self.assertEqual(10 ** 30, evt['price'])
+
+    def test_statement_registry(self):
+        statements = self.evt_pool_manager._EventPoolManager__statements
+        self.assertTrue('createdb' in statements)
+        self.assertFalse('nonexistent' in statements)
+        self.assertTrue(statements['get_event_by_request_id'].is_select)
+        self.assertTrue(statements['get_latest_block_number'].is_select)
+        self.assertFalse(statements['add_evt_to_be_assigned'].is_select)
+        self.assertFalse(statements['set_evt_status_to_done'].is_select)
+        self.assertFalse(statements['createdb'].is_select)
+
+    def test_migrations(self):
+        migrations = self.evt_pool_manager._EventPoolManager__migrations
+        latest_version = int(migrations.names[-1].split('_')[0])
+        self.assertEqual(latest_version, self.evt_pool_manager.schema_version)
+        indexes = self.evt_pool_manager.sql3lite_worker.execute(
+            "select name from sqlite_master where type = 'index'")
+        index_names = [index['name'] for index in indexes]
+        self.assertTrue('audit_evt_status_idx' in index_names)
+        self.assertTrue('audit_evt_assigned_block_idx' in index_names)
+
+        # Reopening the database does not apply migrations again
+        self.evt_pool_manager.close()
+        with mock.patch('evt.evt_pool_manager.logger') as logger_mock:
+            self.evt_pool_manager = EventPoolManager(TestEvtPoolManager.db_file)
+            self.assertFalse(logger_mock.info.called)
+        self.assertEqual(latest_version, self.evt_pool_manager.schema_version)
 
     def test_get_event_by_request_id(self):
         self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
@@ -96,6 +131,150 @@ class TestEvtPoolManager(QSPTest):
         processed = self.evt_pool_manager.is_request_processed(999)
         self.assertFalse(processed)
 
+    def test_add_evts_to_be_assigned(self):
+        """
+        Tests that events are inserted at once, existing ones being reported without preventing
+        the insertion of the others.
+        """
+        self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
+        evt_third = dict(self.evt_second, request_id=18)
+        with mock.patch('evt.evt_pool_manager.logger') as logger_mock:
+            self.evt_pool_manager.add_evts_to_be_assigned(
+                [self.evt_second, self.evt_first, evt_third])
+            self.evt_pool_manager.sql3lite_worker.wait_for_writes()
+            self.assertEqual(1, logger_mock.warning.call_count)
+            self.assertFalse(logger_mock.error.called)
+
+        for request_id in [1, 17, 18]:
+            evt = self.evt_pool_manager.get_event_by_request_id(request_id)
+            self.assertEqual(request_id, evt['request_id'])
+            self.assertTrue(self.evt_pool_manager.is_request_processed(request_id))
+        self.evt_pool_manager.close()
+
+    def test_apply_retention(self):
+        """
+        Tests that old events that are done or errored are moved to the archive database, in
+        batches, along with their reports.
+        """
+        archive_file = TestEvtPoolManager.db_file + ".archive"
+        remove(archive_file)
+        self.evt_pool_manager.close()
+        self.evt_pool_manager = EventPoolManager(TestEvtPoolManager.db_file,
+                                                 archive_path=archive_file)
+        worker = self.evt_pool_manager.sql3lite_worker
+        self.assertEqual(2, get_first(worker.execute("pragma auto_vacuum", is_select=True),
+                                       'auto_vacuum'))
+
+        evts = [dict(self.evt_first, request_id=i, assigned_block_nbr=i) for i in range(1, 6)]
+        self.evt_pool_manager.add_evts_to_be_assigned(evts)
+        for evt in evts[:4]:
+            evt.update({'tx_hash': None, 'audit_uri': None, 'audit_hash': None,
+                        'audit_state': None, 'submission_block_nbr': 1,
+                        'full_report': 'full_report', 'compressed_report': 'compressed_report'})
+            self.evt_pool_manager.set_evt_status_to_be_submitted(evt)
+        for evt in evts[:3]:
+            self.evt_pool_manager.set_evt_status_to_done(evt)
+        self.evt_pool_manager.set_evt_status_to_error(evts[4])
+
+        self.assertEqual(1, self.evt_pool_manager.apply_retention(5, batch_size=1))
+        self.assertEqual(2, self.evt_pool_manager.apply_retention(5, batch_size=2))
+        self.assertEqual(0, self.evt_pool_manager.apply_retention(5, batch_size=2))
+        self.evt_pool_manager.vacuum(100)
+
+        remaining = worker.execute("select request_id from audit_evt order by request_id")
+        self.assertEqual([4, 5], [row['request_id'] for row in remaining])
+        archived = worker.execute("select request_id from archive.audit_evt order by request_id")
+        self.assertEqual([1, 2, 3], [row['request_id'] for row in archived])
+        self.assertEqual(3, len(worker.execute("select * from archive.audit_report")))
+        self.assertEqual(1, len(worker.execute("select * from audit_report")))
+        self.evt_pool_manager.close()
+        remove(archive_file)
+
+    def test_apply_retention_count(self):
+        """
+        Tests that the number of events actually removed is returned, rather than the number of
+        events counted as removable beforehand.
+        """
+        self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
+        self.evt_pool_manager.set_evt_status_to_error(self.evt_first)
+        exec_sql = self.evt_pool_manager._EventPoolManager__exec_sql
+
+        def stale_count(query, *args, **kwargs):
+            if query == 'count_retainable_evts':
+                return [{'count': 5}]
+            return exec_sql(query, *args, **kwargs)
+
+        with mock.patch.object(self.evt_pool_manager, '_EventPoolManager__exec_sql',
+                               side_effect=stale_count):
+            self.assertEqual(1, self.evt_pool_manager.apply_retention(1000))
+            self.assertEqual(0, self.evt_pool_manager.apply_retention(1000))
+
+    def test_apply_retention_without_auto_vacuum(self):
+        """
+        Tests that no free page is reported as left to give back once events are removed from a
+        database created before the incremental auto-vacuum mode, and not rebuilt for it.
+        """
+        self.evt_pool_manager.close()
+        connection = apsw.Connection(TestEvtPoolManager.db_file)
+        connection.cursor().execute("pragma auto_vacuum = none; vacuum;")
+        connection.close()
+        self.evt_pool_manager = EventPoolManager(TestEvtPoolManager.db_file)
+        worker = self.evt_pool_manager.sql3lite_worker
+        self.assertEqual(0, get_first(worker.execute("pragma auto_vacuum", is_select=True),
+                                       'auto_vacuum'))
+
+        evts = [dict(self.evt_first, request_id=i, assigned_block_nbr=i,
+                     status_info='x' * 1000) for i in range(1, 101)]
+        self.evt_pool_manager.add_evts_to_be_assigned(evts)
+        for evt in evts:
+            self.evt_pool_manager.set_evt_status_to_error(evt)
+        self.assertEqual(100, self.evt_pool_manager.apply_retention(1000, batch_size=100))
+        self.assertLess(0, get_first(worker.execute("pragma freelist_count", is_select=True),
+                                     'freelist_count'))
+        self.assertEqual(0, self.evt_pool_manager.vacuum(10))
+
+    def test_request_index(self):
+        """
+        Tests that processed requests are answered from memory, including the events already in
+        the database upon start up.
+        """
+        self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
+        self.evt_pool_manager.close()
+        self.evt_pool_manager = EventPoolManager(TestEvtPoolManager.db_file)
+        with mock.patch('evt.evt_pool_manager.EventPoolManager._EventPoolManager__exec_sql') as \
+                exec_sql:
+            self.assertTrue(self.evt_pool_manager.is_request_processed(1))
+            self.assertTrue(self.evt_pool_manager.is_request_processed('1'))
+            self.assertTrue(self.evt_pool_manager.is_request_processed(1, 'AU'))
+            self.assertFalse(self.evt_pool_manager.is_request_processed(1, 'PC'))
+            self.assertFalse(self.evt_pool_manager.is_request_processed(17))
+            self.assertFalse(exec_sql.called)
+        self.evt_pool_manager.close()
+
+    def test_request_index_after_retention(self):
+        """
+        Tests that events removed by the retention, whether archived or dropped, are still
+        regarded as processed after a restart.
+        """
+        archive_file = TestEvtPoolManager.db_file + ".archive"
+        remove(archive_file)
+        for archive_path in [archive_file, None]:
+            self.evt_pool_manager.close()
+            remove(TestEvtPoolManager.db_file)
+            self.evt_pool_manager = EventPoolManager(TestEvtPoolManager.db_file,
+                                                     archive_path=archive_path)
+            self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
+            self.evt_pool_manager.set_evt_status_to_error(self.evt_first)
+            self.assertEqual(1, self.evt_pool_manager.apply_retention(1000))
+            self.evt_pool_manager.close()
+
+            self.evt_pool_manager = EventPoolManager(TestEvtPoolManager.db_file,
+                                                     archive_path=archive_path)
+            self.assertEqual({}, self.evt_pool_manager.get_event_by_request_id(1))
+            self.assertTrue(self.evt_pool_manager.is_request_processed(1, 'AU'))
+            self.assertFalse(self.evt_pool_manager.is_request_processed(1, 'PC'))
+        remove(archive_file)
+
     def test_get_next_block_nbr(self):
         self.assertEqual(0, self.evt_pool_manager.get_next_block_number())
         self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
@@ -110,6 +289,13 @@ class TestEvtPoolManager(QSPTest):
         block_number = self.evt_pool_manager.get_latest_block_number()
         self.assertEqual(self.evt_second['assigned_block_nbr'], block_number)
 
+        # Block numbers are compared numerically, not lexicographically
+        self.evt_first['request_id'] = 18
+        self.evt_first['assigned_block_nbr'] = 1000
+        self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
+        block_number = self.evt_pool_manager.get_latest_block_number()
+        self.assertEqual(1000, block_number)
+
     def test_get_latest_request_id(self):
         self.assertEqual(-1, self.evt_pool_manager.get_latest_request_id())
         self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
@@ -128,7 +314,7 @@ class TestEvtPoolManager(QSPTest):
         def process(evt):
             TestEvtPoolManager.PROCESSED += [evt["request_id"]]
 
-        self.evt_pool_manager.process_incoming_events(process)
+        self.assertEqual(2, self.evt_pool_manager.process_incoming_events(process))
         self.evt_pool_manager.close()
         self.assertTrue(self.evt_first["request_id"] in TestEvtPoolManager.PROCESSED)
         self.assertTrue(self.evt_second["request_id"] in TestEvtPoolManager.PROCESSED)
@@ -140,8 +326,10 @@ class TestEvtPoolManager(QSPTest):
 
         def process(evt, timeout_limit_blocks):
             TestEvtPoolManager.PROCESSED += [evt["request_id"]]
+            # Only the first event changes status
+            return evt["request_id"] == self.evt_first["request_id"]
 
-        self.evt_pool_manager.process_submission_events(process, 0)
+        self.assertEqual(1, self.evt_pool_manager.process_submission_events(process, 0))
         self.evt_pool_manager.close()
         self.assertTrue(self.evt_first["request_id"] in TestEvtPoolManager.PROCESSED)
         self.assertTrue(self.evt_second["request_id"] in TestEvtPoolManager.PROCESSED)
@@ -154,11 +342,57 @@ class TestEvtPoolManager(QSPTest):
         def process(evt):
             TestEvtPoolManager.PROCESSED += [evt["request_id"]]
 
-        self.evt_pool_manager.process_events_to_be_submitted(process)
+        self.assertEqual(2, self.evt_pool_manager.process_events_to_be_submitted(process))
         self.evt_pool_manager.close()
         self.assertTrue(self.evt_first["request_id"] in TestEvtPoolManager.PROCESSED)
         self.assertTrue(self.evt_second["request_id"] in TestEvtPoolManager.PROCESSED)
 
+    def test_paginated_scan(self):
+        """
+        Tests that scans fetch events page by page, in key order, without skipping nor repeating
+        events changing status while being iterated over.
+        """
+        self.evt_pool_manager.close()
+        remove(TestEvtPoolManager.db_file)
+        self.evt_pool_manager = EventPoolManager(TestEvtPoolManager.db_file, page_size=2)
+        for request_id in [5, 3, 1, 4, 2]:
+            self.evt_first['request_id'] = request_id
+            self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
+
+        def process(evt):
+            TestEvtPoolManager.PROCESSED += [evt["request_id"]]
+            self.evt_pool_manager.set_evt_status_to_error(evt)
+
+        with mock.patch('evt.evt_pool_manager.EventPoolManager._EventPoolManager__exec_sql',
+                        wraps=self.evt_pool_manager._EventPoolManager__exec_sql) as exec_sql:
+            self.evt_pool_manager.process_incoming_events(process)
+            pages = [c for c in exec_sql.call_args_list if c[0][0] == 'get_events_to_be_processed']
+        self.assertEqual([1, 2, 3, 4, 5], TestEvtPoolManager.PROCESSED)
+        self.assertEqual(3, len(pages))
+        self.assertEqual([], list(self.evt_pool_manager.incoming_events()))
+        self.evt_pool_manager.close()
+
+    def test_audit_event_record(self):
+        """
+        Tests that events are fetched as AuditEvent records supporting dictionary access.
+        """
+        self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
+        evt = self.evt_pool_manager.get_event_by_request_id(self.evt_first['request_id'])
+        self.assertIsInstance(evt, AuditEvent)
+        self.assertFalse(hasattr(evt, '__dict__'))
+        self.assertEqual('AS', evt['fk_status'])
+        self.assertEqual(12, evt.get('price'))
+        self.assertIsNone(evt.get('unknown'))
+        self.assertFalse('full_report' in evt)
+        self.assertIsNone(evt['full_report'])
+        self.assertTrue('full_report' in evt)
+        self.assertEqual(AuditEvent(self.evt_first), {key: evt[key] for key in self.evt_first})
+        evt['status_info'] = 'updated'
+        self.assertEqual('updated', dict(evt.items())['status_info'])
+        with self.assertRaises(KeyError):
+            evt['unknown'] = 'value'
+        self.evt_pool_manager.close()
+
     def test_set_evt_status_to_be_submitted(self):
         self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
         self.evt_first['tx_hash'] = 'hash'
@@ -171,6 +405,98 @@ class TestEvtPoolManager(QSPTest):
         self.evt_pool_manager.set_evt_status_to_be_submitted(self.evt_first)
         evt = self.evt_pool_manager.get_event_by_request_id(self.evt_first['request_id'])
         self.assertEqual(evt['fk_status'], 'TS')
+        self.assertFalse('full_report' in evt)
+        self.assertEqual(evt['full_report'], 'full_report')
+        self.assertEqual(evt['compressed_report'], 'compressed_report')
+        self.evt_pool_manager.close()
+
+    def test_write_ack(self):
+        """
+        Tests that status transitions can be waited upon to learn whether they committed.
+        """
+        ack = self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
+        self.assertTrue(ack.committed())
+        self.evt_first['status_info'] = 'done'
+        acks = [self.evt_pool_manager.set_evt_status_to_done(self.evt_first),
+                self.evt_pool_manager.set_evt_status_to_error(self.evt_first)]
+        self.assertEqual([True, True], [ack.committed() for ack in acks])
+        self.evt_pool_manager.close()
+        self.assertIsNone(self.evt_pool_manager.set_evt_status_to_done(self.evt_first))
+
+    def test_transaction_unit(self):
+        """
+        Tests that the transitions made within a transaction unit are committed together once it
+        exits, and discarded altogether should it raise.
+        """
+        evts = [dict(self.evt_first, request_id=request_id) for request_id in range(1, 11)]
+        self.evt_pool_manager.add_evts_to_be_assigned(evts).committed()
+        with self.assertRaises(ValueError):
+            with self.evt_pool_manager.transaction_unit():
+                for evt in evts:
+                    self.assertIsNone(self.evt_pool_manager.set_evt_status_to_done(evt))
+                raise ValueError()
+        self.evt_pool_manager.sql3lite_worker.wait_for_writes()
+        for evt in evts:
+            stored = self.evt_pool_manager.get_event_by_request_id(evt['request_id'])
+            self.assertEqual(stored['fk_status'], 'AS')
+
+        with self.evt_pool_manager.transaction_unit() as unit:
+            for evt in evts:
+                self.evt_pool_manager.set_evt_status_to_done(evt)
+            with self.evt_pool_manager.transaction_unit() as nested:
+                self.assertIs(unit, nested)
+            self.assertEqual(len(evts), len(unit))
+        self.assertTrue(unit.ack.committed())
+        for evt in evts:
+            stored = self.evt_pool_manager.get_event_by_request_id(evt['request_id'])
+            self.assertEqual(stored['fk_status'], 'DN')
+        self.evt_pool_manager.close()
+
+    def test_transition_notifications(self):
+        """
+        Tests that subscribers learn about the statuses events are moved into, those of a
+        transaction unit only once it is committed.
+        """
+        notified = []
+        self.evt_pool_manager.subscribe('AS', notified.append)
+        self.evt_pool_manager.subscribe('DN', notified.append)
+        self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
+        self.assertEqual(['AS'], notified)
+
+        with self.evt_pool_manager.transaction_unit():
+            self.evt_pool_manager.set_evt_status_to_done(self.evt_first)
+            self.evt_pool_manager.set_evt_status_to_error(self.evt_first)
+            self.assertEqual(['AS'], notified)
+        self.assertEqual(['AS', 'DN'], notified)
+
+        with self.assertRaises(ValueError):
+            with self.evt_pool_manager.transaction_unit():
+                self.evt_pool_manager.set_evt_status_to_done(self.evt_first)
+                raise ValueError()
+        self.evt_pool_manager.unsubscribe('AS', notified.append)
+        self.evt_pool_manager.add_evt_to_be_assigned(self.evt_second)
+        self.assertEqual(['AS', 'DN'], notified)
+        self.evt_pool_manager.close()
+
+    def test_query_metrics(self):
+        """
+        Tests that the queries of the manager are timed under their statement names, including
+        selects served by the reader pool.
+        """
+        for reader_pool_size in [0, 2]:
+            self.evt_pool_manager.close()
+            remove(TestEvtPoolManager.db_file)
+            self.evt_pool_manager = EventPoolManager(TestEvtPoolManager.db_file,
+                                                     reader_pool_size=reader_pool_size)
+            self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
+            self.evt_pool_manager.get_event_by_request_id(self.evt_first['request_id'])
+            queries = self.evt_pool_manager.query_metrics['queries']
+            self.assertEqual(1, queries['add_evt_to_be_assigned']['count'])
+            self.assertEqual(1, queries['add_evt_to_be_assigned']['rows'])
+            self.assertEqual(1, queries['get_event_by_request_id']['rows'])
+            with mock.patch('evt.evt_pool_manager.logger') as logger_mock:
+                self.evt_pool_manager.dump_query_metrics()
+                self.assertTrue('get_event_by_request_id' in logger_mock.debug.call_args[0][0])
         self.evt_pool_manager.close()
 
     def test_set_evt_status_to_submitted(self):
@@ -199,6 +525,25 @@ class TestEvtPoolManager(QSPTest):
         self.assertEqual(evt['fk_status'], 'ER')
         self.evt_pool_manager.close()
 
+    def test_reader_pool(self):
+        self.evt_pool_manager.close()
+        self.evt_pool_manager = EventPoolManager(TestEvtPoolManager.db_file, reader_pool_size=2,
+                                                 wal_checkpoint_pages=1)
+        self.assertEqual(2, self.evt_pool_manager.reader_pool.size)
+        self.evt_pool_manager.add_evt_to_be_assigned(self.evt_first)
+        self.evt_pool_manager.add_evt_to_be_assigned(self.evt_second)
+
+        # Reads served by the pool observe the writes queued before them
+        evt = self.evt_pool_manager.get_event_by_request_id(self.evt_first['request_id'])
+        self.assertEqual(evt['fk_status'], 'AS')
+        self.evt_pool_manager.set_evt_status_to_done(self.evt_first)
+        evt = self.evt_pool_manager.get_event_by_request_id(self.evt_first['request_id'])
+        self.assertEqual(evt['fk_status'], 'DN')
+
+        self.assertEqual(2, self.evt_pool_manager.reader_pool.available)
+        self.assertTrue(self.evt_pool_manager.checkpoint_metrics['checkpoints'] > 0)
+        self.evt_pool_manager.close()
+
     def test_error_init(self):
         try:
             self.evt_pool_manager = EventPoolManager(None)
@@ -0,0 +1,171 @@
+####################################################################################################
+#                                                                                                  #
+# (c) 2018, 2019 Quantstamp, Inc. This content and its use are governed by the license terms at    #
+# <https://s3.amazonaws.com/qsp-protocol-license/V2_LICENSE.txt>                                   #
+#                                                                                                  #
+####################################################################################################
+
+import unittest
+
+from config import config_value
+from evt import EventPoolManager
+from evt import EventStore
+from evt import InMemoryEventStore
+from helpers.resource import remove
+from helpers.resource import resource_uri
+from helpers.qsp_test import QSPTest
+from utils.io import fetch_file, load_yaml
+
+
+class TestInMemoryEventStore(QSPTest):
+
+    @classmethod
+    def setUpClass(cls):
+        cfg = load_yaml(fetch_file(resource_uri("test_config.yaml")))
+        TestInMemoryEventStore.db_file = config_value(cfg, '/dev/evt_db_path')
+        TestInMemoryEventStore.snapshot_file = TestInMemoryEventStore.db_file + ".snapshot"
+        remove(TestInMemoryEventStore.db_file)
+        remove(TestInMemoryEventStore.snapshot_file)
+
+    def setUp(self):
+        self.store = InMemoryEventStore(page_size=2)
+        self.evt_first = {'request_id': 1,
+                          'requestor': 'x',
+                          'contract_uri': 'x',
+                          'evt_name': 'x',
+                          'assigned_block_nbr': 111,
+                          'status_info': 'x',
+                          'fk_type': 'AU',
+                          'price': 12}
+
+    def tearDown(self):
+        self.store.close()
+        remove(TestInMemoryEventStore.db_file)
+        remove(TestInMemoryEventStore.snapshot_file)
+
+    def __submission(self, evt):
+        evt.update({'tx_hash': 'hash', 'audit_uri': 'uri', 'audit_hash': 'hash',
+                    'audit_state': 1, 'submission_block_nbr': 200, 'status_info': 'info',
+                    'full_report': 'full_report', 'compressed_report': 'compressed_report'})
+        return evt
+
+    def __run_workload(self, store):
+        """
+        Runs the same sequence of operations on a store, returning what it observed.
+        """
+        evts = [dict(self.evt_first, request_id=i, assigned_block_nbr=100 + i)
+                for i in range(1, 8)]
+        store.add_evts_to_be_assigned(evts).committed()
+        store.add_evt_to_be_assigned(evts[0])
+        for evt in evts[:5]:
+            store.set_evt_status_to_be_submitted(self.__submission(evt))
+        for evt in evts[:4]:
+            store.set_evt_status_to_submitted(evt)
+        for evt in evts[:2]:
+            store.set_evt_status_to_done(evt)
+        store.set_evt_status_to_error(evts[2])
+        with store.transaction_unit() as unit:
+            store.set_evt_status_to_done(evts[3])
+            store.set_evt_status_to_done(evts[6])
+        unit.ack.committed()
+        observed = {
+            'incoming': [evt['request_id'] for evt in store.incoming_events()],
+            'to_be_submitted': [dict(evt.items()) for evt in store.events_to_be_submitted()],
+            'submitted': [evt['request_id'] for evt in store.submission_events()],
+            'event': dict(store.get_event_by_request_id(1).items()),
+            'report': store.get_report(1, 'AU'),
+            'latest_block': store.get_latest_block_number(),
+            'latest_request_id': store.get_latest_request_id(),
+            'processed': store.is_request_processed(7, 'AU'),
+            'retained': store.apply_retention(104, batch_size=10),
+        }
+        observed['latest_after_retention'] = store.get_latest_block_number()
+        return observed
+
+    def test_interface(self):
+        """
+        Tests that both engines implement the event store interface.
+        """
+        self.assertTrue(isinstance(self.store, EventStore))
+        self.assertTrue(issubclass(EventPoolManager, EventStore))
+
+    def test_same_workload_as_sqlite(self):
+        """
+        Tests that the in-memory engine observes what the SQLite engine does on the same workload.
+        """
+        sqlite_store = EventPoolManager(TestInMemoryEventStore.db_file, page_size=2)
+        expected = self.__run_workload(sqlite_store)
+        sqlite_store.close()
+        observed = self.__run_workload(self.store)
+        self.assertEqual(expected, observed)
+        self.assertEqual([5], [evt['request_id'] for evt in observed['to_be_submitted']])
+        self.assertEqual([6], observed['incoming'])
+        self.assertEqual(3, observed['retained'])
+
+    def test_transaction_unit(self):
+        """
+        Tests that the writes of a unit are discarded if the block raises, and undone altogether
+        if one of them fails.
+        """
+        self.store.add_evt_to_be_assigned(self.evt_first)
+        with self.assertRaises(ValueError):
+            with self.store.transaction_unit():
+                self.store.set_evt_status_to_done(self.evt_first)
+                raise ValueError()
+        self.assertEqual('AS', self.store.get_event_by_request_id(1)['fk_status'])
+
+        with self.store.transaction_unit() as unit:
+            self.store.set_evt_status_to_error(self.evt_first)
+            self.store.add_evt_to_be_assigned(dict(self.evt_first, request_id=2))
+            # Already exists
+            self.store.add_evt_to_be_assigned(self.evt_first)
+        self.assertFalse(unit.ack.committed())
+        self.assertEqual('AS', self.store.get_event_by_request_id(1)['fk_status'])
+        self.assertEqual({}, self.store.get_event_by_request_id(2))
+        self.assertFalse(self.store.is_request_processed(2))
+
+    def test_transition_notifications(self):
+        """
+        Tests that subscribers learn about the statuses events are moved into, those of a
+        transaction unit only once it is committed.
+        """
+        notified = []
+        for status in InMemoryEventStore.STATUSES:
+            self.store.subscribe(status, notified.append)
+        self.store.add_evt_to_be_assigned(self.evt_first)
+        with self.store.transaction_unit():
+            self.store.set_evt_status_to_be_submitted(self.__submission(self.evt_first))
+            self.assertEqual(['AS'], notified)
+        self.store.set_evt_status_to_submitted(self.evt_first)
+        self.assertEqual(['AS', 'TS', 'SB'], notified)
+
+    def test_snapshot(self):
+        """
+        Tests that events and reports survive the store once snapshotted, and so does the fact
+        that events removed by the retention were processed.
+        """
+        self.store.close()
+        self.store = InMemoryEventStore(snapshot_path=TestInMemoryEventStore.snapshot_file)
+        self.store.add_evt_to_be_assigned(self.evt_first)
+        self.store.set_evt_status_to_be_submitted(self.__submission(self.evt_first))
+        self.store.close()
+        self.assertIsNone(self.store.set_evt_status_to_done(self.evt_first))
+
+        self.store = InMemoryEventStore(snapshot_path=TestInMemoryEventStore.snapshot_file)
+        evt = self.store.get_event_by_request_id(1)
+        self.assertEqual('TS', evt['fk_status'])
+        self.assertEqual(1, evt['submission_attempts'])
+        self.assertEqual('full_report', evt['full_report'])
+        self.assertTrue(self.store.is_request_processed(1, 'AU'))
+        self.assertEqual(111, self.store.get_latest_block_number())
+
+        self.store.set_evt_status_to_error(evt)
+        self.assertEqual(1, self.store.apply_retention(1000))
+        self.store.close()
+        self.store = InMemoryEventStore(snapshot_path=TestInMemoryEventStore.snapshot_file)
+        self.assertEqual({}, self.store.get_event_by_request_id(1))
+        self.assertTrue(self.store.is_request_processed(1, 'AU'))
+
+
+if __name__ == '__main__':
+    unittest.main()
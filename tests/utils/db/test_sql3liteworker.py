@@ -9,6 +9,7 @@
 Tests our assumptions about the database client and SQLite3 engine.
 """
 import apsw
+import asyncio
 import unittest
 
 from unittest import mock
@@ -19,6 +20,8 @@ from evt.evt_pool_manager import EventPoolManager
 from helpers.resource import remove, resource_uri
 from helpers.qsp_test import QSPTest
 from utils.db import Sqlite3Worker
+from utils.db import TransactionUnit
+from utils.db import WriteAck
 from utils.io import fetch_file, load_yaml
 
 
@@ -134,6 +137,255 @@ class TestSqlLite3Worker(QSPTest):
                 args, _ = evt_pool_manager_logger_mock.warning.call_args
                 self.assertTrue(isinstance(args[3], apsw.ConstraintError))
 
+    @timeout(3, timeout_exception=StopIteration)
+    def test_wait_for_write(self):
+        """
+        Tests that a write executed with wait set blocks until committed and returns the error
+        raised, if any.
+        """
+        with mock.patch.object(self.worker, 'logger') as logger_mock:
+            result = self.worker.execute("insert into evt_status values ('XX', 'New status')",
+                                         wait=True)
+            self.assertIsNone(result)
+            result = self.worker.execute("insert into evt_status values ('XX', 'New status')",
+                                         wait=True)
+            self.assertTrue(isinstance(result, apsw.ConstraintError))
+            self.assertTrue(logger_mock.error.called)
+
+            result = self.worker.execute("select * from evt_status")
+            self.assertEqual(len(result), 6)
+
+    @timeout(3, timeout_exception=StopIteration)
+    def test_write_ack(self):
+        """
+        Tests that writes return an acknowledgement carrying whether they committed.
+        """
+        with mock.patch.object(self.worker, 'logger'):
+            first = self.worker.execute("insert into evt_status values ('X1', 'First')")
+            duplicate = self.worker.execute("insert into evt_status values ('X1', 'Duplicate')")
+            second = self.worker.execute("insert into evt_status values ('X2', 'Second')")
+
+            outcomes = WriteAck.wait_all([first, duplicate, second])
+            self.assertIsNone(outcomes[0])
+            self.assertTrue(isinstance(outcomes[1], apsw.ConstraintError))
+            self.assertIsNone(outcomes[2])
+            self.assertTrue(first.done())
+            self.assertTrue(first.committed())
+            self.assertFalse(duplicate.committed())
+
+            async def insert():
+                return await self.worker.execute("insert into evt_status values ('X3', 'Third')")
+
+            self.assertIsNone(asyncio.new_event_loop().run_until_complete(insert()))
+
+    @timeout(3, timeout_exception=StopIteration)
+    def test_group_commit(self):
+        """
+        Tests that writes are committed in groups and that a failing write is rolled back alone,
+        firing its error handler.
+        """
+        self.worker.close()
+        self.worker = Sqlite3Worker(TestSqlLite3Worker.db_file, group_commit_size=10,
+                                    group_commit_latency_sec=0.1)
+        error_handler = mock.MagicMock()
+        with mock.patch.object(self.worker, 'logger') as logger_mock:
+            self.worker.execute("insert into evt_status values ('X1', 'First')")
+            self.worker.execute("insert into evt_status values ('AS', 'Duplicate')",
+                                error_handler=error_handler)
+            result = self.worker.execute("insert into evt_status values ('X2', 'Second')",
+                                         wait=True)
+            self.assertIsNone(result)
+
+            result = self.worker.execute("select * from evt_status")
+            self.assertEqual(len(result), 7)
+            self.assertEqual([x for x in result if x['id'] == 'AS'][0]['description'], 'Assigned')
+            self.assertFalse(logger_mock.error.called)
+
+            args, _ = error_handler.call_args
+            self.assertTrue(isinstance(args[3], apsw.ConstraintError))
+
+    @timeout(3, timeout_exception=StopIteration)
+    def test_group_commit_raising_error_handler(self):
+        """
+        Tests that an error handler raising within a group neither leaves the group unfinished nor
+        keeps the other writes from being committed.
+        """
+        self.worker.close()
+        self.worker = Sqlite3Worker(TestSqlLite3Worker.db_file, group_commit_size=10,
+                                    group_commit_latency_sec=0.1)
+        error_handler = mock.MagicMock(side_effect=ValueError("Boom!"))
+        with mock.patch.object(self.worker, 'logger'):
+            first = self.worker.execute("insert into evt_status values ('X1', 'First')")
+            duplicate = self.worker.execute("insert into evt_status values ('AS', 'Duplicate')",
+                                            error_handler=error_handler)
+            second = self.worker.execute("insert into evt_status values ('X2', 'Second')")
+
+            outcomes = WriteAck.wait_all([first, duplicate, second], timeout=1)
+            self.assertIsNone(outcomes[0])
+            self.assertTrue(isinstance(outcomes[1], apsw.ConstraintError))
+            self.assertIsNone(outcomes[2])
+            self.assertEqual(1, error_handler.call_count)
+
+            result = self.worker.execute("select * from evt_status where id like 'X%'")
+            self.assertEqual(2, len(result))
+
+    @timeout(3, timeout_exception=StopIteration)
+    def test_group_commit_failing_commit(self):
+        """
+        Tests that the writes of a group failing upon commit are executed again one by one, so
+        that only the failing ones are rolled back and handed to their error handler.
+        """
+        self.worker.close()
+        self.worker = Sqlite3Worker(TestSqlLite3Worker.db_file, group_commit_size=10,
+                                    group_commit_latency_sec=0.1)
+        self.worker.execute("pragma foreign_keys = on", is_select=True)
+        self.worker.execute("create table deferred_fk (id char(2) references evt_status(id) "
+                            "deferrable initially deferred)", wait=True)
+        error_handler = mock.MagicMock()
+        with mock.patch.object(self.worker, 'logger'):
+            first = self.worker.execute("insert into deferred_fk values ('AS')")
+            # Only checked upon commit
+            dangling = self.worker.execute("insert into deferred_fk values ('XX')",
+                                           error_handler=error_handler)
+            second = self.worker.execute("insert into deferred_fk values ('DN')")
+
+            outcomes = WriteAck.wait_all([first, dangling, second], timeout=1)
+            self.assertIsNone(outcomes[0])
+            self.assertTrue(isinstance(outcomes[1], apsw.ConstraintError))
+            self.assertIsNone(outcomes[2])
+            self.assertEqual(1, error_handler.call_count)
+
+            result = self.worker.execute("select * from deferred_fk order by id")
+            self.assertEqual([{'id': 'AS'}, {'id': 'DN'}], result)
+
+    @timeout(3, timeout_exception=StopIteration)
+    def test_auto_vacuum(self):
+        """
+        Tests that an existing database is only rebuilt to switch its auto-vacuum mode if asked
+        for, its events being kept.
+        """
+        self.worker.execute("insert into evt_status values ('X1', 'First')", wait=True)
+        for rebuild, expected_mode in [(False, 0), (True, 2)]:
+            self.worker.close()
+            self.worker = Sqlite3Worker(TestSqlLite3Worker.db_file, auto_vacuum="incremental",
+                                        rebuild_for_auto_vacuum=rebuild)
+            result = self.worker.execute("pragma auto_vacuum", is_select=True)
+            self.assertEqual(expected_mode, result[0]['auto_vacuum'])
+            result = self.worker.execute("select * from evt_status where id = 'X1'")
+            self.assertEqual(1, len(result))
+
+    @timeout(3, timeout_exception=StopIteration)
+    def test_execute_many(self):
+        """
+        Tests that rows are inserted within one transaction, rows failing being rolled back alone
+        and handed to the error handler, with and without group commit.
+        """
+        for group_commit_size in [1, 10]:
+            self.worker.close()
+            remove(TestSqlLite3Worker.db_file)
+            self.worker = Sqlite3Worker(TestSqlLite3Worker.db_file,
+                                        group_commit_size=group_commit_size)
+            self.worker.execute_script(fetch_file(resource_uri('evt/createdb.sql', is_main=True)))
+            error_handler = mock.MagicMock()
+            result = self.worker.execute_many("insert into evt_status values (?, ?)",
+                                              [('X1', 'First'), ('X2', 'Second')], wait=True)
+            self.assertEqual([None, None], result)
+
+            result = self.worker.execute_many("insert into evt_status values (?, ?)",
+                                              [('X3', 'Third'), ('AS', 'Duplicate'),
+                                               ('X4', 'Fourth')],
+                                              error_handler=error_handler, wait=True)
+            self.assertIsNone(result[0])
+            self.assertTrue(isinstance(result[1], apsw.ConstraintError))
+            self.assertIsNone(result[2])
+            self.assertEqual(1, error_handler.call_count)
+            args, _ = error_handler.call_args
+            self.assertEqual(('AS', 'Duplicate'), args[2])
+
+            result = self.worker.execute("select * from evt_status")
+            self.assertEqual(len(result), 9)
+
+    @timeout(3, timeout_exception=StopIteration)
+    def test_execute_unit(self):
+        """
+        Tests that the statements of a transaction unit are committed together, all of them being
+        rolled back should any fail, with and without group commit.
+        """
+        for group_commit_size in [1, 10]:
+            self.worker.close()
+            remove(TestSqlLite3Worker.db_file)
+            self.worker = Sqlite3Worker(TestSqlLite3Worker.db_file,
+                                        group_commit_size=group_commit_size)
+            self.worker.execute_script(fetch_file(resource_uri('evt/createdb.sql', is_main=True)))
+            unit = TransactionUnit()
+            unit.add("insert into evt_status values (?, ?)", ('X1', 'First'))
+            unit.add("update evt_status set description = ? where id = ?", ('Second', 'X1'))
+            self.assertEqual(2, len(unit))
+            ack = self.worker.execute_unit(unit)
+            self.assertIs(ack, unit.ack)
+            self.assertTrue(ack.committed(timeout=1))
+
+            error_handler = mock.MagicMock()
+            unit = TransactionUnit()
+            unit.add("insert into evt_status values (?, ?)", ('X2', 'Third'))
+            unit.add("insert into evt_status values (?, ?)", ('AS', 'Duplicate'), error_handler)
+            result = self.worker.execute_unit(unit, wait=True)
+            self.assertTrue(isinstance(result, apsw.ConstraintError))
+            self.assertEqual(1, error_handler.call_count)
+            args, _ = error_handler.call_args
+            self.assertEqual(('AS', 'Duplicate'), args[2])
+
+            result = self.worker.execute("select * from evt_status where id like 'X%'")
+            self.assertEqual([{'id': 'X1', 'description': 'Second'}], result)
+
+    @timeout(3, timeout_exception=StopIteration)
+    def test_query_stats(self):
+        """
+        Tests that named queries are timed, along with their rows and errors, with and without
+        group commit, while unnamed ones are not.
+        """
+        for group_commit_size in [1, 10]:
+            self.worker.close()
+            remove(TestSqlLite3Worker.db_file)
+            self.worker = Sqlite3Worker(TestSqlLite3Worker.db_file,
+                                        group_commit_size=group_commit_size)
+            self.worker.execute_script(fetch_file(resource_uri('evt/createdb.sql', is_main=True)))
+            self.worker.execute("insert into evt_status values (?, ?)", ('X1', 'First'),
+                                name='insert')
+            self.worker.execute("insert into evt_status values (?, ?)", ('AS', 'Duplicate'),
+                                error_handler=mock.MagicMock(), name='insert')
+            self.worker.execute_many("update evt_status set description = ?",
+                                     [('Any',)], name='update')
+            self.worker.execute("select * from evt_status", name='select')
+            self.worker.execute("select * from evt_status")
+
+            stats = self.worker.query_stats.snapshot()
+            self.assertEqual(['insert', 'select', 'update'], sorted(stats['queries'].keys()))
+            self.assertEqual(2, stats['queries']['insert']['count'])
+            self.assertEqual(1, stats['queries']['insert']['errors'])
+            self.assertEqual(6, stats['queries']['update']['rows'])
+            self.assertEqual(6, stats['queries']['select']['rows'])
+            self.assertEqual(1, sum(stats['queries']['select']['exec']['buckets'].values()))
+            self.assertTrue(stats['peakQueueDepth'] >= 1)
+            self.assertEqual(self.worker.max_queue_size, stats['maxQueueSize'])
+            self.assertTrue('insert' in self.worker.query_stats.dump())
+
+    @timeout(3, timeout_exception=StopIteration)
+    def test_record_factory(self):
+        """
+        Tests that selects build their records with the given factory, which is handed the columns
+        of the statement only once.
+        """
+        record_factory = mock.MagicMock(side_effect=lambda columns: lambda row: row)
+        result = self.worker.execute("select id, description from evt_status order by id",
+                                     record_factory=record_factory)
+        self.assertEqual(len(result), 5)
+        self.assertEqual(result[0], ('AS', 'Assigned'))
+        record_factory.assert_called_once_with(('id', 'description'))
+
+        result = self.worker.execute("select id from evt_status where id = 'AS'")
+        self.assertEqual(result, [{'id': 'AS'}])
+
     @timeout(3, timeout_exception=StopIteration)
     def test_wrong_select(self):
         """
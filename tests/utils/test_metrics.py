@@ -30,7 +30,14 @@ class TestFile(QSPTest):
             'hostMemory': 18,
             'hostDisk': 20,
             'minPrice': 1000,
-            'account': '0xe685187635499B823d97FFBf16CB0EE34a172c33'
+            'account': '0xe685187635499B823d97FFBf16CB0EE34a172c33',
+            'evtDbQueries': {'maxQueueSize': 10000, 'peakQueueDepth': 3, 'queries': {}},
+            'evtDbCheckpoints': {'wal_pages': 12, 'checkpoints': 2, 'last_checkpoint_log_pages': 1000,
+                                 'last_checkpoint_checkpointed_pages': 1000, 'last_checkpoint_sec': 0.01,
+                                 'total_checkpoint_sec': 0.03},
+            'blockMinedSubscribers': {},
+            'threads': {},
+            'analyzerCache': {},
         }
 
     def __setup_fake_metrics(self, disk_usage, virtual_memory, cpu_percent, getpid, gethostname):
@@ -50,6 +57,11 @@ class TestFile(QSPTest):
         self.__config_mock.account = '0xe685187635499B823d97FFBf16CB0EE34a172c33'
         self.__config_mock.min_price_in_qsp = 1000
         self.__config_mock.metric_collection_is_enabled = True
+        self.__config_mock.analyzer_cache = None
+        self.__config_mock.event_pool_manager.query_metrics = \
+            self.__fake_metrics_json['evtDbQueries']
+        self.__config_mock.event_pool_manager.checkpoint_metrics = \
+            self.__fake_metrics_json['evtDbCheckpoints']
 
         virtual_memory_percent = MagicMock()
         virtual_memory_percent.percent = 18
@@ -75,6 +87,7 @@ class TestFile(QSPTest):
         with patch.object(metrics, 'send_to_dashboard', return_value=None) as mock_method:
             metrics.collect_and_send()
             mock_method.assert_called_with(self.__fake_metrics_json)
+            self.__config_mock.event_pool_manager.dump_query_metrics.assert_called_once_with()
 
     @patch('socket.gethostname')
     @patch('os.getpid')
@@ -111,6 +124,37 @@ class TestFile(QSPTest):
                 metrics.collect_and_send()
                 logger_mock.error.assert_called_with('Could not collect metrics due to the error: "Boom!"')
 
+    @patch('socket.gethostname')
+    @patch('os.getpid')
+    @patch('psutil.cpu_percent')
+    @patch('psutil.virtual_memory')
+    @patch('psutil.disk_usage')
+    def test_send_and_collect_includes_thread_metrics(self, disk_usage, virtual_memory, cpu_percent, getpid, gethostname):
+        """
+        send_and_collect() should report the lag of the block mined subscribers and the health of the threads when
+        given the polling thread and the watchdog, and the use of the analyzer cache when configured.
+        """
+        self.__setup_fake_metrics(disk_usage, virtual_memory, cpu_percent, getpid, gethostname)
+        self.__config_mock.metric_collection_destination_endpoint = 'some-value'
+        block_mined_polling_thread = MagicMock()
+        block_mined_polling_thread.subscriber_metrics = {
+            'poll_requests thread': {'lag': 2, 'maxLag': 5, 'delivered': 10, 'coalesced': 4}
+        }
+        watchdog = MagicMock()
+        watchdog.metrics = {'audit thread': {'iterations': 3, 'stalled': True, 'stalls': 1}}
+        self.__config_mock.analyzer_cache = MagicMock()
+        self.__config_mock.analyzer_cache.metrics = {'hits': 2, 'misses': 1, 'evictions': 0,
+                                                     'entries': 1, 'sizeBytes': 512}
+        metrics = MetricCollector(self.__config_mock, block_mined_polling_thread, watchdog)
+        self.__fake_metrics_json['blockMinedSubscribers'] = \
+            block_mined_polling_thread.subscriber_metrics
+        self.__fake_metrics_json['threads'] = watchdog.metrics
+        self.__fake_metrics_json['analyzerCache'] = self.__config_mock.analyzer_cache.metrics
+
+        with patch.object(metrics, 'send_to_dashboard', return_value=None) as mock_method:
+            metrics.collect_and_send()
+            mock_method.assert_called_with(self.__fake_metrics_json)
+
     def test_send_to_dashboard_logs_success_when_no_exception(self):
         """
         send_to_dashboard() should log success when request succeeds.